@@ -0,0 +1,223 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.urls import URLPattern
+from rest_framework import exceptions
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from recipes.services import recipe_services
+from recipes.services.ingredient_index import ingredient_index
+
+
+async def authenticate(request):
+    """
+    Аутентификация запроса: классы с aauthenticate вызываются
+    асинхронно, остальные - в потоке.
+    """
+    try:
+        for authenticator in request.authenticators:
+            aauthenticate = getattr(authenticator, 'aauthenticate', None)
+            user_auth = (
+                await aauthenticate(request) if aauthenticate
+                else await sync_to_async(authenticator.authenticate)(request)
+            )
+            if user_auth is not None:
+                # Как Request._authenticate: successful_authenticator
+                # не должен повторять аутентификацию синхронно.
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth
+                return
+    except exceptions.APIException:
+        not_authenticated(request)
+        raise
+
+    not_authenticated(request)
+
+
+def not_authenticated(request):
+    request._authenticator = None
+    request.user = api_settings.UNAUTHENTICATED_USER()
+    request.auth = None
+
+
+def rendered(response):
+    """
+    Ответ DRF, отрисованный в цикле событий: отложенную отрисовку
+    Django выполнил бы в потоке.
+    """
+    response.render()
+    result = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        result[header] = value
+
+    return result
+
+
+def conditional_cached(view, handler):
+    """Обработчик с условными запросами и кешем ответов, как list/retrieve."""
+    return partial(
+        view.aconditional_response,
+        partial(view.acached_response, partial(handler, view)),
+    )
+
+
+def serialize(view, *args, **kwargs):
+    """Данные сериализатора представления (вызывается в потоке)."""
+    return view.get_serializer(*args, **kwargs).data
+
+
+async def list_recipes(view, request, *args, **kwargs):
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+    page = (
+        await view.paginator.apaginate_queryset(queryset, request, view)
+        if view.paginator is not None else None
+    )
+    if page is None:
+        recipes = [recipe async for recipe in queryset]
+        return Response(
+            await sync_to_async(serialize)(view, recipes, many=True),
+        )
+
+    return view.get_paginated_response(
+        await sync_to_async(serialize)(view, page, many=True),
+    )
+
+
+async def retrieve_recipe(view, request, *args, **kwargs):
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    try:
+        recipe = await queryset.aget(**{
+            view.lookup_field: view.kwargs[lookup_url_kwarg],
+        })
+    except (queryset.model.DoesNotExist, TypeError, ValueError,
+            ValidationError):
+        raise Http404
+
+    view.check_object_permissions(request, recipe)
+    return Response(await sync_to_async(serialize)(view, recipe))
+
+
+async def recipe_list(view, request, *args, **kwargs):
+    return await conditional_cached(view, list_recipes)(
+        request,
+        *args,
+        **kwargs,
+    )
+
+
+async def recipe_detail(view, request, *args, **kwargs):
+    return await conditional_cached(view, retrieve_recipe)(
+        request,
+        *args,
+        **kwargs,
+    )
+
+
+async def autocomplete(request, *args, **kwargs):
+    limit = request.query_params.get('limit')
+    return Response(await ingredient_index.asearch(
+        prefix=request.query_params.get('name'),
+        limit=int(limit) if limit and limit.isdigit() else None,
+    ))
+
+
+async def ingredient_list(view, request, *args, **kwargs):
+    # Асинхронно обслуживается только автодополнение по ?name=.
+    if 'name' not in request.query_params:
+        return await sync_to_async(view.list)(request, *args, **kwargs)
+
+    return await view.aconditional_response(
+        autocomplete,
+        request,
+        *args,
+        **kwargs,
+    )
+
+
+async def download_shopping_cart(view, request, *args, **kwargs):
+    return await recipe_services.acollect_shopping_cart(
+        user=request.user,
+        export_format=request.accepted_renderer.format,
+    )
+
+
+# Асинхронные обработчики GET по именам маршрутов DefaultRouter.
+ASYNC_HANDLERS = {
+    'recipes-list': recipe_list,
+    'recipes-detail': recipe_detail,
+    'recipes-download-shopping-cart': download_shopping_cart,
+    'ingredients-list': ingredient_list,
+}
+
+
+def async_view(callback, handler):
+    """
+    Асинхронное представление GET-действия набора представлений DRF
+    из маршрута `callback`: аутентификация, запросы к базе и поток ответа
+    не занимают поток обработчика. Другие методы и браузерный интерфейс
+    DRF обслуживаются синхронным кодом.
+    """
+    viewset = callback.cls
+    action = callback.actions['get']
+
+    async def view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await sync_to_async(callback)(request, *args, **kwargs)
+
+        self = viewset(**callback.initkwargs)
+        self.action_map = {'head': action, **callback.actions}
+        for method, method_action in self.action_map.items():
+            setattr(self, method, getattr(self, method_action))
+        self.args, self.kwargs = args, kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await authenticate(request)
+            self.initial(request, *args, **kwargs)
+            if request.accepted_renderer.format == 'api':
+                response = await sync_to_async(getattr(self, action))(
+                    request,
+                    *args,
+                    **kwargs,
+                )
+            else:
+                response = await handler(self, request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(
+            request,
+            response,
+            *args,
+            **kwargs,
+        )
+        if (not isinstance(self.response, Response)
+                or self.response.accepted_renderer.format == 'api'):
+            return self.response
+
+        return rendered(self.response)
+
+    view.cls = viewset
+    view.actions = callback.actions
+    view.initkwargs = callback.initkwargs
+    view.csrf_exempt = True
+    return view
+
+
+def async_urlpatterns(urlpatterns):
+    """Маршруты DefaultRouter с асинхронными представлениями ASYNC_HANDLERS."""
+    return [
+        URLPattern(
+            pattern.pattern,
+            async_view(pattern.callback, ASYNC_HANDLERS[pattern.name]),
+            pattern.default_args,
+            pattern.name,
+        )
+        if pattern.name in ASYNC_HANDLERS else pattern
+        for pattern in urlpatterns
+    ]
@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+from statistics import median, quantiles
+
+from django.db import transaction
+
+
+class Rollback(Exception):
+    """Откат данных, созданных сценарием замера."""
+
+
+@contextmanager
+def rollback():
+    """
+    Выполнение сценария в транзакции, которая откатывается по завершении:
+    сгенерированные для замера данные не остаются в базе.
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def percentiles(timings):
+    """Медиана, 95-й и 99-й перцентили замеров (мс)."""
+    cuts = quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return {
+        'p50_ms': round(median(timings), 3),
+        'p95_ms': round(cuts[94], 3),
+        'p99_ms': round(cuts[98], 3),
+    }
+
+
+def measure(func, repeat):
+    """Время выполнения `func` (мс): медиана, 95-й и 99-й перцентили."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return percentiles(timings)
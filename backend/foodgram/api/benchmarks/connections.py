@@ -0,0 +1,207 @@
+import io
+import sys
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.wsgi import get_wsgi_application
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.utils import load_backend
+
+from foodgram.postgresql_pool.base import close_pool
+from recipes.models import Ingredient, Recipe
+
+from . import measure, percentiles
+
+help = (
+    'Стоимость подключения к базе: новое соединение на каждый запрос, '
+    'постоянные соединения (CONN_MAX_AGE, CONN_HEALTH_CHECKS) и пул '
+    'соединений процесса (DB_POOL, только PostgreSQL)'
+)
+
+POOL_ENGINE = 'foodgram.postgresql_pool'
+HOST = 'localhost'
+
+# Режимы соединений: (CONN_MAX_AGE, CONN_HEALTH_CHECKS, пул).
+MODES = {
+    'per_request': (0, False, False),
+    'persistent': (60, False, False),
+    'persistent_checked': (60, True, False),
+    'pool': (0, False, True),
+    'pool_checked': (0, True, True),
+}
+
+# Дешёвые запросы, в которых подключение заметно во времени ответа.
+ENDPOINTS = (
+    ('tags', '/api/tags/', ''),
+    ('recipe', '/api/recipes/{recipe}/', ''),
+    ('ingredients_search', '/api/ingredients/', 'name={prefix}'),
+)
+
+
+def add_arguments(parser):
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument(
+        '--mode',
+        action='append',
+        choices=list(MODES),
+        help='Замерять только указанные режимы',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Очищать кэш ответов API перед каждым запросом',
+    )
+
+
+@contextmanager
+def configured(max_age, health_checks, pooled):
+    """
+    Соединение по умолчанию с заданными настройками: запросы через
+    WSGI закрывают или возвращают его в пул по сигналам начала и конца
+    запроса, как в рабочем процессе.
+    """
+    original = connections[DEFAULT_DB_ALIAS]
+    original.close()
+    settings_dict = {
+        **original.settings_dict,
+        'CONN_MAX_AGE': max_age,
+        'CONN_HEALTH_CHECKS': health_checks,
+        'OPTIONS': {
+            key: value
+            for key, value in original.settings_dict['OPTIONS'].items()
+            if key != 'pool'
+        },
+    }
+    if pooled:
+        settings_dict['ENGINE'] = POOL_ENGINE
+        settings_dict['OPTIONS']['pool'] = settings.DB_POOL_OPTIONS
+        close_pool(DEFAULT_DB_ALIAS)
+    elif settings_dict['ENGINE'] == POOL_ENGINE:
+        settings_dict['ENGINE'] = 'django.db.backends.postgresql'
+
+    wrapper = load_backend(settings_dict['ENGINE']).DatabaseWrapper(
+        settings_dict,
+        DEFAULT_DB_ALIAS,
+    )
+    connections[DEFAULT_DB_ALIAS] = wrapper
+    try:
+        yield wrapper
+    finally:
+        wrapper.close()
+        if pooled:
+            close_pool(DEFAULT_DB_ALIAS)
+        connections[DEFAULT_DB_ALIAS] = original
+
+
+def wsgi_get(application, path, query):
+    statuses = []
+    response = application(
+        {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': HOST,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': HOST,
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        },
+        lambda status, headers: statuses.append(int(status.split()[0])),
+    )
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+
+    return statuses[0]
+
+
+def run_mode(application, repeat, no_cache, endpoints, pooled):
+    cache = caches[settings.API_CACHE]
+    wrapper = connections[DEFAULT_DB_ALIAS]
+    connects = []
+
+    def connected(sender, connection, **kwargs):
+        connects.append(connection)
+
+    connection_created.connect(connected)
+    try:
+        results = {}
+        for name, path, query in endpoints:
+            connects.clear()
+            opened = getattr(wrapper.pool, 'opened', 0) if pooled else 0
+            timings, statuses = [], set()
+            for _ in range(repeat):
+                if no_cache:
+                    cache.clear()
+                started = time.perf_counter()
+                statuses.add(wsgi_get(application, path, query))
+                timings.append((time.perf_counter() - started) * 1000)
+
+            results[name] = {
+                'status': sorted(statuses),
+                **percentiles(timings),
+                'connects_per_request': round(len(connects) / repeat, 2),
+            }
+            if pooled:
+                # Подключение берёт соединение из пула, новые соединения
+                # открываются только при пустом пуле.
+                results[name]['opened_per_request'] = round(
+                    (wrapper.pool.opened - opened) / repeat,
+                    2,
+                )
+    finally:
+        connection_created.disconnect(connected)
+
+    return results
+
+
+def run(repeat, mode=None, no_cache=False, **options):
+    recipe = Recipe.objects.order_by('-id').values_list('id', flat=True)[0]
+    prefix = Ingredient.objects.order_by('id').values_list(
+        'name',
+        flat=True,
+    )[0][:2]
+    endpoints = [
+        (name, path.format(recipe=recipe), query.format(prefix=quote(prefix)))
+        for name, path, query in ENDPOINTS
+    ]
+    application = get_wsgi_application()
+    vendor = connections[DEFAULT_DB_ALIAS].vendor
+
+    results = {'database': vendor}
+    with configured(0, False, False) as wrapper:
+        # Открытие и закрытие соединения без запроса к API.
+        results['connect'] = measure(
+            lambda: (wrapper.connect(), wrapper.close()),
+            repeat,
+        )
+
+    for name, (max_age, health_checks, pooled) in MODES.items():
+        if mode and name not in mode:
+            continue
+        if pooled and vendor != 'postgresql':
+            results[name] = {'skipped': 'пул соединений только для PostgreSQL'}
+            continue
+
+        with configured(max_age, health_checks, pooled):
+            results[name] = run_mode(
+                application,
+                repeat,
+                no_cache,
+                endpoints,
+                pooled,
+            )
+
+    return results
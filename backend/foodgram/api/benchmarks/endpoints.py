@@ -0,0 +1,116 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+from . import percentiles
+
+help = (
+    'Задержка, число SQL-запросов и пропускная способность основных '
+    'эндпоинтов на текущих данных (см. generate_fake_data)'
+)
+
+# (название, адрес, нужна ли авторизация)
+ENDPOINTS = (
+    ('recipes', '/api/recipes/?limit=6', False),
+    ('recipes_cursor', '/api/recipes/?limit=6&cursor=', False),
+    ('recipe', '/api/recipes/{recipe}/', False),
+    ('tags', '/api/tags/', False),
+    ('ingredients_search', '/api/ingredients/?name={prefix}', False),
+    ('recipes_auth', '/api/recipes/?limit=6', True),
+    ('recipe_auth', '/api/recipes/{recipe}/', True),
+    ('favorites', '/api/recipes/?is_favorited=1&limit=6', True),
+    (
+        'subscriptions',
+        '/api/users/subscriptions/?limit=6&recipes_limit=3',
+        True,
+    ),
+    (
+        'download_shopping_cart',
+        '/api/recipes/download_shopping_cart/',
+        True,
+    ),
+)
+
+
+def add_arguments(parser):
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument(
+        '--endpoint',
+        action='append',
+        choices=[name for name, _, _ in ENDPOINTS],
+        help='Замерять только указанные эндпоинты',
+    )
+    parser.add_argument(
+        '--email',
+        help='Пользователь для авторизованных запросов '
+             '(по умолчанию — с наибольшим числом подписок)',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Очищать кэш ответов API перед каждым запросом',
+    )
+
+
+def get_user(email):
+    if email:
+        return User.objects.get(email=email)
+
+    return User.objects.annotate(
+        subscriptions_count=Count('subscriber'),
+    ).order_by('-subscriptions_count', 'id').first()
+
+
+def run(repeat, endpoint=None, email=None, no_cache=False, **options):
+    recipe = Recipe.objects.order_by('-id').values_list('id', flat=True)[0]
+    ingredient = Ingredient.objects.order_by('id').values_list(
+        'name',
+        flat=True,
+    )[0]
+    user = get_user(email)
+    token, _ = Token.objects.get_or_create(user=user)
+    clients = {
+        False: Client(),
+        True: Client(HTTP_AUTHORIZATION=f'Token {token.key}'),
+    }
+    cache = caches[settings.API_CACHE]
+
+    results = {}
+    for name, url, authorized in ENDPOINTS:
+        if endpoint and name not in endpoint:
+            continue
+
+        url = url.format(recipe=recipe, prefix=ingredient[:2])
+        client = clients[authorized]
+        timings, queries, statuses = [], [], set()
+        for _ in range(repeat):
+            if no_cache:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url)
+                # Потоковый ответ формируется при чтении тела.
+                response.getvalue()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context))
+            statuses.add(response.status_code)
+
+        results[name] = {
+            'url': url,
+            'status': sorted(statuses),
+            **percentiles(timings),
+            'queries_per_request': round(sum(queries) / repeat, 2),
+            'queries_max': max(queries),
+            'requests_per_second': round(repeat * 1000 / sum(timings), 1),
+        }
+
+    return results
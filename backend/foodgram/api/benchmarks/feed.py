@@ -0,0 +1,114 @@
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from recipes.services import feed
+from users.models import Subscription, User
+
+from . import measure, rollback
+
+help = (
+    'Лента подписок: рассылка по чтению против рассылки по записи '
+    'для автора с большим числом подписчиков'
+)
+
+BATCH_SIZE = 10_000
+
+
+def add_arguments(parser):
+    parser.add_argument('--followers', type=int, default=10_000)
+    parser.add_argument('--authors', type=int, default=100)
+    parser.add_argument('--recipes-per-author', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+
+
+def create_users(prefix, count):
+    return User.objects.bulk_create(
+        (
+            User(
+                email=f'{prefix}{index}@benchmark.foodgram.local',
+                username=f'{prefix}{index}',
+            )
+            for index in range(count)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def create_recipes(authors, per_author):
+    now = timezone.now()
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author=author,
+                name='Рецепт',
+                text='Описание',
+                image='recipes/benchmark.png',
+                cooking_time=1,
+                pub_date=now - timezone.timedelta(minutes=index),
+            )
+            for index in range(per_author)
+            for author in authors
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def publish(author):
+    recipe = Recipe.objects.create(
+        author=author,
+        name='Новый рецепт',
+        text='Описание',
+        image='recipes/benchmark.png',
+        cooking_time=1,
+    )
+    feed.fan_out(recipe)
+
+
+def run(followers, authors, recipes_per_author, limit, repeat, **options):
+    results = {}
+    with rollback():
+        reader, = create_users('reader', 1)
+        authors = create_users('author', authors)
+        popular = authors[0]
+        Subscription.objects.bulk_create(
+            [Subscription(user=reader, author=author) for author in authors]
+            + [
+                Subscription(user=follower, author=popular)
+                for follower in create_users('follower', followers)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        create_recipes(authors, recipes_per_author)
+
+        token, _ = Token.objects.get_or_create(user=reader)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        deep_page = len(authors) * recipes_per_author // limit // 2
+        for mode in (feed.READ, feed.WRITE):
+            with override_settings(FEED_MODE=mode):
+                results[mode] = {
+                    'rebuild': (
+                        measure(feed.rebuild, 1)
+                        if mode == feed.WRITE else None
+                    ),
+                    'publish': measure(lambda: publish(popular), repeat),
+                    'first_page': measure(
+                        lambda: client.get(
+                            f'/api/recipes/feed/?limit={limit}&cursor=',
+                        ),
+                        repeat,
+                    ),
+                    'deep_page': measure(
+                        lambda: client.get(
+                            f'/api/recipes/feed/?limit={limit}'
+                            f'&page={deep_page}',
+                        ),
+                        repeat,
+                    ),
+                }
+
+    return results
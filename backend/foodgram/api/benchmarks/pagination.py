@@ -0,0 +1,74 @@
+from django.test import Client
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from api.pagination import KeysetPagination
+from recipes.models import Recipe
+from users.models import User
+
+from . import measure, rollback
+
+help = 'Постраничная пагинация против курсора на глубоких страницах'
+
+
+def add_arguments(parser):
+    parser.add_argument('--recipes', type=int, default=50_000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+
+
+def seed(count):
+    author, _ = User.objects.get_or_create(
+        email='benchmark@foodgram.local',
+        defaults={'username': 'benchmark'},
+    )
+    now = timezone.now()
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=author,
+            name=f'Рецепт {index}',
+            text='Описание',
+            image='recipes/benchmark.png',
+            cooking_time=1,
+        )
+        for index in range(count)
+    )
+    # auto_now_add проставляет одинаковое время всему пакету.
+    for index, recipe in enumerate(recipes):
+        recipe.pub_date = now - timezone.timedelta(seconds=index // 3)
+    Recipe.objects.bulk_update(recipes, ('pub_date',), batch_size=1000)
+
+
+def cursor_at(offset, limit):
+    """Курсор, указывающий на страницу, начинающуюся с `offset`."""
+    paginator = KeysetPagination()
+    paginator.request = APIRequestFactory().get('/api/recipes/')
+    paginator.ordering = paginator.get_ordering(Recipe.objects.all())
+    previous = Recipe.objects.all()[offset - 1]
+    return paginator.encode_cursor(previous, reverse=False).split('?', 1)[1]
+
+
+def run(recipes, limit, repeat, **options):
+    client = Client()
+    results = []
+    with rollback():
+        seed(recipes)
+        pages = recipes // limit
+        for page in sorted({1, 10, pages // 10, pages // 2, pages}):
+            offset = (page - 1) * limit
+            query = cursor_at(offset, limit) if offset else 'cursor='
+            results.append({
+                'page': page,
+                'page_number': measure(
+                    lambda: client.get(
+                        f'/api/recipes/?limit={limit}&page={page}',
+                    ),
+                    repeat,
+                ),
+                'cursor': measure(
+                    lambda: client.get(f'/api/recipes/?limit={limit}&{query}'),
+                    repeat,
+                ),
+            })
+
+    return results
@@ -0,0 +1,109 @@
+import random
+
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+from recipes.services import pantry_index
+from users.models import User
+
+from . import measure, rollback
+
+help = (
+    'Подбор рецептов по имеющимся ингредиентам: инвертированный индекс '
+    'против агрегации по IngredientInRecipe'
+)
+
+BATCH_SIZE = 10_000
+
+
+def add_arguments(parser):
+    parser.add_argument('--recipes', type=int, default=200_000)
+    parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+    parser.add_argument('--pantry', type=int, default=10)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def create_recipes(count, per_recipe, ingredients, rng):
+    author, _ = User.objects.get_or_create(
+        email='benchmark@foodgram.local',
+        defaults={'username': 'benchmark'},
+    )
+    now = timezone.now()
+    weights = [1 / rank for rank in range(1, len(ingredients) + 1)]
+    for start in range(0, count, BATCH_SIZE):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name='Рецепт',
+                text='Описание',
+                image='recipes/benchmark.png',
+                cooking_time=1,
+                pub_date=now,
+            )
+            for _ in range(start, min(start + BATCH_SIZE, count))
+        )
+        IngredientInRecipe.objects.bulk_create(
+            (
+                IngredientInRecipe(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredient_id,
+                    amount=1,
+                )
+                for recipe in recipes
+                for ingredient_id in set(rng.choices(
+                    ingredients,
+                    weights,
+                    k=rng.randint(1, per_recipe),
+                ))
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+
+def aggregate(ingredient_ids, limit):
+    """Тот же порядок подбора агрегацией по строкам ингредиентов."""
+    return list(
+        IngredientInRecipe.objects.values('recipe_id').annotate(
+            matched=Count('id', filter=Q(ingredient_id__in=ingredient_ids)),
+            required=Count('id'),
+        ).filter(matched__gt=0).annotate(
+            coverage=Cast(F('matched'), FloatField()) / F('required'),
+            missing=F('required') - F('matched'),
+        ).order_by('-coverage', 'missing', '-recipe_id')[:limit]
+    )
+
+
+def run(recipes, ingredients_per_recipe, pantry, limit, repeat, seed,
+        **options):
+    rng = random.Random(seed)
+    ingredients = list(Ingredient.objects.values_list('id', flat=True))
+    results = {}
+    with rollback():
+        create_recipes(recipes, ingredients_per_recipe, ingredients, rng)
+        results['recipes'] = Recipe.objects.count()
+        results['rebuild'] = measure(pantry_index.rebuild, 1)
+        for name, pool in (
+                ('popular', ingredients[:50]),
+                ('random', ingredients),
+        ):
+            ingredient_ids = rng.sample(pool, pantry)
+            # Первый поиск заполняет кэш битовых множеств процесса.
+            results[name] = {
+                'matches': len(pantry_index.index.search(ingredient_ids)),
+                'index': measure(
+                    lambda: pantry_index.index.search(
+                        ingredient_ids,
+                    )[:limit],
+                    repeat,
+                ),
+                'aggregate': measure(
+                    lambda: aggregate(ingredient_ids, limit),
+                    repeat,
+                ),
+            }
+
+    return results
@@ -0,0 +1,67 @@
+import base64
+import io
+import json
+import os
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api.renderers import FastJSONParser, FastJSONRenderer, orjson
+from api.serializers import RecipeReadSerializer
+from recipes.models import Recipe, Tag
+
+from . import measure
+
+help = (
+    'Кодирование страницы RecipeReadSerializer и разбор тела с картинкой '
+    'base64: стандартный json против orjson'
+)
+
+
+def add_arguments(parser):
+    parser.add_argument('--recipes', type=int, default=100)
+    parser.add_argument('--image-kb', type=int, default=512)
+    parser.add_argument('--repeat', type=int, default=50)
+
+
+def run(recipes, image_kb, repeat, **options):
+    request = APIRequestFactory().get('/api/recipes/')
+    data = RecipeReadSerializer(
+        Recipe.objects.with_related().with_user_flags()[:recipes],
+        many=True,
+        context={'request': request},
+    ).data
+    image = base64.b64encode(os.urandom(image_kb * 1024)).decode()
+    body = json.dumps({
+        'name': 'Рецепт',
+        'text': 'Описание',
+        'cooking_time': 1,
+        'tags': list(Tag.objects.values_list('id', flat=True)),
+        'ingredients': [{'id': 1, 'amount': 1}] * 20,
+        'image': f'data:image/png;base64,{image}',
+    }, ensure_ascii=False).encode()
+
+    renderers = {'json': JSONRenderer(), 'orjson': FastJSONRenderer()}
+    parsers = {'json': JSONParser(), 'orjson': FastJSONParser()}
+    rendered = {
+        name: renderer.render(data) for name, renderer in renderers.items()
+    }
+    return {
+        'orjson_installed': orjson is not None,
+        'recipes': len(data),
+        'rendered_bytes': len(rendered['json']),
+        'identical': rendered['json'] == rendered['orjson'],
+        'render': {
+            name: measure(lambda: renderer.render(data), repeat)
+            for name, renderer in renderers.items()
+        },
+        'body_bytes': len(body),
+        'parse': {
+            name: measure(
+                lambda: parser.parse(io.BytesIO(body)),
+                repeat,
+            )
+            for name, parser in parsers.items()
+        },
+    }
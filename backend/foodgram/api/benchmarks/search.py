@@ -0,0 +1,109 @@
+import random
+
+from django.db.models import Q
+from django.test import Client
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe
+from recipes.services import search
+from users.models import User
+
+from . import measure, rollback
+
+help = (
+    'Полнотекстовый поиск рецептов против поиска подстроки '
+    '(icontains) на синтетических рецептах'
+)
+
+BATCH_SIZE = 10_000
+
+
+def add_arguments(parser):
+    parser.add_argument('--recipes', type=int, default=100_000)
+    parser.add_argument('--words', type=int, default=30)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def vocabulary():
+    words = sorted({
+        word
+        for name in Ingredient.objects.values_list('name', flat=True)
+        for word in search.TOKEN.findall(name.lower())
+        if len(word) > 3
+    })
+    return words or [f'слово{index}' for index in range(1000)]
+
+
+def create_recipes(count, words_per_recipe, words, rng):
+    author, _ = User.objects.get_or_create(
+        email='benchmark@foodgram.local',
+        defaults={'username': 'benchmark'},
+    )
+    now = timezone.now()
+    # Частые слова встречаются в описаниях чаще редких.
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    for start in range(0, count, BATCH_SIZE):
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=' '.join(rng.choices(words, weights, k=3)),
+                text=' '.join(rng.choices(words, weights, k=words_per_recipe)),
+                image='recipes/benchmark.png',
+                cooking_time=1,
+                pub_date=now,
+            )
+            for _ in range(start, min(start + BATCH_SIZE, count))
+        )
+    search.index_recipes()
+    return author
+
+
+def run(recipes, words, limit, repeat, seed, **options):
+    rng = random.Random(seed)
+    dictionary = vocabulary()
+    queries = {
+        'frequent': dictionary[0],
+        'medium': dictionary[len(dictionary) // 20],
+        'rare': dictionary[-1],
+        'two_words': f'{dictionary[0]} {dictionary[len(dictionary) // 20]}',
+    }
+
+    results = {}
+    with rollback():
+        author = create_recipes(recipes, words, dictionary, rng)
+        # Ответы анонимам кэшируются, замеряются запросы с токеном.
+        token, _ = Token.objects.get_or_create(user=author)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        results['recipes'] = Recipe.objects.count()
+        for name, query in queries.items():
+            substring = Q()
+            for word in query.split():
+                substring &= Q(name__icontains=word) | Q(text__icontains=word)
+            results[name] = {
+                'query': query,
+                'matches': search.search(Recipe.objects.all(), query).count(),
+                'api': measure(
+                    lambda: client.get(
+                        '/api/recipes/',
+                        {'search': query, 'limit': limit},
+                    ),
+                    repeat,
+                ),
+                'full_text': measure(
+                    lambda: list(
+                        search.search(Recipe.objects.all(), query)[:limit]
+                    ),
+                    repeat,
+                ),
+                'icontains': measure(
+                    lambda: list(
+                        Recipe.objects.filter(substring)[:limit]
+                    ),
+                    repeat,
+                ),
+            }
+
+    return results
@@ -0,0 +1,60 @@
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.fast_serializers import FastRecipeReadSerializer
+from api.serializers import RecipeReadSerializer
+from recipes.models import Recipe
+
+from . import measure
+
+# Совпадение вывода проверяется в api.tests.
+help = (
+    'Страница рецептов: время сериализации RecipeReadSerializer '
+    'и FastRecipeReadSerializer'
+)
+
+
+def add_arguments(parser):
+    parser.add_argument('--recipes', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50)
+
+
+def make_request(user=None):
+    request = APIRequestFactory().get('/api/recipes/')
+    if user is not None:
+        force_authenticate(request, user)
+        request.user = user
+
+    return request
+
+
+def load(request, fields, expand, recipes):
+    user = getattr(request, 'user', None)
+    return list(
+        Recipe.objects.with_related(
+            user=user,
+            fields=fields,
+            expand=expand,
+        ).with_user_flags(user=user, fields=fields).order_by('-id')[:recipes]
+    )
+
+
+def run(recipes, repeat, **options):
+    request = make_request()
+    page = load(request, None, None, recipes)
+    context = {'request': request}
+    timings = {
+        serializer_class.__name__: measure(
+            lambda: serializer_class(page, many=True, context=context).data,
+            repeat,
+        )
+        for serializer_class in (
+            RecipeReadSerializer,
+            FastRecipeReadSerializer,
+        )
+    }
+    drf, fast = (timing['p50_ms'] for timing in timings.values())
+    return {
+        'recipes': len(page),
+        'serialize': timings,
+        'speedup_p50': round(drf / fast, 1),
+    }
@@ -0,0 +1,269 @@
+import asyncio
+import base64
+import importlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+from django.urls import clear_url_caches
+from rest_framework.authtoken.models import Token
+
+from recipes.models import ShoppingListItem, Tag
+from users.models import User
+
+from . import percentiles
+
+help = (
+    'Одновременные медленные клиенты: синхронные процессы WSGI против '
+    'ASGI с синхронными и асинхронными представлениями (API_ASYNC_VIEWS)'
+)
+
+# Размер порции тела запроса, передаваемой медленным клиентом.
+CHUNK_SIZE = 16 * 1024
+HOST = 'localhost'
+
+
+def add_arguments(parser):
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Число синхронных процессов WSGI (потоков в замере)',
+    )
+    parser.add_argument(
+        '--client-kbps',
+        type=int,
+        default=128,
+        help='Скорость передачи данных клиента (КБ/с)',
+    )
+    parser.add_argument('--image-kb', type=int, default=256)
+    parser.add_argument('--recipes', type=int, default=20)
+
+
+def make_requests(token, image_kb, recipes):
+    """(название, метод, путь, строка запроса, тело) замеряемых запросов."""
+    image = base64.b64encode(os.urandom(image_kb * 1024)).decode()
+    # Неверное время приготовления: тело читается и разбирается целиком,
+    # рецепт не создаётся.
+    upload = json.dumps({
+        'name': 'Рецепт',
+        'text': 'Описание',
+        'cooking_time': 0,
+        'tags': list(Tag.objects.values_list('id', flat=True)[:1]),
+        'ingredients': [{'id': 1, 'amount': 1}],
+        'image': f'data:image/png;base64,{image}',
+    }, ensure_ascii=False).encode()
+    return (
+        ('recipes', 'GET', '/api/recipes/', f'limit={recipes}', b''),
+        (
+            'download_shopping_cart',
+            'GET',
+            '/api/recipes/download_shopping_cart/',
+            'format=csv',
+            b'',
+        ),
+        ('upload', 'POST', '/api/recipes/', '', upload),
+    )
+
+
+def reload_urls():
+    import api.urls
+    import foodgram.urls
+
+    importlib.reload(api.urls)
+    importlib.reload(foodgram.urls)
+    clear_url_caches()
+
+
+@contextmanager
+def async_views(enabled):
+    """Маршруты с асинхронными представлениями или без них."""
+    try:
+        with override_settings(API_ASYNC_VIEWS=enabled):
+            reload_urls()
+            yield
+    finally:
+        reload_urls()
+
+
+class SlowInput(io.BytesIO):
+    """wsgi.input клиента, передающего тело с ограниченной скоростью."""
+
+    def __init__(self, body, rate):
+        super().__init__(body)
+        self.rate = rate
+
+    def read(self, size=-1):
+        data = super().read(size)
+        time.sleep(len(data) / self.rate)
+        return data
+
+    def readline(self, size=-1):
+        data = super().readline(size)
+        time.sleep(len(data) / self.rate)
+        return data
+
+
+def wsgi_request(application, token, rate, method, path, query, body):
+    statuses = []
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST,
+        'HTTP_AUTHORIZATION': f'Token {token}',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': SlowInput(body, rate),
+        'wsgi.errors': sys.stderr,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    response = application(
+        environ,
+        lambda status, headers: statuses.append(int(status.split()[0])),
+    )
+    try:
+        for chunk in response:
+            time.sleep(len(chunk) / rate)
+    finally:
+        response.close()
+
+    return statuses[0], time.perf_counter()
+
+
+async def asgi_request(application, token, rate, method, path, query, body):
+    chunks = [
+        body[offset:offset + CHUNK_SIZE]
+        for offset in range(0, len(body), CHUNK_SIZE)
+    ] or [b'']
+    finished = asyncio.Event()
+    statuses = []
+
+    async def receive():
+        if not chunks:
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        chunk = chunks.pop(0)
+        await asyncio.sleep(len(chunk) / rate)
+        return {
+            'type': 'http.request',
+            'body': chunk,
+            'more_body': bool(chunks),
+        }
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+        elif message['type'] == 'http.response.body':
+            await asyncio.sleep(len(message.get('body', b'')) / rate)
+            if not message.get('more_body'):
+                finished.set()
+
+    await application(
+        {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [
+                (b'host', HOST.encode()),
+                (b'authorization', f'Token {token}'.encode()),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': (HOST, 80),
+        },
+        receive,
+        send,
+    )
+    return statuses[0], time.perf_counter()
+
+
+def run_wsgi(clients, workers, request):
+    application = get_wsgi_application()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return summary(
+            list(executor.map(
+                lambda _: wsgi_request(application, *request),
+                range(clients),
+            )),
+            started,
+        )
+
+
+def run_asgi(clients, request):
+    application = get_asgi_application()
+
+    async def main():
+        started = time.perf_counter()
+        return summary(
+            await asyncio.gather(*(
+                asgi_request(application, *request) for _ in range(clients)
+            )),
+            started,
+        )
+
+    return asyncio.run(main())
+
+
+def summary(results, started):
+    """
+    Время ответа считается от общего начала: клиенты приходят
+    одновременно, ожидание свободного процесса входит во время ответа.
+    """
+    wall = max(finished for _, finished in results) - started
+    return {
+        'status': sorted({status for status, _ in results}),
+        'wall_s': round(wall, 3),
+        'requests_per_second': round(len(results) / wall, 1),
+        **percentiles([
+            (finished - started) * 1000 for _, finished in results
+        ]),
+    }
+
+
+def run(clients, workers, client_kbps, image_kb, recipes, **options):
+    user = User.objects.get(id=ShoppingListItem.objects.values_list(
+        'user_id',
+        flat=True,
+    )[0])
+    token, _ = Token.objects.get_or_create(user=user)
+    rate = client_kbps * 1024
+
+    results = {}
+    for name, method, path, query, body in make_requests(
+            token.key,
+            image_kb,
+            recipes,
+    ):
+        request = (token.key, rate, method, path, query, body)
+        results[name] = {'request_bytes': len(body)}
+        results[name]['wsgi'] = run_wsgi(clients, workers, request)
+        for mode, enabled in (('asgi', False), ('asgi_async_views', True)):
+            with async_views(enabled):
+                results[name][mode] = run_asgi(clients, request)
+
+    return results
@@ -0,0 +1,132 @@
+from hashlib import md5
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import urlencode
+from rest_framework.response import Response
+
+from recipes.services.versions import get_version
+
+RESPONSE_KEY = 'response:{name}:{action}:{versions}:{digest}'
+STATS_KEY = 'response-stats:{name}:{event}'
+
+cached_viewsets = set()
+
+
+def count(name: str, event: str) -> None:
+    cache = caches[settings.API_CACHE]
+    key = STATS_KEY.format(name=name, event=event)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def response_cache_stats() -> dict:
+    """Попадания и промахи кеша ответов по наборам представлений."""
+    cache = caches[settings.API_CACHE]
+    stats = {}
+    for name in sorted(cached_viewsets):
+        hits = cache.get(STATS_KEY.format(name=name, event='hits'), 0)
+        misses = cache.get(STATS_KEY.format(name=name, event='misses'), 0)
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    return stats
+
+
+class CachedResponseMixin:
+    """
+    Кеширование ответов list и retrieve для анонимных пользователей.
+
+    Ключ учитывает адрес с параметрами запроса и версии областей данных
+    из `cache_scopes`: изменение данных меняет версию, и старые записи
+    перестают использоваться. Данные, которые не входят в ключ,
+    обновляет в ответе из кеша `refresh_cached`.
+    """
+    cache_scopes = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cached_viewsets.add(cls.__name__)
+
+    def get_cache_key(self, request):
+        versions = '.'.join(
+            str(get_version(scope)) for scope in self.cache_scopes
+        )
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        digest = md5(
+            f'{request.get_host()}{request.path}?{query}'.encode(),
+        ).hexdigest()
+        return RESPONSE_KEY.format(
+            name=type(self).__name__,
+            action=self.action,
+            versions=versions,
+            digest=digest,
+        )
+
+    def refresh_cached(self, data):
+        """
+        Ответ из кеша с текущими значениями данных, не входящих в ключ
+        кеша. None - ответ нужно построить заново.
+        """
+        return data
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+
+        cache = caches[settings.API_CACHE]
+        name = type(self).__name__
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            data = self.refresh_cached(data)
+        if data is not None:
+            count(name, 'hits')
+            return Response(data)
+
+        count(name, 'misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data)
+
+        return response
+
+    async def acached_response(self, handler, request, *args, **kwargs):
+        """Вариант cached_response с асинхронным обработчиком."""
+        if not request.user.is_anonymous:
+            return await handler(request, *args, **kwargs)
+
+        cache = caches[settings.API_CACHE]
+        name = type(self).__name__
+        key = await sync_to_async(self.get_cache_key)(request)
+        data = await cache.aget(key)
+        if data is not None:
+            data = await sync_to_async(self.refresh_cached)(data)
+        if data is not None:
+            await sync_to_async(count)(name, 'hits')
+            return Response(data)
+
+        await sync_to_async(count)(name, 'misses')
+        response = await handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            await cache.aset(key, response.data)
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
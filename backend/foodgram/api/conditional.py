@@ -0,0 +1,103 @@
+from hashlib import md5
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, urlencode
+from rest_framework import status
+
+from recipes.services.versions import get_version, user_scope
+
+
+class ConditionalGetMixin:
+    """
+    Условные запросы (If-None-Match, If-Modified-Since) для list и retrieve.
+
+    ETag вычисляется без сериализации ответа: из адреса с параметрами
+    и версий областей данных `etag_scopes`, для авторизованного
+    пользователя - ещё и из версии его избранного, покупок и подписок.
+    Last-Modified - время изменения самой новой из этих версий.
+    """
+    etag_scopes = ()
+
+    def get_versions(self, request):
+        scopes = list(self.etag_scopes)
+        if not request.user.is_anonymous:
+            scopes.append(user_scope(request.user.id))
+
+        return [get_version(scope) for scope in scopes]
+
+    def get_etag(self, request, versions):
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        versions = '.'.join(str(version) for version in versions)
+        return quote_etag(md5(
+            f'{request.accepted_media_type}:{request.path}?{query}:{versions}'
+            .encode(),
+        ).hexdigest())
+
+    @staticmethod
+    def get_last_modified(versions):
+        """
+        Время последнего изменения ответа (timestamp или None): версия
+        области данных - время её изменения, поэтому ответ изменился
+        не позже самой новой из версий, от которых зависит ETag.
+        """
+        return max(versions) // 10 ** 9 if versions else None
+
+    def get_validators(self, request, *args, **kwargs):
+        """ETag и время последнего изменения (timestamp или None)."""
+        versions = self.get_versions(request)
+        return (
+            self.get_etag(request, versions),
+            self.get_last_modified(versions),
+        )
+
+    @staticmethod
+    def set_validators(response, etag, timestamp):
+        if response.status_code in (
+                status.HTTP_200_OK,
+                status.HTTP_304_NOT_MODIFIED,
+        ):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+
+        return response
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, timestamp = self.get_validators(request, *args, **kwargs)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=timestamp,
+        ) or handler(request, *args, **kwargs)
+        return self.set_validators(response, etag, timestamp)
+
+    async def aconditional_response(self, handler, request, *args, **kwargs):
+        """Вариант conditional_response с асинхронным обработчиком."""
+        etag, timestamp = await sync_to_async(self.get_validators)(
+            request,
+            *args,
+            **kwargs,
+        )
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=timestamp,
+        ) or await handler(request, *args, **kwargs)
+        return self.set_validators(response, etag, timestamp)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
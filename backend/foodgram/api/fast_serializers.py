@@ -0,0 +1,185 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from users.serializers import USER_REQUIRED_FIELDS, is_subscribed
+from .metrics import timed_serializer
+from .serializers import (
+    RecipeReadSerializer,
+    recipe_extras,
+    user_flag,
+)
+
+# Ссылки на файлы хранилища (FileSystemStorage) не зависят от запроса
+# и запоминаются.
+STORAGE_URLS_CACHE_SIZE = 100_000
+
+
+@lru_cache(maxsize=STORAGE_URLS_CACHE_SIZE)
+def storage_url(name):
+    return default_storage.url(name)
+
+
+def absolute(url, request):
+    return request.build_absolute_uri(url) if request else url
+
+
+def prefetched(instance, name):
+    """Объекты связи из prefetch_related без создания менеджера."""
+    try:
+        return instance._prefetched_objects_cache[name]
+    except (AttributeError, KeyError):
+        return getattr(instance, name).all()
+
+
+def image(recipe, request):
+    """Ссылка на картинку, как в FileField: абсолютная при наличии запроса."""
+    name = recipe.image.name
+    return absolute(storage_url(name), request) if name else None
+
+
+def image_variants(recipe, request):
+    """Ссылки на уменьшенные копии, как в serializers.image_variants."""
+    variants = {}
+    for variant in settings.RECIPE_IMAGE_VARIANTS:
+        name = recipe.image_variants.get(variant) or recipe.image.name
+        variants[variant] = absolute(storage_url(name), request)
+
+    return variants
+
+
+def author(recipe, request):
+    user = recipe.author
+    data = {
+        'id': user.id,
+        'is_subscribed': is_subscribed(user, request),
+    }
+    for name in USER_REQUIRED_FIELDS:
+        data[name] = getattr(user, name)
+
+    return data
+
+
+def tags(recipe, request):
+    return [
+        {
+            'id': tag.id,
+            'name': tag.name,
+            'color': tag.color,
+            'slug': tag.slug,
+        }
+        for tag in prefetched(recipe, 'tags')
+    ]
+
+
+def ingredients(recipe, request):
+    return [
+        {
+            'id': row.ingredient_id,
+            'name': row.ingredient.name,
+            'measurement_unit': row.ingredient.measurement_unit,
+            'amount': row.amount,
+        }
+        for row in prefetched(recipe, 'ingredient_list')
+    ]
+
+
+# Поля представления RecipeReadSerializer: функции (рецепт, запрос).
+FIELDS = {
+    'id': lambda recipe, request: recipe.id,
+    'name': lambda recipe, request: recipe.name,
+    'image': image,
+    'image_variants': image_variants,
+    'text': lambda recipe, request: recipe.text,
+    'tags': tags,
+    'author': author,
+    'ingredients': ingredients,
+    'cooking_time': lambda recipe, request: recipe.cooking_time,
+    'is_favorited': lambda recipe, request: user_flag(
+        recipe, 'is_favorited', request,
+    ),
+    'is_in_shopping_cart': lambda recipe, request: user_flag(
+        recipe, 'is_in_shopping_cart', request,
+    ),
+    'favorites_count': lambda recipe, request: recipe.favorites_count,
+    'shopping_cart_count': (
+        lambda recipe, request: recipe.shopping_cart_count
+    ),
+}
+
+# Связи, выводимые идентификаторами (RecipeReadSerializer.collapsed_fields).
+COLLAPSED_FIELDS = {
+    'author': lambda recipe, request: recipe.author_id,
+    'tags': lambda recipe, request: [
+        tag.pk for tag in prefetched(recipe, 'tags')
+    ],
+    'ingredients': lambda recipe, request: [
+        row.ingredient_id for row in prefetched(recipe, 'ingredient_list')
+    ],
+}
+
+
+@lru_cache(maxsize=None)
+def compile_fields(fields, expand):
+    """
+    Упорядоченные пары (поле, функция) для набора полей `fields`
+    (None - все поля и связи) и связей `expand`, выводимых объектами.
+    """
+    return tuple(
+        (
+            name,
+            COLLAPSED_FIELDS[name]
+            if fields is not None
+            and name in COLLAPSED_FIELDS
+            and name not in expand
+            else FIELDS[name],
+        )
+        for name in RecipeReadSerializer.Meta.fields
+        if fields is None or name in fields
+    )
+
+
+class FastRecipeReadSerializer:
+    """
+    Представление рецепта для чтения без полей DRF: каждое поле
+    вычисляется функцией над рецептом с подгруженными связями
+    и аннотациями (with_related, with_user_flags).
+
+    Вывод совпадает с RecipeReadSerializer, включая наборы полей
+    из контекста (`fields`, `expand`) и дополнительные блоки выдачи.
+    """
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        fields = self.context.get('fields')
+        self.fields = compile_fields(
+            None if fields is None else frozenset(fields),
+            frozenset(self.context.get('expand') or ()),
+        )
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        data = {
+            name: getter(instance, request)
+            for name, getter in self.fields
+        }
+        data.update(recipe_extras(instance, self.context))
+        return data
+
+    @property
+    def data(self):
+        with timed_serializer():
+            if self.many:
+                return ReturnList(
+                    [self.to_representation(item) for item in self.instance],
+                    serializer=self,
+                )
+
+            return ReturnDict(
+                self.to_representation(self.instance),
+                serializer=self,
+            )
@@ -1,3 +1,4 @@
+from django_filters.constants import EMPTY_VALUES
 from django_filters.rest_framework import FilterSet, filters
 
 from recipes.models import (
@@ -5,9 +6,12 @@ from recipes.models import (
     Recipe,
     Tag,
 )
+from recipes.services import search
 
 
 class IngredientFilterSet(FilterSet):
+    # Для списка ингредиентов фильтр по названию обслуживает
+    # IngredientViewSet через индекс префиксов в памяти.
     name = filters.CharFilter(lookup_expr='startswith')
 
     class Meta:
@@ -15,6 +19,22 @@ class IngredientFilterSet(FilterSet):
         fields = ('name',)
 
 
+class RecipeOrderingFilter(filters.OrderingFilter):
+    """
+    Сортировка, дополненная убыванием идентификатора: порядок рецептов
+    с равными значениями (счётчиками, датой) однозначен между страницами.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+
+        ordering = [self.get_ordering_value(param) for param in value]
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id')
+        return qs.order_by(*ordering)
+
+
 class RecipeFilterSet(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
@@ -46,6 +66,28 @@ class RecipeFilterSet(FilterSet):
 
         return queryset
 
+    search = filters.CharFilter(method='filter_search')
+
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию, ингредиентам и описанию,
+        результаты упорядочены по релевантности.
+        """
+        if not value.strip():
+            return queryset
+
+        return search.search(queryset, value)
+
+    # Сортировка по популярности обслуживается индексами
+    # по (-favorites_count, -id) и (-shopping_cart_count, -id).
+    ordering = RecipeOrderingFilter(
+        fields=(
+            'pub_date',
+            'favorites_count',
+            'shopping_cart_count',
+        ),
+    )
+
     class Meta:
         model = Recipe
         fields = (
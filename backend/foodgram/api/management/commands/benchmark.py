@@ -0,0 +1,78 @@
+import json
+import platform
+from importlib import import_module
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+SCENARIOS = (
+    'connections',
+    'endpoints',
+    'feed',
+    'pagination',
+    'pantry',
+    'renderers',
+    'search',
+    'serializers',
+    'slow_clients',
+)
+
+DEFAULT_OPTIONS = (
+    'verbosity',
+    'settings',
+    'pythonpath',
+    'traceback',
+    'no_color',
+    'force_color',
+    'skip_checks',
+)
+
+
+class Command(BaseCommand):
+    help = 'Замеры производительности API по сценариям'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help='Сохранить результаты в JSON-файл для сравнения '
+                 'между коммитами',
+        )
+        subparsers = parser.add_subparsers(
+            dest='scenario',
+            required=True,
+        )
+        for name in SCENARIOS:
+            scenario = import_module(f'api.benchmarks.{name}')
+            scenario.add_arguments(
+                subparsers.add_parser(name, help=scenario.help)
+            )
+
+    def handle(self, scenario, *args, output=None, **options):
+        results = import_module(f'api.benchmarks.{scenario}').run(**options)
+        report = json.dumps(results, ensure_ascii=False, indent=2)
+        self.stdout.write(report)
+        if output:
+            options = {
+                key: value
+                for key, value in options.items()
+                if key not in DEFAULT_OPTIONS
+            }
+            with open(output, 'w', encoding='utf-8') as output_file:
+                json.dump(
+                    {
+                        'scenario': scenario,
+                        'options': options,
+                        'created': timezone.now().isoformat(),
+                        'environment': {
+                            'python': platform.python_version(),
+                            'django': django.get_version(),
+                            'database': connection.vendor,
+                        },
+                        'results': results,
+                    },
+                    output_file,
+                    ensure_ascii=False,
+                    indent=2,
+                )
@@ -0,0 +1,103 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from api.cache import response_cache_stats
+
+# Замеры текущего запроса: заполняются промежуточным слоем
+# InstrumentationMiddleware и сериализаторами с TimedSerializerMixin.
+request_measurements = ContextVar('request_measurements', default=None)
+serializer_depth = ContextVar('serializer_depth', default=0)
+
+_lock = Lock()
+_endpoints = defaultdict(lambda: {
+    'requests': 0,
+    'queries': 0,
+    'queries_max': 0,
+    'db_seconds': 0.0,
+    'serializer_seconds': 0.0,
+    'seconds': 0.0,
+    'budget_exceeded': 0,
+})
+
+
+@contextmanager
+def timed_serializer():
+    """
+    Учёт времени сериализации в замерах текущего запроса.
+    Вложенные замеры входят во время внешнего и отдельно не учитываются.
+    """
+    measurements = request_measurements.get()
+    depth = serializer_depth.get()
+    if measurements is None or depth:
+        yield
+        return
+
+    token = serializer_depth.set(depth + 1)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        measurements['serializer_seconds'] += time.perf_counter() - started
+        serializer_depth.reset(token)
+
+
+class TimedSerializerMixin:
+    """Учёт времени to_representation в замерах текущего запроса."""
+
+    def to_representation(self, instance):
+        with timed_serializer():
+            return super().to_representation(instance)
+
+
+def record(endpoint: tuple, measurements: dict, budget_exceeded: bool):
+    with _lock:
+        stats = _endpoints[endpoint]
+        stats['requests'] += 1
+        stats['queries'] += measurements['queries']
+        stats['queries_max'] = max(
+            stats['queries_max'],
+            measurements['queries'],
+        )
+        stats['db_seconds'] += measurements['db_seconds']
+        stats['serializer_seconds'] += measurements['serializer_seconds']
+        stats['seconds'] += measurements['seconds']
+        stats['budget_exceeded'] += budget_exceeded
+
+
+METRICS = (
+    ('requests', 'counter', 'Количество запросов'),
+    ('queries', 'counter', 'Количество SQL-запросов'),
+    ('queries_max', 'gauge', 'Наибольшее число SQL-запросов за запрос'),
+    ('db_seconds', 'counter', 'Время выполнения SQL-запросов'),
+    ('serializer_seconds', 'counter', 'Время сериализации ответов'),
+    ('seconds', 'counter', 'Полное время обработки запросов'),
+    ('budget_exceeded', 'counter', 'Превышения бюджета SQL-запросов'),
+)
+
+
+def render_prometheus() -> str:
+    """Замеры процесса в текстовом формате Prometheus."""
+    with _lock:
+        endpoints = {key: dict(value) for key, value in _endpoints.items()}
+
+    lines = []
+    for metric, kind, description in METRICS:
+        name = f'foodgram_endpoint_{metric}'
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (view, method), stats in sorted(endpoints.items()):
+            lines.append(
+                f'{name}{{endpoint="{view}",method="{method}"}} '
+                f'{stats[metric]}'
+            )
+
+    for event in ('hits', 'misses'):
+        name = f'foodgram_response_cache_{event}'
+        lines.append(f'# TYPE {name} counter')
+        for viewset, stats in response_cache_stats().items():
+            lines.append(f'{name}{{viewset="{viewset}"}} {stats[event]}')
+
+    return '\n'.join(lines) + '\n'
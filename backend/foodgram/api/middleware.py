@@ -0,0 +1,122 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from api import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление выполнило больше SQL-запросов, чем разрешено."""
+
+
+def endpoint_name(request):
+    """
+    Имя представления и действия: RecipeViewSet.list,
+    RecipeViewSet.favorite, api:metrics и т.п.
+    """
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved'
+
+    view_class = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None) or {}
+    if view_class is None:
+        return match.view_name
+
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Учёт SQL-запроса в замерах текущего запроса. Замеры передаются
+    через ContextVar и доступны и в потоках sync_to_async асинхронных
+    представлений, которые работают с собственными соединениями.
+    """
+    measurements = metrics.request_measurements.get()
+    if measurements is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        measurements['queries'] += 1
+        measurements['db_seconds'] += time.perf_counter() - started
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """Подключение count_query к новому соединению (connection_created)."""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class InstrumentationMiddleware:
+    """
+    Замер числа и времени SQL-запросов, времени сериализации и полного
+    времени обработки запроса по представлениям и действиям.
+
+    Бюджеты SQL-запросов задаются в API_QUERY_BUDGETS. При превышении
+    бюджета пишется предупреждение, а при API_QUERY_BUDGETS_STRICT
+    выбрасывается QueryBudgetExceeded (для тестов).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        measurements, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.request_measurements.reset(token)
+        self.finish(request, measurements, started)
+        return response
+
+    async def __acall__(self, request):
+        measurements, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.request_measurements.reset(token)
+        self.finish(request, measurements, started)
+        return response
+
+    @staticmethod
+    def start():
+        measurements = {
+            'queries': 0,
+            'db_seconds': 0.0,
+            'serializer_seconds': 0.0,
+            'seconds': 0.0,
+        }
+        token = metrics.request_measurements.set(measurements)
+        return measurements, token, time.perf_counter()
+
+    @staticmethod
+    def finish(request, measurements, started):
+        measurements['seconds'] = time.perf_counter() - started
+
+        endpoint = endpoint_name(request)
+        budget = settings.API_QUERY_BUDGETS.get(endpoint)
+        exceeded = budget is not None and measurements['queries'] > budget
+        metrics.record((endpoint, request.method), measurements, exceeded)
+        if exceeded:
+            message = (
+                f'{endpoint}: {measurements["queries"]} SQL-запросов '
+                f'при бюджете {budget}'
+            )
+            if settings.API_QUERY_BUDGETS_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
@@ -0,0 +1,258 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(pagination.PageNumberPagination):
+    """
+    Постраничная пагинация с опциональным режимом курсора (keyset).
+
+    По умолчанию работает как обычная постраничная пагинация
+    с параметром `limit`. Режим курсора включается параметром `cursor`
+    (пустое значение - первая страница): страница выбирается условием
+    по ключу сортировки вместо OFFSET, а общее количество не считается.
+    """
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_page_size = 10
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        queryset = self.get_cursor_queryset(queryset, request)
+        return self.get_cursor_page(list(queryset[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Вариант paginate_queryset для асинхронных представлений:
+        количество и страница читаются асинхронными запросами.
+        """
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if self.cursor_mode:
+            queryset = self.get_cursor_queryset(queryset, request)
+            return self.get_cursor_page(
+                [item async for item in queryset[:self.page_size + 1]]
+            )
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number,
+                message=str(exc),
+            ))
+
+        self.page.object_list = [item async for item in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+
+        return list(self.page)
+
+    def get_cursor_queryset(self, queryset, request):
+        """Выборка после позиции курсора в порядке ключа сортировки."""
+        self.request = request
+        self.page_size = self.get_page_size(request) or self.cursor_page_size
+        self.ordering = self.get_ordering(queryset)
+        self.cursor_values, self.cursor_reverse = self.decode_cursor(
+            request,
+            queryset.model,
+        )
+
+        ordering = (
+            [self.invert(field) for field in self.ordering]
+            if self.cursor_reverse else self.ordering
+        )
+        queryset = queryset.order_by(*ordering)
+        if self.cursor_values is not None:
+            queryset = queryset.filter(
+                self.after(ordering, self.cursor_values),
+            )
+
+        return queryset
+
+    def get_cursor_page(self, results):
+        """Страница из page_size + 1 прочитанных после курсора записей."""
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.cursor_reverse:
+            results.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous = self.cursor_values is not None
+            self.has_next = has_more
+
+        self.page_results = results
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+
+        if not (self.has_next and self.page_results):
+            return None
+
+        return self.encode_cursor(self.page_results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+
+        if not (self.has_previous and self.page_results):
+            return None
+
+        return self.encode_cursor(self.page_results[0], reverse=True)
+
+    @staticmethod
+    def get_ordering(queryset):
+        """
+        Ключ сортировки страницы: сортировка выборки (или модели),
+        дополненная первичным ключом для однозначности.
+        """
+        ordering = list(
+            queryset.query.order_by or queryset.model._meta.ordering
+        )
+        pk_names = ('pk', queryset.model._meta.pk.name)
+        if not any(field.lstrip('-') in pk_names for field in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+
+        return ordering
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def after(ordering, values):
+        """
+        Условие "строго после" для кортежа значений ключа сортировки:
+        (a < x) OR (a = x AND b < y) OR ...
+
+        Нестрогая граница по первому полю позволяет базе начать
+        сканирование индекса сразу с нужной позиции.
+        """
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{f'{name}__{lookup}': values[index]})
+            for previous, value in zip(ordering[:index], values):
+                condition &= Q(**{previous.lstrip('-'): value})
+            conditions.append(condition)
+
+        first = ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        return (
+            Q(**{f'{first.lstrip("-")}__{lookup}': values[0]})
+            & reduce(or_, conditions)
+        )
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            payload = json.loads(b64decode(encoded.encode('ascii')))
+            values, reverse = payload['v'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        try:
+            values = [
+                self.to_python(model, field.lstrip('-'), value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return values, reverse
+
+    @staticmethod
+    def to_python(model, name, value):
+        """
+        Значение ключа сортировки из курсора, приведённое к типу поля:
+        значение другого типа не должно попасть в условие выборки.
+        """
+        try:
+            field = (
+                model._meta.pk if name == 'pk'
+                else model._meta.get_field(name)
+            )
+        except FieldDoesNotExist:
+            # Аннотация: значение сравнивается как есть.
+            field = None
+        if field is not None:
+            value = field.to_python(value)
+        if value is None:
+            raise ValueError(name)
+
+        return value
+
+    def encode_cursor(self, instance, reverse):
+        values = [
+            self.get_value(instance, field.lstrip('-'))
+            for field in self.ordering
+        ]
+        encoded = b64encode(json.dumps(
+            {'v': values, 'r': reverse},
+            default=str,
+        ).encode('ascii')).decode('ascii')
+        url = remove_query_param(
+            self.request.build_absolute_uri(),
+            self.page_query_param,
+        )
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    @staticmethod
+    def get_value(instance, name):
+        if name == 'pk':
+            return instance.pk
+
+        field = next(
+            (field for field in instance._meta.concrete_fields
+             if field.name == name),
+            None,
+        )
+        return getattr(instance, field.attname if field else name)
+
+
+class PantryPagination(pagination.PageNumberPagination):
+    """Постраничная выдача подбора рецептов по имеющимся ингредиентам."""
+    page_size = 10
+    page_size_query_param = 'limit'
+    max_page_size = 100
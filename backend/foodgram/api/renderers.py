@@ -0,0 +1,120 @@
+import codecs
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+INT64_LIMIT = 2 ** 63
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class PlainTextRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+
+        return str(data).encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson с тем же результатом, что и у JSONRenderer
+    при настройках по умолчанию (UNICODE_JSON, COMPACT_JSON): даты,
+    Decimal и ленивые строки кодируются кодировщиком DRF. Отступы,
+    COMPACT_JSON = False и данные, которые orjson не кодирует (целые
+    больше 64 бит), обрабатываются стандартным json. Отличия не меняют
+    значений: экспонента чисел пишется без знака «+» и ведущих нулей
+    (1e20 вместо 1e+20), NaN и бесконечности кодируются как null.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+                orjson is None
+                or data is None
+                or self.ensure_ascii
+                or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=JSONEncoder().default,
+                option=(
+                    orjson.OPT_NON_STR_KEYS
+                    | orjson.OPT_PASSTHROUGH_DATETIME
+                    | orjson.OPT_PASSTHROUGH_DATACLASS
+                ),
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Как и JSONRenderer, экранируем U+2028 и U+2029.
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
+
+
+def has_huge_number(data) -> bool:
+    """
+    Есть ли в разобранных orjson данных число вне диапазона int64:
+    такие целые orjson возвращает как float.
+    """
+    if isinstance(data, float):
+        return abs(data) >= INT64_LIMIT
+    if isinstance(data, dict):
+        return any(map(has_huge_number, data.values()))
+    if isinstance(data, list):
+        return any(map(has_huge_number, data))
+    return False
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser на orjson. Тело, которое orjson не разбирает или разбирает
+    иначе (другая кодировка, NaN и Infinity, целые вне int64, ошибки),
+    разбирается стандартным json с теми же результатом и сообщениями
+    об ошибках.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read() if stream is not None else b''
+        try:
+            data = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            pass
+        else:
+            if not has_huge_number(data):
+                return data
+
+        return super().parse(io.BytesIO(body), media_type, parser_context)
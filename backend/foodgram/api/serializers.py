@@ -1,20 +1,39 @@
+import base64
+import binascii
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.db import transaction
 from rest_framework import status
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import (
     CharField,
+    IntegerField,
+    ListField,
     ModelSerializer,
+    Serializer,
     SerializerMethodField,
+    SlugRelatedField,
     PrimaryKeyRelatedField,
 )
 
+from api.metrics import TimedSerializerMixin
 from recipes.models import (
     Tag,
     Recipe,
     Ingredient,
     IngredientInRecipe,
 )
+from recipes.services import (
+    counters,
+    feed,
+    image_pipeline,
+    pantry_index,
+    search,
+    shopping_list_services,
+)
 from users.models import Subscription
 from users.serializers import (
     BaseUserSerializer,
@@ -22,13 +41,13 @@ from users.serializers import (
 )
 
 
-class TagSerializer(ModelSerializer):
+class TagSerializer(TimedSerializerMixin, ModelSerializer):
     class Meta:
         model = Tag
         fields = '__all__'
 
 
-class IngredientSerializer(ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, ModelSerializer):
     class Meta:
         model = Ingredient
         fields = (
@@ -62,7 +81,7 @@ class IngredientInRecipeSerializer(ModelSerializer):
         )
 
 
-class BaseRecipeSerializer(ModelSerializer):
+class BaseRecipeSerializer(TimedSerializerMixin, ModelSerializer):
     image = Base64ImageField()
 
     class Meta:
@@ -75,7 +94,101 @@ class BaseRecipeSerializer(ModelSerializer):
         )
 
 
-class RecipeReadSerializer(ModelSerializer):
+def image_variants(recipe, request=None):
+    """
+    Ссылки на уменьшенные копии картинки рецепта. Пока копии не готовы,
+    вместо них отдаётся исходная картинка.
+    """
+    variants = {}
+    for variant in settings.RECIPE_IMAGE_VARIANTS:
+        name = recipe.image_variants.get(variant)
+        url = default_storage.url(name) if name else recipe.image.url
+        variants[variant] = (
+            request.build_absolute_uri(url) if request else url
+        )
+
+    return variants
+
+
+USER_FLAG_RELATIONS = {
+    'is_favorited': 'favorites',
+    'is_in_shopping_cart': 'shopping_cart',
+}
+
+
+def user_flag(recipe, name, request):
+    """
+    Признак нахождения рецепта в избранном или списке покупок:
+    из аннотации with_user_flags или отдельным запросом.
+    """
+    if hasattr(recipe, name):
+        return getattr(recipe, name)
+
+    user = request.user
+    return (not user.is_anonymous
+            and getattr(user, USER_FLAG_RELATIONS[name]).filter(
+                recipe=recipe,
+            ).exists())
+
+
+def recipe_extras(recipe, context):
+    """Дополнительные блоки представления рецепта в зависимости от выдачи."""
+    extras = {}
+    # Релевантность и подсветка при поиске (?search=).
+    if hasattr(recipe, 'search_rank'):
+        extras['search'] = {
+            'rank': recipe.search_rank,
+            'highlight': context.get(
+                'search_highlights', {},
+            ).get(recipe.id),
+        }
+    # Покрытие ингредиентов рецепта при подборе по имеющимся.
+    pantry = context.get('pantry_matches', {}).get(recipe.id)
+    if pantry is not None:
+        matched, required = pantry
+        extras['pantry'] = {
+            'matched': matched,
+            'required': required,
+            'missing': required - matched,
+            'coverage': round(matched / required, 4),
+        }
+    # Сходство с рецептом или историей пользователя в рекомендациях.
+    if hasattr(recipe, 'similarity'):
+        extras['similarity'] = round(recipe.similarity, 4)
+
+    return extras
+
+
+class SparseFieldsMixin:
+    """
+    Набор полей представления из контекста: `fields` - выводимые поля
+    (None - все), `expand` - связи, выводимые вложенными объектами.
+    Связи из `collapsed_fields`, не указанные в `expand`, выводятся
+    идентификаторами. Без `fields` выводятся все поля и связи.
+    """
+    collapsed_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        if requested is None:
+            return fields
+
+        expand = self.context.get('expand', ())
+        for name in list(fields):
+            if name not in requested:
+                del fields[name]
+            elif name in self.collapsed_fields and name not in expand:
+                fields[name] = self.collapsed_fields[name]()
+
+        return fields
+
+
+class RecipeReadSerializer(
+    SparseFieldsMixin,
+    TimedSerializerMixin,
+    ModelSerializer,
+):
     tags = TagSerializer(
         many=True,
         read_only=True,
@@ -88,6 +201,9 @@ class RecipeReadSerializer(ModelSerializer):
         many=True,
     )
     image = Base64ImageField()
+    image_variants = SerializerMethodField(
+        read_only=True,
+    )
     is_favorited = SerializerMethodField(
         read_only=True,
     )
@@ -95,21 +211,34 @@ class RecipeReadSerializer(ModelSerializer):
         read_only=True,
     )
 
+    collapsed_fields = {
+        'author': lambda: PrimaryKeyRelatedField(read_only=True),
+        'tags': lambda: PrimaryKeyRelatedField(many=True, read_only=True),
+        'ingredients': lambda: SlugRelatedField(
+            source='ingredient_list',
+            slug_field='ingredient_id',
+            many=True,
+            read_only=True,
+        ),
+    }
+
+    def get_image_variants(self, obj):
+        return image_variants(obj, self.context.get('request'))
+
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        return (not user.is_anonymous
-                and user.favorites.filter(
-                    recipe=obj,
-                ).exists())
+        return user_flag(obj, 'is_favorited', self.context.get('request'))
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return (not user.is_anonymous
-                and user.shopping_cart.filter(
-                    recipe=obj,
-                ).exists())
+        return user_flag(
+            obj,
+            'is_in_shopping_cart',
+            self.context.get('request'),
+        )
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(recipe_extras(instance, self.context))
+        return data
 
     class Meta:
         model = Recipe
@@ -117,6 +246,7 @@ class RecipeReadSerializer(ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'text',
             'tags',
             'author',
@@ -124,17 +254,52 @@ class RecipeReadSerializer(ModelSerializer):
             'cooking_time',
             'is_favorited',
             'is_in_shopping_cart',
+            'favorites_count',
+            'shopping_cart_count',
         )
 
 
-class RecipeModifySerializer(ModelSerializer):
+class RecipeImageField(Base64ImageField):
+    """
+    Картинка рецепта. Текущая картинка рецепта, переданная при
+    редактировании адресом или тем же содержимым, не декодируется
+    и не сохраняется повторно.
+    """
+
+    def to_internal_value(self, data):
+        current = getattr(self.parent.instance, 'image', None)
+        if current and isinstance(data, str) and self.is_current(
+                current,
+                data,
+        ):
+            return current
+
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def is_current(current, data):
+        if urlparse(data).path == current.url:
+            return True
+
+        try:
+            decoded = base64.b64decode(data.split(';base64,')[-1])
+            if len(decoded) != current.size:
+                return False
+
+            with current.storage.open(current.name, 'rb') as image_file:
+                return image_file.read() == decoded
+        except (binascii.Error, ValueError, OSError):
+            return False
+
+
+class RecipeModifySerializer(TimedSerializerMixin, ModelSerializer):
     author = BaseUserSerializer(read_only=True)
     tags = PrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
     )
     ingredients = IngredientInRecipeSerializer(many=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     @staticmethod
     def validate_tags(value):
@@ -179,25 +344,99 @@ class RecipeModifySerializer(ModelSerializer):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
+        counters.change_recipes_count(recipe.author_id, 1)
+        feed.fan_out(recipe)
         recipe.tags.set(tags)
         self.create_ingredients_amounts(
             recipe=recipe,
             ingredients=ingredients,
         )
+        search.index_recipes((recipe.id,))
+        pantry_index.update_recipe(
+            recipe.id,
+            (),
+            (ingredient['ingredient']['id'].id for ingredient in ingredients),
+        )
+        image_pipeline.schedule(recipe)
         return recipe
 
+    @staticmethod
+    def update_tags(recipe, tags):
+        old = set(recipe.tags.values_list('id', flat=True))
+        new = {tag.id for tag in tags}
+        if old - new:
+            recipe.tags.remove(*(old - new))
+        if new - old:
+            recipe.tags.add(*(new - old))
+
+    @staticmethod
+    def update_ingredients_amounts(recipe, rows, new):
+        """
+        Приведение ингредиентов рецепта к `new` минимальным числом
+        вставок, удалений и обновлений.
+        """
+        removed = [
+            row.pk
+            for ingredient_id, row in rows.items()
+            if ingredient_id not in new
+        ]
+        changed = []
+        for ingredient_id, amount in new.items():
+            row = rows.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+
+        if removed:
+            IngredientInRecipe.objects.filter(pk__in=removed).delete()
+        IngredientInRecipe.objects.bulk_create([
+            IngredientInRecipe(
+                ingredient_id=ingredient_id,
+                recipe=recipe,
+                amount=amount,
+            )
+            for ingredient_id, amount in new.items()
+            if ingredient_id not in rows
+        ])
+        IngredientInRecipe.objects.bulk_update(changed, ('amount',))
+
     @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        if validated_data.get('image') is instance.image:
+            del validated_data['image']
+        rows = {
+            row.ingredient_id: row
+            for row in instance.ingredient_list.all()
+        }
+        old_amounts = {
+            ingredient_id: row.amount
+            for ingredient_id, row in rows.items()
+        }
+        new_amounts = {
+            ingredient['ingredient']['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        old_image = instance.image.name
+        old_variants = instance.image_variants
+        if 'image' in validated_data:
+            # Копии прежней картинки не отдаются, новые создаст обработка.
+            instance.image_variants = {}
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients_amounts(
-            recipe=instance,
-            ingredients=ingredients,
-        )
+        if instance.image.name != old_image:
+            image_pipeline.discard(old_image, old_variants)
+            image_pipeline.schedule(instance)
+        self.update_tags(instance, tags)
+        with shopping_list_services.batched():
+            self.update_ingredients_amounts(instance, rows, new_amounts)
+            shopping_list_services.change_recipe(
+                recipe=instance,
+                old=old_amounts,
+                new=new_amounts,
+            )
+        search.index_recipes((instance.id,))
+        pantry_index.update_recipe(instance.id, rows, new_amounts)
         return instance
 
     def to_representation(self, instance):
@@ -220,26 +459,60 @@ class RecipeModifySerializer(ModelSerializer):
         )
 
 
+class RecipeIdsSerializer(Serializer):
+    """Идентификаторы рецептов для массового добавления и удаления."""
+
+    ids = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+
+
+class PantrySerializer(Serializer):
+    """Имеющиеся ингредиенты: ?ingredients=1&ingredients=2."""
+
+    ingredients = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+
+
+def get_recipes_limit(request):
+    """Число рецептов автора в подписках из параметра recipes_limit."""
+    limit = request.query_params.get('recipes_limit')
+    if not limit:
+        return None
+
+    if not limit.isdigit() or int(limit) < 1:
+        raise ValidationError({
+            'recipes_limit': 'Укажите целое положительное число'
+        })
+
+    return int(limit)
+
+
 class SubscribeSerializer(BaseUserSerializer):
-    recipes_count = SerializerMethodField()
     recipes = SerializerMethodField()
 
-    @staticmethod
-    def get_recipes_count(obj):
-        return obj.recipes.count()
-
     class Meta(BaseUserSerializer.Meta):
         fields = (
             *BaseUserSerializer.Meta.fields,
             'recipes_count',
+            'followers_count',
             'recipes',
         )
         read_only_fields = USER_REQUIRED_FIELDS
 
+    @transaction.atomic
     def save(self, **kwargs):
         user = self.context.get('request').user
         author = self.instance
         Subscription.objects.create(user=user, author=author)
+        counters.change_followers(author.id, 1)
+        feed.subscribe(user.id, author.id)
+        author.followers_count += 1
         return super().save(**kwargs)
 
     def validate(self, data):
@@ -259,15 +532,19 @@ class SubscribeSerializer(BaseUserSerializer):
                 detail='Нельзя подписаться на себя',
                 code=status.HTTP_400_BAD_REQUEST
             )
+
+        get_recipes_limit(self.context.get('request'))
         return data
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = (
-            obj.recipes.all()[:int(limit)]
-            if limit else obj.recipes.all()
-        )
+        # Рецепты авторов страницы могут быть выбраны заранее одним запросом.
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.id, [])
+        else:
+            limit = get_recipes_limit(self.context.get('request'))
+            recipes = obj.recipes.all()[:limit]
+
         serializer = BaseRecipeSerializer(
             recipes,
             many=True,
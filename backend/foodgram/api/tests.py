@@ -0,0 +1,891 @@
+import io
+import json
+import tempfile
+from base64 import b64encode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import parse_http_date
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.benchmarks.serializers import load, make_request
+from api.cache import response_cache_stats
+from api.fast_serializers import FastRecipeReadSerializer
+from api.serializers import RecipeReadSerializer
+from recipes.models import (
+    Favourite,
+    FeedItem,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipePosting,
+    ShoppingCart,
+    Tag,
+)
+from recipes.services import (
+    counters,
+    feed,
+    image_pipeline,
+    pantry_index,
+    search,
+)
+from users.authentication import token_cache
+from users.models import Subscription, User
+
+RECIPES = 12
+
+# Наборы полей (?fields=, ?expand=) для сверки сериализаторов.
+FIELD_SETS = {
+    'full': (None, None),
+    'card': ({'id', 'name', 'image', 'cooking_time'}, set()),
+    'collapsed': ({'id', 'author', 'tags', 'ingredients'}, set()),
+    'expanded': (
+        {'id', 'author', 'tags', 'ingredients', 'is_favorited'},
+        {'author', 'tags', 'ingredients'},
+    ),
+}
+
+
+def create_recipes():
+    """Рецепты разных авторов с тегами, ингредиентами и отметками читателя."""
+    reader = User.objects.create_user(
+        email='reader@example.com',
+        username='reader',
+        password='password',
+    )
+    authors = [
+        User.objects.create_user(
+            email=f'author{number}@example.com',
+            username=f'author{number}',
+            password='password',
+        )
+        for number in range(3)
+    ]
+    tags = Tag.objects.bulk_create(
+        Tag(name=f'Тег {number}', color=f'#00000{number}', slug=f'tag{number}')
+        for number in range(3)
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(5)
+    )
+    for number in range(RECIPES):
+        recipe = Recipe.objects.create(
+            author=authors[number % len(authors)],
+            name=f'Рецепт {number}',
+            text='Описание',
+            image=f'recipes/images/{number}.png',
+            cooking_time=number + 1,
+        )
+        recipe.tags.set(tags[:number % len(tags) + 1])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=number + 1,
+            )
+            for ingredient in ingredients[:number % len(ingredients) + 1]
+        )
+        if number % 2:
+            Favourite.objects.create(user=reader, recipe=recipe)
+        if number % 3:
+            ShoppingCart.objects.create(user=reader, recipe=recipe)
+
+    Subscription.objects.create(user=reader, author=authors[0])
+    return reader
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов страницы рецептов не зависит от её размера."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_recipes()
+
+    def count_queries(self, client, limit, **params):
+        caches[settings.API_CACHE].clear()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get('/api/recipes/', {'limit': limit, **params})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(context)
+
+    def test_constant_queries(self):
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.reader)
+        for fast in (False, True):
+            for name, client in (
+                    ('anonymous', anonymous),
+                    ('authenticated', authenticated),
+            ):
+                for params in ({}, {'cursor': ''}):
+                    with self.subTest(fast=fast, user=name, **params):
+                        with override_settings(API_FAST_SERIALIZERS=fast):
+                            self.assertEqual(
+                                self.count_queries(client, 2, **params),
+                                self.count_queries(client, RECIPES, **params),
+                            )
+
+
+class RecipeCursorTest(TestCase):
+    """Курсор с неверными значениями ключа сортировки - 404, а не 500."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipes()
+
+    @staticmethod
+    def cursor(values, reverse=False):
+        return b64encode(
+            json.dumps({'v': values, 'r': reverse}).encode(),
+        ).decode()
+
+    def test_pages(self):
+        client = APIClient()
+        response = client.get('/api/recipes/', {'limit': 5, 'cursor': ''})
+        ids = [recipe['id'] for recipe in response.data['results']]
+        while response.data['next']:
+            response = client.get(response.data['next'])
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+
+        self.assertEqual(
+            ids,
+            list(Recipe.objects.values_list('id', flat=True)),
+        )
+
+    def test_ordering_ties(self):
+        # Счётчики многих рецептов равны: страницы не пересекаются.
+        client = APIClient()
+        ids = []
+        for page in (1, 2, 3):
+            response = client.get(
+                '/api/recipes/',
+                {'ordering': 'favorites_count', 'limit': 5, 'page': page},
+            )
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+
+        self.assertEqual(
+            ids,
+            list(Recipe.objects.order_by(
+                'favorites_count',
+                '-id',
+            ).values_list('id', flat=True)),
+        )
+
+    def test_invalid_cursor(self):
+        for cursor in (
+                'not base64',
+                self.cursor(['xx', 1]),
+                self.cursor([None, 1]),
+                self.cursor(['2023-01-01T00:00:00', 'xx']),
+                self.cursor([[1], {'a': 1}]),
+                self.cursor([1]),
+        ):
+            with self.subTest(cursor=cursor):
+                response = APIClient().get('/api/recipes/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class RecipeConditionalGetTest(TestCase):
+    """Last-Modified рецептов следует за версиями всех областей ETag."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipes()
+
+    def setUp(self):
+        caches[settings.API_CACHE].clear()
+
+    def test_invalid_pk(self):
+        for path in ('/api/recipes/abc/', '/api/recipes/abc/similar/'):
+            with self.subTest(path=path):
+                response = APIClient().get(path)
+                self.assertEqual(response.status_code, 404)
+
+    def test_last_modified(self):
+        client = APIClient()
+        recipe = Recipe.objects.first()
+        for path in ('/api/recipes/', f'/api/recipes/{recipe.id}/'):
+            with self.subTest(path=path):
+                response = client.get(path)
+                self.assertIn('Last-Modified', response)
+                self.assertEqual(
+                    client.get(
+                        path,
+                        HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                    ).status_code,
+                    304,
+                )
+
+    def test_tag_change(self):
+        client = APIClient()
+        recipe = Recipe.objects.first()
+        path = f'/api/recipes/{recipe.id}/'
+        response = client.get(path)
+        last_modified = parse_http_date(response['Last-Modified'])
+
+        tag = recipe.tags.first()
+        tag.name = 'Новое имя'
+        tag.save()
+        changed = client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(changed.status_code, 200)
+        self.assertGreaterEqual(
+            parse_http_date(changed['Last-Modified']),
+            last_modified,
+        )
+
+
+class RecipeCountersCacheTest(TestCase):
+    """Изменение счётчиков рецепта сбрасывает кэш и ETag ответов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_recipes()
+
+    def setUp(self):
+        caches[settings.API_CACHE].clear()
+
+    def test_favorite(self):
+        recipe = Recipe.objects.exclude(favorites__user=self.reader).first()
+        path = f'/api/recipes/{recipe.id}/'
+        anonymous = APIClient()
+        response = anonymous.get(path)
+        count = response.data['favorites_count']
+
+        reader = APIClient()
+        reader.force_authenticate(self.reader)
+        self.assertEqual(
+            reader.post(f'{path}favorite/').status_code,
+            201,
+        )
+        changed = anonymous.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['favorites_count'], count + 1)
+
+    def test_other_recipes(self):
+        recipe, other = Recipe.objects.exclude(
+            favorites__user=self.reader,
+        )[:2]
+        anonymous = APIClient()
+        detail = anonymous.get(f'/api/recipes/{other.id}/')
+        page = anonymous.get('/api/recipes/', {'limit': RECIPES})
+        misses = response_cache_stats()['RecipeViewSet']['misses']
+
+        Favourite.objects.create(user=self.reader, recipe=recipe)
+        self.assertEqual(counters.reconcile(check=True)['favorites_count'], 0)
+        self.assertEqual(
+            anonymous.get(
+                f'/api/recipes/{other.id}/',
+                HTTP_IF_NONE_MATCH=detail['ETag'],
+            ).status_code,
+            304,
+        )
+        changed = anonymous.get(
+            '/api/recipes/',
+            {'limit': RECIPES},
+            HTTP_IF_NONE_MATCH=page['ETag'],
+        )
+        self.assertEqual(changed.status_code, 200)
+        # Список отдан из кеша с текущими счётчиками.
+        self.assertEqual(
+            response_cache_stats()['RecipeViewSet']['misses'],
+            misses,
+        )
+        counts = {
+            item['id']: item['favorites_count']
+            for item in changed.data['results']
+        }
+        self.assertEqual(
+            counts,
+            dict(Recipe.objects.values_list('id', 'favorites_count')),
+        )
+
+
+class RecipeBulkTest(TestCase):
+    """Массовое добавление меняет счётчики только вставленных рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_recipes()
+
+    def test_add_twice(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        ids = list(Recipe.objects.values_list('id', flat=True))
+        before = dict(Recipe.objects.values_list('id', 'favorites_count'))
+        present = set(
+            Favourite.objects.filter(
+                user=self.reader,
+            ).values_list('recipe_id', flat=True)
+        )
+
+        for _ in range(2):
+            response = client.post(
+                '/api/recipes/favorite/',
+                {'ids': ids},
+                format='json',
+            )
+            self.assertIn(response.status_code, (200, 201))
+
+        self.assertEqual(
+            dict(Recipe.objects.values_list('id', 'favorites_count')),
+            {
+                id_: count + (id_ not in present)
+                for id_, count in before.items()
+            },
+        )
+
+
+class FastRecipeReadSerializerTest(TestCase):
+    """FastRecipeReadSerializer выводит то же, что RecipeReadSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_recipes()
+
+    def assertSameOutput(self, recipes, context):
+        self.assertEqual(
+            JSONRenderer().render(FastRecipeReadSerializer(
+                recipes,
+                many=True,
+                context=context,
+            ).data).decode(),
+            JSONRenderer().render(RecipeReadSerializer(
+                recipes,
+                many=True,
+                context=context,
+            ).data).decode(),
+        )
+
+    def test_fields(self):
+        for name, (fields, expand) in FIELD_SETS.items():
+            for user in (None, self.reader):
+                with self.subTest(fields=name, user=user):
+                    request = make_request(user)
+                    self.assertSameOutput(
+                        load(request, fields, expand, RECIPES),
+                        {
+                            'request': request,
+                            'fields': fields,
+                            'expand': expand,
+                        },
+                    )
+
+    def test_unannotated(self):
+        # Признаки читаются запросами, без аннотаций и подгрузки.
+        self.assertSameOutput(
+            list(Recipe.objects.order_by('-id')),
+            {'request': make_request(self.reader)},
+        )
+
+    def test_no_request(self):
+        self.assertSameOutput(
+            load(make_request(), None, None, RECIPES),
+            {},
+        )
+
+    def test_extras(self):
+        request = make_request(self.reader)
+        page = load(request, None, None, RECIPES)
+        for recipe in page[::2]:
+            recipe.search_rank = 0.5
+            recipe.similarity = 1 / 3
+
+        self.assertSameOutput(
+            page,
+            {
+                'request': request,
+                'search_highlights': {page[0].id: '<b>рецепт</b>'},
+                'pantry_matches': {
+                    recipe.id: (1, 3) for recipe in page[1::2]
+                },
+            },
+        )
+
+
+class ShoppingListSyncTest(TestCase):
+    """Материализованные списки покупок совпадают с агрегацией."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_recipes()
+        counters.reconcile()
+
+    def assertInSync(self):
+        call_command('rebuild_shopping_lists', '--check', stdout=io.StringIO())
+
+    def test_orm_changes(self):
+        self.assertInSync()
+        recipe = Recipe.objects.get(name='Рецепт 0')
+        cart = ShoppingCart.objects.create(user=self.reader, recipe=recipe)
+        self.assertInSync()
+
+        row = recipe.ingredient_list.first()
+        row.amount += 5
+        row.save()
+        self.assertInSync()
+
+        row.ingredient = Ingredient.objects.exclude(
+            id__in=recipe.ingredient_list.values('ingredient_id'),
+        ).first()
+        row.save()
+        self.assertInSync()
+
+        IngredientInRecipe.objects.create(
+            recipe=recipe,
+            ingredient=Ingredient.objects.exclude(
+                id__in=recipe.ingredient_list.values('ingredient_id'),
+            ).first(),
+            amount=7,
+        )
+        self.assertInSync()
+
+        cart.recipe = Recipe.objects.get(name='Рецепт 6')
+        cart.save()
+        self.assertInSync()
+
+        row.delete()
+        cart.delete()
+        self.assertInSync()
+
+    def test_cascades(self):
+        Ingredient.objects.first().delete()
+        self.assertInSync()
+
+        Recipe.objects.filter(shopping_cart__user=self.reader)[0].delete()
+        self.assertInSync()
+
+        User.objects.get(username='author1').delete()
+        self.assertInSync()
+
+        self.reader.delete()
+        self.assertInSync()
+
+    def test_api_changes(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        ids = list(Recipe.objects.values_list('id', flat=True))
+        client.delete('/api/recipes/shopping_cart/', {'ids': ids[:4]},
+                      format='json')
+        self.assertInSync()
+
+        client.post('/api/recipes/shopping_cart/', {'ids': ids},
+                    format='json')
+        self.assertInSync()
+
+        client.delete(f'/api/recipes/{ids[0]}/shopping_cart/')
+        client.post(f'/api/recipes/{ids[0]}/shopping_cart/')
+        self.assertInSync()
+
+
+class SearchIndexTest(TestCase):
+    """Поиск упорядочен по релевантности и видит изменения через ORM."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipes()
+
+    @staticmethod
+    def found(query):
+        return list(
+            search.search(Recipe.objects.all(), query).values_list(
+                'name',
+                flat=True,
+            )
+        )
+
+    def test_ranking(self):
+        author = User.objects.get(username='author0')
+        for name, text in (
+                ('Салат', 'Борщ подают позже'),
+                ('Борщ', 'Описание'),
+        ):
+            Recipe.objects.create(
+                author=author,
+                name=name,
+                text=text,
+                image='recipes/images/0.png',
+                cooking_time=1,
+            )
+
+        self.assertEqual(self.found('борщ'), ['Борщ', 'Салат'])
+        response = APIClient().get(
+            '/api/recipes/',
+            {'search': 'борщ', 'cursor': ''},
+        )
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['results']],
+            ['Борщ', 'Салат'],
+        )
+
+    def test_orm_changes(self):
+        recipe = Recipe.objects.get(name='Рецепт 0')
+        recipe.name = 'Солянка'
+        recipe.save()
+        self.assertEqual(self.found('солянка'), ['Солянка'])
+
+        ingredient = Ingredient.objects.get(name='Ингредиент 4')
+        ingredient.name = 'Шафран'
+        ingredient.save()
+        self.assertEqual(
+            set(self.found('шафран')),
+            set(
+                ingredient.recipe_list.values_list(
+                    'recipe__name',
+                    flat=True,
+                )
+            ),
+        )
+
+        row = recipe.ingredient_list.get()
+        row.ingredient = ingredient
+        row.save()
+        self.assertIn('Солянка', self.found('шафран'))
+        row.delete()
+        self.assertNotIn('Солянка', self.found('шафран'))
+
+        recipe.delete()
+        self.assertEqual(self.found('солянка'), [])
+        User.objects.get(username='author1').delete()
+        self.assertNotIn('Рецепт 1', self.found('рецепт'))
+
+
+class PantryIndexTest(TestCase):
+    """Индекс «что приготовить» совпадает с пересобранным."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipes()
+        counters.reconcile()
+        pantry_index.rebuild()
+
+    @staticmethod
+    def postings():
+        rows = RecipePosting.objects.values_list(
+            'kind',
+            'key',
+            'block',
+            'recipe_ids',
+        )
+        return {
+            (kind, key, block): list(pantry_index.unpack(recipe_ids))
+            for kind, key, block, recipe_ids in rows
+        }
+
+    def assertIndexed(self):
+        postings = self.postings()
+        pantry_index.rebuild()
+        self.assertEqual(postings, self.postings())
+
+    def test_api_changes(self):
+        recipe = Recipe.objects.get(name='Рецепт 3')
+        ingredients = list(Ingredient.objects.order_by('id'))
+        client = APIClient()
+        client.force_authenticate(recipe.author)
+        response = client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {
+                'tags': [Tag.objects.first().id],
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': 2}
+                    for ingredient in ingredients[2:]
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexed()
+        self.assertEqual(
+            pantry_index.index.search([ingredients[4].id])[:1],
+            [(recipe.id, 1, 3)],
+        )
+
+        client.delete(f'/api/recipes/{recipe.id}/')
+        self.assertIndexed()
+
+    def test_orm_changes(self):
+        recipe = Recipe.objects.get(name='Рецепт 0')
+        row = recipe.ingredient_list.get()
+        row.ingredient = Ingredient.objects.order_by('id').last()
+        row.save()
+        self.assertIndexed()
+
+        IngredientInRecipe.objects.create(
+            recipe=recipe,
+            ingredient=Ingredient.objects.order_by('id').first(),
+            amount=1,
+        )
+        row.delete()
+        self.assertIndexed()
+
+        recipe.delete()
+        self.assertIndexed()
+
+        Ingredient.objects.first().delete()
+        User.objects.get(username='author1').delete()
+        self.assertIndexed()
+
+
+class RecommendationsTest(TestCase):
+    """Похожие и рекомендованные рецепты после rebuild_recommendations."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_recipes()
+        Favourite.objects.all().delete()
+        ShoppingCart.objects.all().delete()
+        recipes = {recipe.name: recipe for recipe in Recipe.objects.all()}
+        # Рецепт 1 встречается вместе с рецептом 0 чаще рецепта 2.
+        Favourite.objects.bulk_create(
+            Favourite(
+                user=User.objects.get(username=username),
+                recipe=recipes[name],
+            )
+            for username, names in (
+                ('author0', ('Рецепт 0', 'Рецепт 1')),
+                ('author1', ('Рецепт 0', 'Рецепт 1')),
+                ('author2', ('Рецепт 0', 'Рецепт 2')),
+                ('reader', ('Рецепт 0',)),
+            )
+            for name in names
+        )
+        call_command('rebuild_recommendations', stdout=io.StringIO())
+        cls.recipes = recipes
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def names(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data]
+
+    def test_similar(self):
+        url = f'/api/recipes/{self.recipes["Рецепт 0"].id}/similar/'
+        self.assertEqual(self.names(url), ['Рецепт 1', 'Рецепт 2'])
+        self.assertEqual(self.names(url, limit=1), ['Рецепт 1'])
+        self.assertEqual(
+            self.names(f'/api/recipes/{self.recipes["Рецепт 2"].id}/similar/'),
+            ['Рецепт 0'],
+        )
+        self.assertEqual(
+            self.names(f'/api/recipes/{self.recipes["Рецепт 5"].id}/similar/'),
+            [],
+        )
+
+    def test_recommended(self):
+        url = '/api/recipes/recommended/'
+        self.assertEqual(self.names(url), ['Рецепт 1', 'Рецепт 2'])
+
+        # Добавленные рецепты не рекомендуются.
+        ShoppingCart.objects.create(
+            user=self.reader,
+            recipe=self.recipes['Рецепт 1'],
+        )
+        self.assertEqual(self.names(url), ['Рецепт 2'])
+
+
+@override_settings(FEED_MODE=feed.WRITE)
+class FeedFanOutTest(TestCase):
+    """Лента при рассылке по записи совпадает с выборкой по подпискам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_recipes()
+        counters.reconcile()
+        feed.rebuild()
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def assertConsistent(self):
+        expected = list(Recipe.objects.filter(
+            author__in=Subscription.objects.filter(
+                user=self.reader,
+            ).values('author_id'),
+        ).order_by('-pub_date', '-id').values_list('id', flat=True))
+        self.assertCountEqual(
+            FeedItem.objects.filter(user=self.reader).values_list(
+                'recipe_id',
+                flat=True,
+            ),
+            expected,
+        )
+        response = self.client.get(
+            '/api/recipes/feed/',
+            {'limit': RECIPES + 1, 'cursor': ''},
+        )
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            expected,
+        )
+        return expected
+
+    def create_recipe(self, author):
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10), 'red').save(buffer, 'PNG')
+        client = APIClient()
+        client.force_authenticate(author)
+        response = client.post(
+            '/api/recipes/',
+            {
+                'name': 'Новый рецепт',
+                'text': 'Описание',
+                'cooking_time': 5,
+                'image': (
+                    'data:image/png;base64,'
+                    + b64encode(buffer.getvalue()).decode()
+                ),
+                'tags': [Tag.objects.first().id],
+                'ingredients': [
+                    {'id': Ingredient.objects.first().id, 'amount': 1},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_fan_out(self):
+        self.assertConsistent()
+        author = User.objects.get(username='author1')
+        self.assertEqual(
+            self.client.post(f'/api/users/{author.id}/subscribe/').status_code,
+            201,
+        )
+        self.assertConsistent()
+
+        recipe_id = self.create_recipe(author)
+        self.assertEqual(self.assertConsistent()[0], recipe_id)
+
+        self.create_recipe(User.objects.get(username='author2'))
+        self.assertConsistent()
+
+        Recipe.objects.get(pk=recipe_id).delete()
+        self.assertConsistent()
+
+        self.client.delete(f'/api/users/{author.id}/subscribe/')
+        self.assertConsistent()
+
+
+class ImagePipelineTest(TestCase):
+    """Обработка картинки не портит и не теряет файлы рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipes()
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.recipe = Recipe.objects.first()
+
+    def upload(self, **options):
+        buffer = io.BytesIO()
+        Image.new('RGB', (900, 600), 'red').save(buffer, 'JPEG', **options)
+        name = default_storage.save(
+            'recipes/images/upload.jpg',
+            ContentFile(buffer.getvalue()),
+        )
+        Recipe.objects.filter(pk=self.recipe.pk).update(image=name)
+        return name, buffer.getvalue()
+
+    def test_strip_metadata(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        name, _ = self.upload(exif=exif, comment=b'secret')
+        image_pipeline.process(self.recipe.pk, name)
+
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.image.name, name)
+        self.assertFalse(default_storage.exists(name))
+        with default_storage.open(self.recipe.image.name) as image_file:
+            image = Image.open(image_file)
+            self.assertFalse(image.getexif())
+            self.assertNotIn('comment', image.info)
+        for variant in self.recipe.image_variants.values():
+            self.assertTrue(default_storage.exists(variant))
+
+    def test_keep_original_without_metadata(self):
+        name, content = self.upload()
+        image_pipeline.process(self.recipe.pk, name)
+        previous = dict(Recipe.objects.get(pk=self.recipe.pk).image_variants)
+        image_pipeline.process(self.recipe.pk, name)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, name)
+        with default_storage.open(name) as image_file:
+            self.assertEqual(image_file.read(), content)
+        for variant in previous.values():
+            self.assertFalse(default_storage.exists(variant))
+
+    def test_image_replaced_during_processing(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        name, _ = self.upload(exif=exif)
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image='recipes/images/other.png',
+        )
+        image_pipeline.process(self.recipe.pk, name)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, 'recipes/images/other.png')
+        self.assertEqual(self.recipe.image_variants, {})
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(
+            default_storage.listdir(image_pipeline.VARIANTS_DIR)[1],
+            [],
+        )
+
+
+class TokenCacheTest(TestCase):
+    """Отозванный токен не принимается и не возвращается в кэш."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_recipes()
+
+    def setUp(self):
+        caches[settings.API_CACHE].clear()
+        self.token = Token.objects.create(user=self.reader)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_revoked(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        cached, _ = token_cache.get(self.token.key)
+        self.assertIn('password', cached.get_deferred_fields())
+
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_stale_set(self):
+        # Запрос проверил токен до выхода и сохраняет запись после него.
+        _, version = token_cache.get(self.token.key)
+        token_cache.delete(self.token.key)
+        token_cache.set(self.token.key, self.reader, version)
+
+        self.assertEqual(token_cache.get(self.token.key)[0], None)
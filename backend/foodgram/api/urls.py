@@ -1,10 +1,13 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import async_urlpatterns
 from .views import (
     TagViewSet,
     IngredientViewSet,
     RecipeViewSet,
+    metrics,
 )
 
 app_name = 'api'
@@ -27,6 +30,11 @@ router.register(
     basename='recipes',
 )
 
+router_urls = router.urls
+if settings.API_ASYNC_VIEWS:
+    router_urls = async_urlpatterns(router_urls)
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('metrics/', metrics, name='metrics'),
+    path('', include(router_urls)),
 ]
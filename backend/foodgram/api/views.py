@@ -1,10 +1,16 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse
 from rest_framework import (
     mixins,
+    response,
     viewsets,
-    pagination,
     decorators,
     permissions,
 )
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from django_filters.rest_framework import DjangoFilterBackend
 
 from recipes.models import (
@@ -14,6 +20,12 @@ from recipes.models import (
     ShoppingCart,
     Favourite,
 )
+from .cache import CachedResponseMixin
+from .conditional import ConditionalGetMixin
+from .fast_serializers import FastRecipeReadSerializer
+from .metrics import render_prometheus
+from .pagination import KeysetPagination, PantryPagination
+from .renderers import CSVRenderer, PlainTextRenderer
 from .permissions import (
     IsAdminOrReadOnly,
     IsAuthorOrReadOnly,
@@ -22,6 +34,8 @@ from .permissions import (
 from .serializers import (
     TagSerializer,
     IngredientSerializer,
+    PantrySerializer,
+    RecipeIdsSerializer,
     RecipeModifySerializer,
     RecipeReadSerializer,
 )
@@ -29,10 +43,29 @@ from .filters import (
     IngredientFilterSet,
     RecipeFilterSet,
 )
-from recipes.services import recipe_services
+from recipes.services import (
+    counters,
+    feed,
+    pantry_index,
+    recipe_services,
+    recommendations,
+    search,
+)
+from recipes.services.ingredient_index import ingredient_index
+from recipes.services.versions import (
+    INGREDIENT_VERSION_SCOPE,
+    RECIPE_COUNTERS_VERSION_SCOPE,
+    RECIPE_VERSION_SCOPE,
+    TAG_VERSION_SCOPE,
+    USER_VERSION_SCOPE,
+    get_version,
+    recipe_scope,
+)
 
 
 class TagViewSet(
+    ConditionalGetMixin,
+    CachedResponseMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet,
@@ -40,9 +73,12 @@ class TagViewSet(
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    cache_scopes = etag_scopes = (TAG_VERSION_SCOPE,)
 
 
 class IngredientViewSet(
+    ConditionalGetMixin,
+    CachedResponseMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet,
@@ -52,17 +88,45 @@ class IngredientViewSet(
     permission_classes = (IsAdminOrReadOnly,)
     filterset_class = IngredientFilterSet
     filter_backends = (DjangoFilterBackend,)
+    cache_scopes = etag_scopes = (INGREDIENT_VERSION_SCOPE,)
+
+    def list(self, request, *args, **kwargs):
+        if 'name' not in request.query_params:
+            return super().list(request, *args, **kwargs)
 
+        return self.conditional_response(
+            self.autocomplete,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    @staticmethod
+    def autocomplete(request, *args, **kwargs):
+        # Автодополнение обслуживается индексом в памяти процесса.
+        limit = request.query_params.get('limit')
+        return response.Response(ingredient_index.search(
+            prefix=request.query_params.get('name'),
+            limit=int(limit) if limit and limit.isdigit() else None,
+        ))
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    class RecipesPagination(pagination.PageNumberPagination):
-        page_size_query_param = 'limit'
 
+class RecipeViewSet(
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly | IsAdminOrReadOnly,)
-    pagination_class = RecipesPagination
+    pagination_class = KeysetPagination
     filterset_class = RecipeFilterSet
     filter_backends = (DjangoFilterBackend,)
+    cache_scopes = etag_scopes = (
+        RECIPE_VERSION_SCOPE,
+        TAG_VERSION_SCOPE,
+        INGREDIENT_VERSION_SCOPE,
+        USER_VERSION_SCOPE,
+    )
 
     @staticmethod
     def __recipe_handler(model, request, pk):
@@ -81,13 +145,152 @@ class RecipeViewSet(viewsets.ModelViewSet):
             id_=pk,
         )
 
+    @staticmethod
+    def __recipes_handler(model, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        if request.method == 'POST':
+            return recipe_services.add_recipes_service(
+                model=model,
+                user=request.user,
+                ids=ids,
+            )
+
+        return recipe_services.delete_recipes_service(
+            model=model,
+            user=request.user,
+            ids=ids,
+        )
+
+    def get_versions(self, request):
+        # Счётчики не входят в область рецептов: ETag рецепта зависит
+        # от версии его счётчиков, ETag списка - от версии всех счётчиков.
+        pk = self.kwargs.get('pk', '')
+        if self.action != 'retrieve':
+            scope = RECIPE_COUNTERS_VERSION_SCOPE
+        elif pk.isdigit():
+            scope = recipe_scope(pk)
+        else:
+            return super().get_versions(request)
+
+        return [*super().get_versions(request), get_version(scope)]
+
+    def refresh_cached(self, data):
+        """
+        Подстановка текущих счётчиков в рецепты ответа из кеша:
+        счётчики меняются чаще остального и не входят в ключ кеша.
+        """
+        recipes = data if isinstance(data, list) else data.get(
+            'results',
+            [data],
+        )
+        fields = [
+            field for field in Recipe.counter_fields
+            if recipes and field in recipes[0]
+        ]
+        if not fields:
+            return data
+        if any('id' not in recipe for recipe in recipes):
+            return None
+
+        current = {
+            values.pop('pk'): values
+            for values in Recipe.objects.filter(
+                pk__in=[recipe['id'] for recipe in recipes],
+            ).values('pk', *fields)
+        }
+        for recipe in recipes:
+            if recipe['id'] not in current:
+                return None
+            recipe.update(current[recipe['id']])
+
+        return data
+
+    def get_sparse_fields(self):
+        """
+        Выводимые поля (?fields=id,name,image) и связи, выводимые
+        вложенными объектами (?expand=author,tags,ingredients).
+        Без ?fields= выводятся все поля и связи.
+        """
+        if hasattr(self, '_sparse_fields'):
+            return self._sparse_fields
+
+        params = {}
+        for param, allowed in (
+                ('fields', RecipeReadSerializer.Meta.fields),
+                ('expand', RecipeReadSerializer.collapsed_fields),
+        ):
+            value = self.request.query_params.get(param)
+            if value is None:
+                params[param] = None
+                continue
+
+            names = {name.strip() for name in value.split(',')} - {''}
+            unknown = names - set(allowed)
+            if unknown:
+                raise ValidationError({
+                    param: f'Неизвестные поля: {", ".join(sorted(unknown))}'
+                })
+            params[param] = names
+
+        self._sparse_fields = params['fields'], params['expand'] or set()
+        return self._sparse_fields
+
+    def get_queryset(self):
+        if self.action in (
+                'list',
+                'retrieve',
+                'pantry',
+                'similar',
+                'recommended',
+                'feed',
+        ):
+            fields, expand = self.get_sparse_fields()
+            return (
+                Recipe.objects
+                .with_related(self.request.user, fields, expand)
+                .with_user_flags(self.request.user, fields)
+            )
+
+        return super().get_queryset()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method in SAFE_METHODS:
+            context['fields'], context['expand'] = self.get_sparse_fields()
+
+        return context
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        counters.change_recipes_count(instance.author_id, -1)
+        instance.delete()
+
+    def get_serializer(self, *args, **kwargs):
+        query = self.request.query_params.get('search', '').strip()
+        if self.action == 'list' and query and args:
+            # Подсветка считается только для рецептов страницы.
+            recipes = list(args[0])
+            kwargs.setdefault('context', self.get_serializer_context())
+            kwargs['context']['search_highlights'] = search.highlights(
+                (recipe.id for recipe in recipes),
+                query,
+            )
+            args = (recipes, *args[1:])
+
+        return super().get_serializer(*args, **kwargs)
+
     def get_serializer_class(self):
         if self.request.method not in SAFE_METHODS:
             return RecipeModifySerializer
 
+        if settings.API_FAST_SERIALIZERS:
+            return FastRecipeReadSerializer
+
         return RecipeReadSerializer
 
     @decorators.action(
@@ -108,7 +311,145 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @decorators.action(
         detail=False,
-        permission_classes=[permissions.IsAuthenticated]
+        methods=['POST', 'DELETE'],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+    )
+    def shopping_cart_bulk(self, request):
+        # Тело запроса: {"ids": [идентификаторы рецептов]}.
+        return self.__recipes_handler(ShoppingCart, request)
+
+    @decorators.action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path='favorite',
+        url_name='favorite-bulk',
+    )
+    def favorite_bulk(self, request):
+        return self.__recipes_handler(Favourite, request)
+
+    @decorators.action(
+        detail=False,
+        pagination_class=PantryPagination,
+    )
+    def pantry(self, request):
+        """
+        Рецепты по имеющимся ингредиентам: сначала с наибольшей долей
+        имеющихся ингредиентов, затем с наименьшим числом недостающих.
+        """
+        serializer = PantrySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        matches = pantry_index.index.search(
+            serializer.validated_data['ingredients'],
+        )
+        page = self.paginate_queryset(matches)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        context = self.get_serializer_context()
+        context['pantry_matches'] = {
+            recipe_id: (matched, required)
+            for recipe_id, matched, required in page
+        }
+        serializer = self.get_serializer(
+            [
+                recipes[recipe_id]
+                for recipe_id, _, _ in page
+                if recipe_id in recipes
+            ],
+            many=True,
+            context=context,
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @decorators.action(
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь."""
+        queryset = feed.feed(self.get_queryset(), request.user)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return response.Response(
+                self.get_serializer(queryset, many=True).data
+            )
+
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def get_neighbours_limit(request):
+        """Число рецептов в ответе из параметра limit."""
+        limit = request.query_params.get('limit')
+        if not limit or not limit.isdigit() or int(limit) < 1:
+            return recommendations.NEIGHBOURS
+
+        return min(int(limit), recommendations.NEIGHBOURS)
+
+    @decorators.action(detail=True)
+    def similar(self, request, pk):
+        """Похожие рецепты из пересчитываемой командой таблицы соседей."""
+        if not pk.isdigit():
+            raise Http404
+
+        recipes = list(
+            self.get_queryset().filter(
+                similar_to__recipe_id=pk,
+            ).annotate(
+                similarity=F('similar_to__score'),
+            ).order_by('-similarity', '-pk')[
+                :self.get_neighbours_limit(request)
+            ]
+        )
+        if not recipes and not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+
+        return response.Response(
+            self.get_serializer(recipes, many=True).data
+        )
+
+    @decorators.action(
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def recommended(self, request):
+        """Рекомендации по избранному и списку покупок пользователя."""
+        scores = dict(recommendations.recommended(
+            request.user,
+            self.get_neighbours_limit(request),
+        ))
+        recipes = self.get_queryset().in_bulk(scores)
+        for recipe_id, recipe in recipes.items():
+            recipe.similarity = scores[recipe_id]
+
+        return response.Response(self.get_serializer(
+            [recipes[recipe_id] for recipe_id in scores
+             if recipe_id in recipes],
+            many=True,
+        ).data)
+
+    @decorators.action(
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer],
     )
     def download_shopping_cart(self, request):
-        return recipe_services.collect_shopping_cart(request.user)
+        # Формат выбирается параметром ?format= или заголовком Accept.
+        return recipe_services.collect_shopping_cart(
+            user=request.user,
+            export_format=request.accepted_renderer.format,
+        )
+
+
+def metrics(request):
+    """Замеры запросов процесса в текстовом формате Prometheus."""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+
+    return HttpResponse(
+        render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
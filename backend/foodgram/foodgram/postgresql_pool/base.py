@@ -0,0 +1,140 @@
+import os
+from functools import partial
+from threading import BoundedSemaphore, Lock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg2 import Error, OperationalError
+from psycopg2.pool import ThreadedConnectionPool
+
+# Пулы соединений по (псевдоним базы, процесс): после fork процесс
+# gunicorn не использует соединения родителя.
+pools = {}
+pools_lock = Lock()
+
+
+class ConnectionPool(ThreadedConnectionPool):
+    """
+    Пул соединений процесса: не больше max_size соединений одновременно,
+    min_size из них остаются открытыми между запросами. Если все
+    соединения заняты, поток ждёт освобождения не дольше timeout секунд.
+    """
+
+    def __init__(self, connect, min_size, max_size, timeout):
+        self.connect = connect
+        self.timeout = timeout
+        self.opened = 0
+        self.slots = BoundedSemaphore(max_size)
+        super().__init__(min_size, max_size)
+
+    def _connect(self, key=None):
+        connection = self.connect()
+        self.opened += 1
+        if key is not None:
+            self._used[key] = connection
+            self._rused[id(connection)] = key
+        else:
+            self._pool.append(connection)
+
+        return connection
+
+    def getconn(self, key=None):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'Все {self.maxconn} соединений пула заняты '
+                f'дольше {self.timeout} с'
+            )
+        try:
+            return super().getconn(key)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def putconn(self, connection, key=None, close=False):
+        try:
+            super().putconn(connection, key, close)
+        finally:
+            self.slots.release()
+
+
+def usable(connection):
+    """Проверка соединения из пула запросом к базе."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.autocommit:
+            connection.rollback()
+    except Error:
+        return False
+
+    return True
+
+
+def close_pool(alias):
+    """Закрытие соединений пула базы `alias` в текущем процессе."""
+    with pools_lock:
+        pool = pools.pop((alias, os.getpid()), None)
+    if pool is not None:
+        pool.closeall()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с пулом соединений процесса (OPTIONS['pool']: min_size,
+    max_size, timeout). Соединение берётся из пула при подключении
+    и возвращается в него при закрытии - в конце каждого запроса,
+    поэтому постоянные соединения (CONN_MAX_AGE) не используются.
+    С CONN_HEALTH_CHECKS соединение из пула проверяется перед выдачей.
+    """
+
+    pool = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_pool(self, conn_params):
+        key = (self.alias, os.getpid())
+        with pools_lock:
+            if key not in pools:
+                if self.settings_dict['CONN_MAX_AGE']:
+                    raise ImproperlyConfigured(
+                        'Пул соединений не используется с постоянными '
+                        'соединениями: укажите CONN_MAX_AGE = 0.'
+                    )
+                options = self.settings_dict['OPTIONS'].get('pool') or {}
+                pools[key] = ConnectionPool(
+                    partial(
+                        base.DatabaseWrapper.get_new_connection,
+                        self,
+                        conn_params,
+                    ),
+                    min_size=options.get('min_size', 1),
+                    max_size=options.get('max_size', 4),
+                    timeout=options.get('timeout', 10),
+                )
+
+            return pools[key]
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.getconn()
+        while (self.settings_dict['CONN_HEALTH_CHECKS']
+               and not usable(connection)):
+            self.pool.putconn(connection, close=True)
+            connection = self.pool.getconn()
+
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # Соединение, закрытое внутри atomic, остаётся у обёртки
+                # до выхода из блока и в пул не возвращается.
+                self.pool.putconn(
+                    self.connection,
+                    close=self.in_atomic_block,
+                )
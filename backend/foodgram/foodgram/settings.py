@@ -1,6 +1,8 @@
 import os
+import tempfile
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,17 +83,84 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 # Database
 
+# Соединения с базой: время жизни постоянного соединения потока (с,
+# 0 - новое соединение на каждый запрос) и проверка соединения перед
+# повторным использованием. DB_POOL=True - пул соединений процесса
+# (только PostgreSQL, foodgram.postgresql_pool): соединение возвращается
+# в пул в конце запроса, процесс держит не больше DB_POOL_MAX_SIZE
+# соединений и ждёт свободного не дольше DB_POOL_TIMEOUT с.
+DB_POOL = os.environ.get('DB_POOL', default='False') == 'True'
+
+DB_POOL_OPTIONS = {
+    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', default=1)),
+    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', default=4)),
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', default=10)),
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': os.environ.get('DB_ENGINE', default='django.db.backends.sqlite3'),
+        'ENGINE': (
+            'foodgram.postgresql_pool' if DB_POOL
+            else os.environ.get('DB_ENGINE', default='django.db.backends.sqlite3')
+        ),
         'NAME': os.environ.get('POSTGRES_DB', default=BASE_DIR / 'db.sqlite3'),
         'USER': os.environ.get('POSTGRES_USER'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        'CONN_MAX_AGE': 0 if DB_POOL else int(
+            os.environ.get('DB_CONN_MAX_AGE', default=60)
+        ),
+        'CONN_HEALTH_CHECKS': (
+            os.environ.get('DB_CONN_HEALTH_CHECKS', default='True') == 'True'
+        ),
+        'OPTIONS': {'pool': DB_POOL_OPTIONS} if DB_POOL else {},
     }
 }
 
+# Cache
+
+# Общий кеш ответов API и версий данных. Версии сбрасывают кеш ответов
+# и индекс автодополнения ингредиентов во всех процессах, поэтому по
+# умолчанию кеш файловый: он общий для процессов gunicorn и команд
+# manage.py на одной машине (для нескольких машин - redis).
+API_CACHE = 'api'
+
+API_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+
+API_CACHE_BACKEND = os.environ.get('API_CACHE_BACKEND', default='file')
+
+# Кеш в памяти процесса не виден другим процессам: запись в одном
+# процессе gunicorn не сбросит кешированные ответы других. Число
+# процессов gunicorn задаёт WEB_CONCURRENCY.
+if (API_CACHE_BACKEND == 'locmem'
+        and int(os.environ.get('WEB_CONCURRENCY', default=1)) > 1):
+    raise ImproperlyConfigured(
+        'API_CACHE_BACKEND=locmem работает только с одним процессом: '
+        'укажите file или redis для WEB_CONCURRENCY > 1.'
+    )
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    API_CACHE: {
+        'BACKEND': API_CACHE_BACKENDS[API_CACHE_BACKEND],
+        'LOCATION': os.environ.get(
+            'API_CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram-api-cache'),
+        ),
+        'TIMEOUT': int(os.environ.get('API_CACHE_TIMEOUT', default=300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -110,16 +180,54 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = 'users.User'
 
+# Кодирование и разбор JSON через orjson (без него - стандартный json).
+API_FAST_JSON = os.environ.get('API_FAST_JSON', default='True') == 'True'
+
+# Представление рецептов для чтения функциями без полей DRF
+# (api.fast_serializers), вывод совпадает с RecipeReadSerializer.
+API_FAST_SERIALIZERS = os.environ.get(
+    'API_FAST_SERIALIZERS',
+    default='True',
+) == 'True'
+
+# Асинхронные представления списка и карточки рецепта, поиска
+# ингредиентов и выгрузки списка покупок (api.async_views) для работы
+# через ASGI (foodgram.asgi).
+API_ASYNC_VIEWS = os.environ.get(
+    'API_ASYNC_VIEWS',
+    default='False',
+) == 'True'
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-    ]
+        'users.authentication.CachedTokenAuthentication',
+    ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer' if API_FAST_JSON
+        else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser' if API_FAST_JSON
+        else 'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Кэш проверенных токенов: время жизни записи (с) и псевдоним общего
+# кэша из CACHES (по умолчанию кеш API; пустое значение отключает
+# кэширование). Отзыв токена сразу виден всем процессам.
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get('AUTH_TOKEN_CACHE_TTL', default=60))
+
+AUTH_TOKEN_CACHE = os.environ.get('AUTH_TOKEN_CACHE', default=API_CACHE) or None
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -134,6 +242,30 @@ DJOSER = {
     },
 }
 
+# Instrumentation
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', default='False') == 'True'
+
+# Допустимое число SQL-запросов на запрос к представлению.
+API_QUERY_BUDGETS = {
+    'TagViewSet.list': 2,
+    'TagViewSet.retrieve': 2,
+    'IngredientViewSet.list': 2,
+    'IngredientViewSet.retrieve': 2,
+    'RecipeViewSet.list': 7,
+    'RecipeViewSet.retrieve': 5,
+    'RecipeViewSet.pantry': 7,
+    'RecipeViewSet.similar': 5,
+    'RecipeViewSet.recommended': 6,
+    'RecipeViewSet.feed': 6,
+    'RecipeViewSet.download_shopping_cart': 2,
+    'CustomUserViewSet.subscriptions': 4,
+}
+
+API_QUERY_BUDGETS_STRICT = (
+    os.environ.get('API_QUERY_BUDGETS_STRICT', default='False') == 'True'
+)
+
 # Internationalization
 
 LANGUAGE_CODE = 'en-us'
@@ -152,6 +284,25 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Recipe images processing
+
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', default=2))
+
+RECIPE_IMAGE_FORMAT = os.environ.get('RECIPE_IMAGE_FORMAT', default='WEBP')
+
+RECIPE_IMAGE_QUALITY = 80
+
+RECIPE_IMAGE_VARIANTS = {
+    'small': 320,
+    'medium': 800,
+}
+
+# Лента подписок: "read" - слияние рецептов авторов при каждом запросе,
+# "write" - чтение ленты пользователя, заполняемой при создании рецепта
+# (после переключения заполняется командой rebuild_feeds).
+
+FEED_MODE = os.environ.get('FEED_MODE', default='read')
+
 # Default primary key field type
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
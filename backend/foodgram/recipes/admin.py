@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
 
 from .models import (
     Favourite,
@@ -6,12 +7,38 @@ from .models import (
     IngredientInRecipe,
     Recipe,
     ShoppingCart,
+    ShoppingListItem,
     Tag,
 )
 
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    """
+    Только просмотр: материализованные списки покупок (ShoppingListItem)
+    следуют за корзинами и ингредиентами рецептов (recipes.signals).
+    Право удаления остаётся для каскадного удаления ингредиентов
+    и пользователей, но отдельные записи не удаляются.
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_view(self, request, object_id, extra_context=None):
+        raise PermissionDenied
+
+
 admin.site.register(Tag)
 admin.site.register(Ingredient)
 admin.site.register(Recipe)
 admin.site.register(IngredientInRecipe)
 admin.site.register(ShoppingCart)
 admin.site.register(Favourite)
+admin.site.register(ShoppingListItem, ReadOnlyAdmin)
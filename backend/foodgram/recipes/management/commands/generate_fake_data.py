@@ -0,0 +1,276 @@
+import io
+import random
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import (
+    Favourite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from recipes.services import (
+    counters,
+    feed,
+    pantry_index,
+    recommendations,
+    search,
+    shopping_list_services,
+)
+from recipes.services.versions import (
+    INGREDIENT_VERSION_SCOPE,
+    RECIPE_VERSION_SCOPE,
+    TAG_VERSION_SCOPE,
+    USER_VERSION_SCOPE,
+    bump_version,
+)
+from users.models import Subscription, User
+
+FAKE_EMAIL = 'fake{index}@foodgram.local'
+FAKE_PASSWORD = 'fake-password'
+FAKE_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+BATCH_SIZE = 1000
+
+
+class ZipfSampler:
+    """
+    Выбор элементов с вероятностью, обратной степени ранга:
+    несколько популярных элементов и длинный хвост.
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        self.rng = rng
+        self.weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+
+    def sample(self, count, exclude=None):
+        count = min(count, len(self.items) - (1 if exclude else 0))
+        chosen = set()
+        while len(chosen) < count:
+            item = self.rng.choices(self.items, cum_weights=self.weights)[0]
+            if item != exclude:
+                chosen.add(item)
+
+        return chosen
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация синтетических пользователей, рецептов, избранного, '
+        'списков покупок и подписок для нагрузочного тестирования'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes-per-author', type=int, default=10)
+        parser.add_argument(
+            '--authors-share',
+            type=float,
+            default=0.2,
+            help='Доля пользователей, публикующих рецепты',
+        )
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--subscriptions-per-user', type=int, default=10)
+        parser.add_argument(
+            '--ingredients-per-recipe',
+            type=int,
+            default=8,
+        )
+        parser.add_argument(
+            '--zipf',
+            type=float,
+            default=1.1,
+            help='Показатель распределения Ципфа для популярности',
+        )
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=20,
+            help='Количество различных картинок рецептов',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not Ingredient.objects.exists():
+            raise CommandError(
+                'Сначала заполните ингредиенты командой import_ingredients'
+            )
+
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            authors = rng.sample(
+                users,
+                max(1, int(len(users) * options['authors_share'])),
+            )
+            recipes = self.create_recipes(authors, rng, options)
+            self.create_relations(users, authors, recipes, rng, options)
+            shopping_list_services.rebuild()
+            counters.reconcile()
+            search.index_recipes(recipe.id for recipe in recipes)
+            pantry_index.rebuild()
+            recommendations.rebuild()
+            if feed.fan_out_on_write():
+                feed.rebuild()
+
+        # Массовые вставки не отправляют сигналы.
+        for scope in (
+                RECIPE_VERSION_SCOPE,
+                TAG_VERSION_SCOPE,
+                INGREDIENT_VERSION_SCOPE,
+                USER_VERSION_SCOPE,
+        ):
+            bump_version(scope)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, '
+            f'рецептов: {len(recipes)}'
+        ))
+
+    @staticmethod
+    def create_users(count):
+        start = User.objects.filter(
+            email__startswith='fake',
+            email__endswith='@foodgram.local',
+        ).count()
+        password = make_password(FAKE_PASSWORD)
+        return User.objects.bulk_create(
+            (
+                User(
+                    email=FAKE_EMAIL.format(index=index),
+                    username=f'fake{index}',
+                    first_name=f'Имя{index}',
+                    last_name=f'Фамилия{index}',
+                    password=password,
+                )
+                for index in range(start, start + count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+    @staticmethod
+    def create_images(count, rng):
+        names = []
+        for index in range(count):
+            buffer = io.BytesIO()
+            color = tuple(rng.randrange(256) for _ in range(3))
+            Image.new('RGB', (800, 600), color).save(buffer, 'JPEG')
+            names.append(default_storage.save(
+                f'recipes/fake_{index}.jpg',
+                ContentFile(buffer.getvalue()),
+            ))
+
+        return names
+
+    def create_recipes(self, authors, rng, options):
+        tags = [
+            Tag.objects.get_or_create(
+                slug=slug,
+                defaults={'name': name, 'color': color},
+            )[0]
+            for name, color, slug in FAKE_TAGS
+        ]
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        images = self.create_images(options['images'], rng)
+        now = timezone.now()
+
+        recipes = Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=author,
+                    name=f'Рецепт {author.username} №{index}',
+                    text='Синтетическое описание рецепта. ' * 10,
+                    image=rng.choice(images),
+                    cooking_time=rng.randint(5, 180),
+                )
+                for author in authors
+                for index in range(options['recipes_per_author'])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        # auto_now_add проставляет время создания, разносим публикации.
+        for recipe in recipes:
+            recipe.pub_date = now - timezone.timedelta(
+                minutes=rng.randrange(60 * 24 * 365),
+            )
+        Recipe.objects.bulk_update(recipes, ('pub_date',), BATCH_SIZE)
+
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+                for recipe in recipes
+                for tag in rng.sample(tags, rng.randint(1, len(tags)))
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        IngredientInRecipe.objects.bulk_create(
+            (
+                IngredientInRecipe(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient_id in rng.sample(
+                    ingredients,
+                    options['ingredients_per_recipe'],
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return recipes
+
+    @staticmethod
+    def create_relations(users, authors, recipes, rng, options):
+        # Популярность рецептов и авторов распределена по Ципфу.
+        recipe_ids = [recipe.id for recipe in recipes]
+        rng.shuffle(recipe_ids)
+        popular_recipes = ZipfSampler(recipe_ids, options['zipf'], rng)
+        popular_authors = ZipfSampler(
+            [author.id for author in authors],
+            options['zipf'],
+            rng,
+        )
+
+        for model, per_user in (
+                (Favourite, options['favorites_per_user']),
+                (ShoppingCart, options['carts_per_user']),
+        ):
+            model.objects.bulk_create(
+                (
+                    model(user_id=user.id, recipe_id=recipe_id)
+                    for user in users
+                    for recipe_id in popular_recipes.sample(per_user)
+                ),
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+
+        Subscription.objects.bulk_create(
+            (
+                Subscription(user_id=user.id, author_id=author_id)
+                for user in users
+                for author_id in popular_authors.sample(
+                    options['subscriptions_per_user'],
+                    exclude=user.id,
+                )
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
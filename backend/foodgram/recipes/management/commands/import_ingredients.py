@@ -1,37 +1,57 @@
 import os
-import csv
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from recipes.models import Ingredient
+from recipes.services.ingredient_import import READERS, import_ingredients
 
 
 class Command(BaseCommand):
-    help = 'Импорт данных из csv в модель Ingredient'
+    help = 'Импорт данных из csv или json в модель Ingredient'
 
     def add_arguments(self, parser):
-        parser.add_argument('path', type=str, help='Путь к CSV файлу')
+        parser.add_argument(
+            'path',
+            type=str,
+            help='Путь к CSV или JSON файлу',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном пакете вставки',
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY на PostgreSQL',
+        )
 
     def handle(self, path: str, *args, **options):
-        print('Заполнение модели Ingredient из CSV запущено')
-        if not (os.path.exists(path) and path.endswith('.csv')):
-            print(f'Файла {path} не существует или не поддерживает формат CSV')
-            return
-
-        with open(path, 'r') as csv_file:
-            reader = csv.reader(csv_file)
-
-            for row in reader:
-                try:
-                    obj, created = Ingredient.objects.get_or_create(
-                        name=row[0],
-                        measurement_unit=row[1],
-                    )
-                    if not created:
-                        print(
-                            f'Ингредиент {obj} уже существует'
-                        )
-                except Exception as error:
-                    print(f'Ошибка в строке {row}: {error}')
-
-        print('Заполнение модели Ingredient успешно завершено')
+        extension = os.path.splitext(path)[1].lower()
+        if not (os.path.exists(path) and extension in READERS):
+            raise CommandError(
+                f'Файла {path} не существует или не поддерживает '
+                'формат CSV/JSON'
+            )
+
+        self.stdout.write('Заполнение модели Ingredient запущено')
+        try:
+            report = import_ingredients(
+                path,
+                chunk_size=options['chunk_size'],
+                use_copy=not options['no_copy'],
+            )
+        except ValueError as error:
+            raise CommandError(f'Файл {path} не загружен: {error}')
+
+        for error in report.errors:
+            self.stderr.write(error)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Заполнение модели Ingredient завершено: '
+            f'добавлено {report.inserted}, '
+            f'пропущено {report.skipped}, '
+            f'ошибок {report.failed} '
+            f'за {report.seconds:.2f} с '
+            f'({report.rows_per_second:.0f} строк/с)'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.services import image_pipeline
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий картинок рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Обработать и рецепты, у которых копии уже есть',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.only('id', 'image')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+
+        processed = 0
+        for recipe in recipes.iterator():
+            image_pipeline.process(recipe.id, recipe.image.name)
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок рецептов: {processed}'
+        ))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.services import feed
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполнение лент подписок пользователей для рассылки по записи '
+        '(FEED_MODE=write)'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = feed.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты заполнены: {created} записей '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.services import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчёт похожих рецептов по совместному добавлению '
+        'в избранное и список покупок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbours',
+            type=int,
+            default=recommendations.NEIGHBOURS,
+            help='Число хранимых соседей каждого рецепта',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = recommendations.rebuild(options['neighbours'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны: {created} пар '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
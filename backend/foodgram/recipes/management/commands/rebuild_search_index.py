@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from recipes.services import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересборка поискового индекса рецептов, например после '
+        'переименования ингредиентов'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            search.index_recipes()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковый индекс пересобран: {Recipe.objects.count()} '
+            f'рецептов за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services import shopping_list_services
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересборка материализованных списков покупок '
+        'и сверка их с агрегацией по рецептам'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить списки покупок, не пересобирая их',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            created = shopping_list_services.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Списки покупок пересобраны: {created} позиций'
+            ))
+
+        live = shopping_list_services.live_totals()
+        materialized = shopping_list_services.materialized_totals()
+        mismatched = sorted(
+            user_id
+            for user_id in live.keys() | materialized.keys()
+            if live.get(user_id) != materialized.get(user_id)
+        )
+        if mismatched:
+            raise CommandError(
+                'Списки покупок расходятся с агрегацией '
+                f'у пользователей: {mismatched}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок {len(live)} пользователей совпадают'
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверка денормализованных счётчиков рецептов и пользователей '
+        'с фактическим числом связанных записей и исправление расхождений'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счётчики, не исправляя их',
+        )
+
+    def handle(self, *args, **options):
+        mismatched = {
+            field: count
+            for field, count in counters.reconcile(options['check']).items()
+            if count
+        }
+        if mismatched and options['check']:
+            raise CommandError(f'Счётчики расходятся: {mismatched}')
+
+        if mismatched:
+            self.stdout.write(self.style.WARNING(
+                f'Исправлены счётчики: {mismatched}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Счётчики совпадают'))
@@ -0,0 +1,70 @@
+# Generated by Django 4.2 on 2026-10-18 17:25
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRESQL_FORWARD = (
+    'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+    'USING gin (search_vector)',
+    "UPDATE recipes_recipe AS recipe SET search_vector = "
+    "setweight(to_tsvector('russian', recipe.name), 'A') || "
+    "setweight(to_tsvector('russian', documents.names), 'B') || "
+    "setweight(to_tsvector('russian', recipe.text), 'C') "
+    "FROM (SELECT r.id, coalesce(string_agg(i.name, ' '), '') AS names "
+    'FROM recipes_recipe r '
+    'LEFT JOIN recipes_ingredientinrecipe ir ON ir.recipe_id = r.id '
+    'LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+    'GROUP BY r.id) AS documents '
+    'WHERE recipe.id = documents.id',
+)
+POSTGRESQL_BACKWARD = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+)
+SQLITE_FORWARD = (
+    'CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5('
+    "name, ingredients, text, tokenize = 'unicode61 remove_diacritics 2')",
+    'INSERT INTO recipes_recipe_fts (rowid, name, ingredients, text) '
+    "SELECT r.id, r.name, coalesce(group_concat(i.name, ' '), ''), r.text "
+    'FROM recipes_recipe r '
+    'LEFT JOIN recipes_ingredientinrecipe ir ON ir.recipe_id = r.id '
+    'LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+    'GROUP BY r.id',
+)
+SQLITE_BACKWARD = (
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        # Индекс поиска: GIN по tsvector в PostgreSQL,
+        # виртуальная таблица FTS5 в SQLite.
+        migrations.RunPython(
+            run_for_vendor({
+                'postgresql': POSTGRESQL_FORWARD,
+                'sqlite': SQLITE_FORWARD,
+            }),
+            run_for_vendor({
+                'postgresql': POSTGRESQL_BACKWARD,
+                'sqlite': SQLITE_BACKWARD,
+            }),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2 on 2026-10-18 17:40
+
+import sys
+from array import array
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+
+BLOCK_SIZE = 1 << 16
+
+
+def fill_postings(apps, schema_editor):
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    RecipePosting = apps.get_model('recipes', 'RecipePosting')
+    postings = defaultdict(lambda: array('H'))
+    sizes = Counter()
+    for ingredient_id, recipe_id in IngredientInRecipe.objects.values_list(
+            'ingredient_id',
+            'recipe_id',
+    ).order_by('recipe_id').iterator(chunk_size=10000):
+        block, offset = divmod(recipe_id, BLOCK_SIZE)
+        postings['ingredient', ingredient_id, block].append(offset)
+        sizes[recipe_id] += 1
+
+    for recipe_id, size in sizes.items():
+        block, offset = divmod(recipe_id, BLOCK_SIZE)
+        postings['size', size, block].append(offset)
+
+    for offsets in postings.values():
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+    RecipePosting.objects.bulk_create(
+        (
+            RecipePosting(
+                kind=kind,
+                key=key,
+                block=block,
+                recipe_ids=offsets.tobytes(),
+            )
+            for (kind, key, block), offsets in postings.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipePosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ingredient', 'Ингредиент'), ('size', 'Число ингредиентов')], max_length=10, verbose_name='Вид ключа')),
+                ('key', models.PositiveIntegerField(verbose_name='Ключ')),
+                ('block', models.PositiveIntegerField(verbose_name='Блок идентификаторов')),
+                ('recipe_ids', models.BinaryField(default=bytes, verbose_name='Рецепты')),
+                ('revision', models.PositiveIntegerField(default=0, verbose_name='Ревизия')),
+            ],
+            options={
+                'verbose_name': 'Блок индекса ингредиентов',
+                'verbose_name_plural': 'Блоки индекса ингредиентов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipeposting',
+            constraint=models.UniqueConstraint(fields=('kind', 'key', 'block'), name='unique_recipe_posting'),
+        ),
+        migrations.RunPython(fill_postings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-18 17:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    User = apps.get_model('users', 'User')
+    counters = (
+        (Recipe, 'favorites_count', apps.get_model('recipes', 'Favourite'),
+         'recipe'),
+        (Recipe, 'shopping_cart_count',
+         apps.get_model('recipes', 'ShoppingCart'), 'recipe'),
+        (User, 'followers_count', apps.get_model('users', 'Subscription'),
+         'author'),
+        (User, 'recipes_count', Recipe, 'author'),
+    )
+    for model, field, counted, reference in counters:
+        model.objects.update(**{field: Coalesce(
+            Subquery(
+                counted.objects.filter(
+                    **{reference: OuterRef('pk')},
+                ).order_by().values(reference).annotate(
+                    total=Count('pk'),
+                ).values('total'),
+            ),
+            0,
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipesimilarity'),
+        ('users', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-shopping_cart_count', '-id'], name='recipe_shopping_cart_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 18:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_feeditem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchDocument',
+            fields=[
+                ('recipe', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('name', models.TextField(verbose_name='Название')),
+                ('ingredients', models.TextField(verbose_name='Ингредиенты')),
+                ('text', models.TextField(verbose_name='Описание')),
+                ('document', models.TextField(db_column='recipes_recipe_fts', editable=False, verbose_name='Документ')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ рецепта',
+                'verbose_name_plural': 'Поисковые документы рецептов',
+                'db_table': 'recipes_recipe_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,10 +1,17 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import (
+    Exists,
+    OuterRef,
+    Prefetch,
+    Value,
+)
 from django.core.validators import (
     RegexValidator,
     MinValueValidator,
 )
 
-from users.models import User
+from users.models import CountersMixin, Subscription, User
 
 REQUIRED_KWARGS = {'null': False, 'blank': False}
 
@@ -68,7 +75,97 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    # Столбцы, которые не загружаются, если поле представления
+    # не запрошено: {поле: столбцы}.
+    HEAVY_COLUMNS = {
+        'name': ('name',),
+        'text': ('text',),
+        'image': ('image',),
+        'image_variants': ('image', 'image_variants'),
+    }
+
+    def with_related(self, user=None, fields=None, expand=None):
+        """
+        Подгрузка связанных сущностей рецепта фиксированным числом запросов:
+        автор (с признаком подписки), теги и ингредиенты.
+        Поисковый вектор не загружается.
+
+        Если задан набор полей представления `fields`, загружаются только
+        нужные ему столбцы и связи; связи не из `expand` загружаются
+        без присоединения автора и ингредиентов (только идентификаторы).
+        """
+        def requested(name):
+            return fields is None or name in fields
+
+        def expanded(name):
+            return fields is None or name in (expand or ())
+
+        needed = {
+            column
+            for name, columns in self.HEAVY_COLUMNS.items()
+            if requested(name)
+            for column in columns
+        }
+        deferred = ['search_vector'] + sorted({
+            column
+            for columns in self.HEAVY_COLUMNS.values()
+            for column in columns
+            if column not in needed
+        })
+
+        prefetches = []
+        if requested('author') and expanded('author'):
+            prefetches.append(Prefetch(
+                'author',
+                queryset=User.objects.annotate(
+                    is_subscribed=Subscription.exists_for(user),
+                ),
+            ))
+        if requested('tags'):
+            prefetches.append('tags')
+        if requested('ingredients'):
+            prefetches.append(
+                Prefetch(
+                    'ingredient_list',
+                    queryset=IngredientInRecipe.objects.select_related(
+                        'ingredient',
+                    ),
+                )
+                if expanded('ingredients') else 'ingredient_list'
+            )
+
+        return self.defer(*deferred).prefetch_related(*prefetches)
+
+    def with_user_flags(self, user=None, fields=None):
+        """
+        Аннотирование признаков нахождения рецепта в избранном
+        и в списке покупок пользователя подзапросами EXISTS
+        (только запрошенных в наборе полей `fields`).
+        """
+        flags = {
+            'is_favorited': Favourite,
+            'is_in_shopping_cart': ShoppingCart,
+        }
+        if fields is not None:
+            flags = {
+                name: model
+                for name, model in flags.items()
+                if name in fields
+            }
+        if user is None or user.is_anonymous:
+            return self.annotate(**{name: Value(False) for name in flags})
+
+        return self.annotate(**{
+            name: Exists(model.objects.filter(
+                user=user,
+                recipe=OuterRef('pk'),
+            ))
+            for name, model in flags.items()
+        })
+
+
+class Recipe(CountersMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -89,6 +186,10 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
     tags = models.ManyToManyField(
         Tag,
         related_name='recipes',
@@ -106,16 +207,61 @@ class Recipe(models.Model):
         'Картинка',
         **REQUIRED_KWARGS,
     )
+    image_variants = models.JSONField(
+        'Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     cooking_time = models.PositiveIntegerField(
         'Время приготовления',
         validators=[MinValueValidator(1)],
         **REQUIRED_KWARGS,
     )
+    # Поддерживается recipes.services.search (только PostgreSQL).
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+    # Поддерживаются recipes.services.counters.
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False,
+    )
+
+    counter_fields = ('favorites_count', 'shopping_cart_count')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_favorites_count_idx',
+            ),
+            models.Index(
+                fields=('-shopping_cart_count', '-id'),
+                name='recipe_shopping_cart_count_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -206,3 +352,176 @@ class Favourite(models.Model):
                 fields=('user', 'recipe'),
                 name='unique_favourite'),
         ]
+
+
+class ShoppingListItem(models.Model):
+    """
+    Материализованный список покупок: суммарное количество ингредиента
+    по всем рецептам в списке покупок пользователя.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингридиент',
+    )
+    amount = models.PositiveIntegerField(
+        'Количество',
+        **REQUIRED_KWARGS,
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item',
+            ),
+        ]
+
+
+class RecipeSearchDocument(models.Model):
+    """
+    Документ полнотекстового индекса рецепта в SQLite: строка
+    виртуальной таблицы FTS5, rowid - идентификатор рецепта.
+    Таблица создаётся миграцией 0013, в PostgreSQL индекс хранится
+    в Recipe.search_vector.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_document',
+        verbose_name='Рецепт',
+    )
+    name = models.TextField('Название')
+    ingredients = models.TextField('Ингредиенты')
+    text = models.TextField('Описание')
+    # Скрытый столбец с именем таблицы: левая часть MATCH
+    # и первый аргумент bm25().
+    document = models.TextField(
+        'Документ',
+        db_column='recipes_recipe_fts',
+        editable=False,
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipe_fts'
+        verbose_name = 'Поисковый документ рецепта'
+        verbose_name_plural = 'Поисковые документы рецептов'
+
+
+class RecipePosting(models.Model):
+    """
+    Блок инвертированного индекса «что приготовить»: отсортированные
+    смещения идентификаторов рецептов внутри блока, упакованные
+    в uint16. Ключ — ингредиент или число ингредиентов рецепта.
+    """
+    INGREDIENT = 'ingredient'
+    SIZE = 'size'
+    KINDS = (
+        (INGREDIENT, 'Ингредиент'),
+        (SIZE, 'Число ингредиентов'),
+    )
+
+    kind = models.CharField(
+        'Вид ключа',
+        max_length=10,
+        choices=KINDS,
+    )
+    key = models.PositiveIntegerField('Ключ')
+    block = models.PositiveIntegerField('Блок идентификаторов')
+    recipe_ids = models.BinaryField('Рецепты', default=bytes)
+    revision = models.PositiveIntegerField('Ревизия', default=0)
+
+    class Meta:
+        verbose_name = 'Блок индекса ингредиентов'
+        verbose_name_plural = 'Блоки индекса ингредиентов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('kind', 'key', 'block'),
+                name='unique_recipe_posting',
+            ),
+        ]
+
+
+class RecipeSimilarity(models.Model):
+    """
+    Ближайший сосед рецепта по совместному добавлению в избранное
+    и список покупок. Хранятся только лучшие соседи каждого рецепта.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarities',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_recipe_similarity',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('recipe', '-score'),
+                name='recipe_similarity_score_idx',
+            ),
+        ]
+
+
+class FeedItem(models.Model):
+    """
+    Лента подписок пользователя при рассылке по записи (FEED_MODE=write):
+    рецепт автора, на которого подписан пользователь. Дата публикации
+    рецепта продублирована для чтения ленты по индексу.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_item_user_pub_date_idx',
+            ),
+        ]
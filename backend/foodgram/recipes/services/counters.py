@@ -0,0 +1,112 @@
+from typing import Dict, Iterable, List, Type, Union
+
+from django.db.models import Count, F, Model, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favourite, Recipe, ShoppingCart
+from recipes.services.versions import (
+    RECIPE_COUNTERS_VERSION_SCOPE,
+    USER_VERSION_SCOPE,
+    bump_versions,
+    recipe_scope,
+)
+from users.models import Subscription, User
+
+# Счётчик: (модель со счётчиком, считаемая модель, поле-ссылка на неё).
+COUNTERS = {
+    'favorites_count': (Recipe, Favourite, 'recipe'),
+    'shopping_cart_count': (Recipe, ShoppingCart, 'recipe'),
+    'followers_count': (User, Subscription, 'author'),
+    'recipes_count': (User, Recipe, 'author'),
+}
+
+# Области данных, в ответы которых попадают счётчики модели. Счётчики
+# рецепта меняются с каждым добавлением в избранное и покупки, поэтому
+# у них своя область (и область каждого рецепта), а не область рецептов.
+VERSION_SCOPES = {
+    Recipe: RECIPE_COUNTERS_VERSION_SCOPE,
+    User: USER_VERSION_SCOPE,
+}
+
+RECIPE_COUNTERS = {
+    Favourite: 'favorites_count',
+    ShoppingCart: 'shopping_cart_count',
+}
+
+
+def changed(model: Type[Model], ids: List[int]) -> None:
+    """Смена версий областей с изменившимися счётчиками строк `ids`."""
+    scopes = [VERSION_SCOPES[model]]
+    if model is Recipe:
+        scopes.extend(recipe_scope(recipe_id) for recipe_id in ids)
+    bump_versions(scopes)
+
+
+def increment(
+        model: Type[Model],
+        ids: Iterable[int],
+        field: str,
+        delta: int = 1,
+) -> None:
+    """Атомарное изменение счётчика строк одним UPDATE ... SET = F() + n."""
+    ids = list(ids)
+    if ids and delta:
+        model.objects.filter(pk__in=ids).update(**{field: F(field) + delta})
+        # Обновление через QuerySet.update() не отправляет сигналы.
+        changed(model, ids)
+
+
+def change_recipes(
+        model: Union[Type[Favourite], Type[ShoppingCart]],
+        recipe_ids: Iterable[int],
+        delta: int,
+) -> None:
+    """Изменение счётчика рецептов в избранном или списках покупок."""
+    increment(Recipe, recipe_ids, RECIPE_COUNTERS[model], delta)
+
+
+def change_followers(author_id: int, delta: int) -> None:
+    increment(User, (author_id,), 'followers_count', delta)
+
+
+def change_recipes_count(author_id: int, delta: int) -> None:
+    increment(User, (author_id,), 'recipes_count', delta)
+
+
+def actual(field: str) -> Coalesce:
+    """Подзапрос с фактическим значением счётчика для аннотации."""
+    _, counted, reference = COUNTERS[field]
+    return Coalesce(
+        Subquery(
+            counted.objects.filter(
+                **{reference: OuterRef('pk')},
+            ).order_by().values(reference).annotate(
+                total=Count('pk'),
+            ).values('total'),
+        ),
+        0,
+    )
+
+
+def reconcile(check: bool = False) -> Dict[str, int]:
+    """
+    Сверка счётчиков с фактическим числом связанных строк
+    и исправление расхождений (если не `check`). Возвращает число
+    расходившихся строк по каждому счётчику.
+    """
+    mismatched = {}
+    for field, (model, _, _) in COUNTERS.items():
+        rows = model.objects.alias(
+            actual_count=actual(field),
+        ).exclude(**{field: F('actual_count')})
+        if check:
+            mismatched[field] = rows.count()
+            continue
+
+        ids = list(rows.values_list('pk', flat=True))
+        mismatched[field] = len(ids)
+        if ids:
+            model.objects.filter(pk__in=ids).update(**{field: actual(field)})
+            changed(model, ids)
+
+    return mismatched
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, QuerySet
+
+from recipes.models import FeedItem, Recipe
+from users.models import Subscription, User
+
+READ = 'read'
+WRITE = 'write'
+# Последние рецепты автора, попадающие в ленту при подписке на него.
+BACKFILL_SIZE = 100
+
+FEED_TABLE = FeedItem._meta.db_table
+RECIPE_TABLE = Recipe._meta.db_table
+SUBSCRIPTION_TABLE = Subscription._meta.db_table
+
+
+def fan_out_on_write() -> bool:
+    return settings.FEED_MODE == WRITE
+
+
+def feed(queryset: QuerySet, user: User) -> QuerySet:
+    """
+    Рецепты авторов, на которых подписан пользователь, от новых к старым.
+
+    При рассылке по чтению выборка ограничивается подзапросом подписок
+    и читается по индексу (author, -pub_date, -id), при рассылке
+    по записи - лентой пользователя по индексу (user, -pub_date, -recipe).
+    """
+    if fan_out_on_write():
+        return queryset.filter(feed_items__user=user).annotate(
+            feed_pub_date=F('feed_items__pub_date'),
+        ).order_by('-feed_pub_date', '-pk')
+
+    return queryset.filter(
+        author__in=Subscription.objects.filter(
+            user=user,
+        ).values('author_id'),
+    ).order_by('-pub_date', '-pk')
+
+
+def fan_out(recipe: Recipe) -> None:
+    """Добавление нового рецепта в ленты подписчиков автора."""
+    if not fan_out_on_write():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FEED_TABLE} (user_id, recipe_id, pub_date) '
+            f'SELECT user_id, %s, %s FROM {SUBSCRIPTION_TABLE} '
+            f'WHERE author_id = %s',
+            [recipe.id, recipe.pub_date, recipe.author_id],
+        )
+
+
+def subscribe(user_id: int, author_id: int) -> None:
+    """Последние рецепты автора в ленте нового подписчика."""
+    if not fan_out_on_write():
+        return
+
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for recipe_id, pub_date in Recipe.objects.filter(
+                author_id=author_id,
+            ).order_by('-pub_date', '-id').values_list(
+                'id',
+                'pub_date',
+            )[:BACKFILL_SIZE]
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def unsubscribe(user_id: int, author_id: int) -> None:
+    FeedItem.objects.filter(
+        user_id=user_id,
+        recipe__author_id=author_id,
+    ).delete()
+
+
+@transaction.atomic
+def rebuild() -> int:
+    """Заполнение лент всех пользователей по подпискам."""
+    FeedItem.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FEED_TABLE} (user_id, recipe_id, pub_date) '
+            f'SELECT s.user_id, r.id, r.pub_date '
+            f'FROM {SUBSCRIPTION_TABLE} s '
+            f'JOIN {RECIPE_TABLE} r ON r.author_id = s.author_id'
+        )
+        return cursor.rowcount
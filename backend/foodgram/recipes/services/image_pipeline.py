@@ -0,0 +1,226 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Iterable
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+from recipes.services.versions import RECIPE_VERSION_SCOPE, bump_version
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/variants'
+
+# Качество перезаписи загруженной картинки без метаданных.
+ORIGINAL_QUALITY = 95
+
+# Метаданные, которые не должны оставаться в загруженной картинке.
+METADATA = frozenset(('exif', 'xmp', 'XML:com.adobe.xmp', 'comment'))
+
+# Сведения о картинке, нужные для её отображения.
+KEPT_INFO = frozenset(('icc_profile', 'transparency'))
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+    return _executor
+
+
+def variant_name(image_name: str, variant: str) -> str:
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    extension = settings.RECIPE_IMAGE_FORMAT.lower()
+    return f'{VARIANTS_DIR}/{stem}_{variant}.{extension}'
+
+
+def load(image_name: str) -> tuple:
+    """
+    Картинка, повёрнутая по EXIF, её исходный формат и признак
+    метаданных в файле (текстовые блоки PNG - в атрибуте text).
+    """
+    with default_storage.open(image_name, 'rb') as image_file:
+        original = Image.open(image_file)
+        image_format = original.format
+        has_metadata = bool(
+            METADATA.intersection(original.info)
+            or getattr(original, 'text', None)
+        )
+        # Поворот по EXIF до удаления метаданных.
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    return original, image_format, has_metadata
+
+
+def save(name: str, content: bytes) -> str:
+    """
+    Сохранение файла под свободным именем: существующий файл
+    с тем же именем не перезаписывается. Возвращает путь файла.
+    """
+    return default_storage.save(name, ContentFile(content))
+
+
+def strip_original(image_name: str, original, image_format: str) -> str:
+    """
+    Копия загруженной картинки в том же формате без метаданных
+    (EXIF с координатами, XMP, комментарии) под новым именем.
+    Возвращает путь копии.
+    """
+    image = original.copy()
+    # Часть кодеков берёт метаданные из info картинки.
+    image.info = {
+        key: value
+        for key, value in original.info.items()
+        if key in KEPT_INFO
+    }
+    options = dict(image.info)
+    if image_format in ('JPEG', 'WEBP'):
+        options['quality'] = ORIGINAL_QUALITY
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return save(image_name, buffer.getvalue())
+
+
+def render_variants(image_name: str, original) -> dict:
+    """
+    Уменьшенные копии картинки рецепта без метаданных
+    в формате RECIPE_IMAGE_FORMAT. Возвращает {вариант: путь}.
+    """
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+
+    variants = {}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail((size, size))
+        buffer = io.BytesIO()
+        image.save(
+            buffer,
+            format=settings.RECIPE_IMAGE_FORMAT,
+            quality=settings.RECIPE_IMAGE_QUALITY,
+        )
+        variants[variant] = save(
+            variant_name(image_name, variant),
+            buffer.getvalue(),
+        )
+
+    return variants
+
+
+def in_use(name: str) -> bool:
+    """Файл - картинка или уменьшенная копия какого-либо рецепта."""
+    query = Q(image=name)
+    for variant in settings.RECIPE_IMAGE_VARIANTS:
+        query |= Q(**{f'image_variants__{variant}': name})
+    return Recipe.objects.filter(query).exists()
+
+
+def delete_files(names: Iterable[str]) -> None:
+    """Удаление файлов картинок, которые не использует ни один рецепт."""
+    for name in names:
+        if not name or in_use(name):
+            continue
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.exception('Не удалось удалить файл %s', name)
+
+
+def discard(image_name: str, variants: dict) -> None:
+    """
+    Удаление прежней картинки рецепта и её копий после фиксации
+    транзакции: при замене картинки и удалении рецепта.
+    """
+    names = [image_name, *(variants or {}).values()]
+    transaction.on_commit(lambda: delete_files(names))
+
+
+def process(recipe_id: int, image_name: str) -> None:
+    """
+    Обработка картинки рецепта. Новые файлы пишутся под новыми именами
+    и подставляются в рецепт, только если его картинка не сменилась
+    за время обработки; прежние файлы удаляются после подстановки,
+    иначе удаляются созданные.
+    """
+    created = []
+    try:
+        original, image_format, has_metadata = load(image_name)
+        stripped = image_name
+        if has_metadata:
+            stripped = strip_original(image_name, original, image_format)
+            created.append(stripped)
+        variants = render_variants(stripped, original)
+        created.extend(variants.values())
+
+        with transaction.atomic():
+            previous = Recipe.objects.select_for_update().filter(
+                pk=recipe_id,
+                image=image_name,
+            ).values_list('image_variants', flat=True).first()
+            if previous is not None:
+                Recipe.objects.filter(pk=recipe_id).update(
+                    image=stripped,
+                    image_variants=variants,
+                    updated_at=timezone.now(),
+                )
+    except Exception:
+        logger.exception(
+            'Не удалось обработать картинку %s рецепта %s',
+            image_name,
+            recipe_id,
+        )
+        delete_files(created)
+        return
+
+    if previous is None:
+        # Картинка сменилась или рецепт удалён во время обработки.
+        delete_files(created)
+        return
+
+    # Обновление через QuerySet.update() не отправляет сигналы.
+    bump_version(RECIPE_VERSION_SCOPE)
+    delete_files([
+        image_name if stripped != image_name else None,
+        *(name for name in previous.values() if name not in created),
+    ])
+
+
+def process_in_worker(recipe_id: int, image_name: str) -> None:
+    try:
+        process(recipe_id, image_name)
+    finally:
+        # Соединение с базой принадлежит потоку обработчика.
+        close_old_connections()
+
+
+def schedule(recipe: Recipe) -> None:
+    """
+    Постановка картинки рецепта в очередь обработки после фиксации
+    транзакции. При RECIPE_IMAGE_WORKERS = 0 обработка синхронная.
+    """
+    recipe_id, image_name = recipe.pk, recipe.image.name
+
+    def submit():
+        if settings.RECIPE_IMAGE_WORKERS:
+            get_executor().submit(process_in_worker, recipe_id, image_name)
+        else:
+            process(recipe_id, image_name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,230 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator, Tuple
+
+from django.db import connection, transaction
+
+from recipes.models import Ingredient
+from recipes.services.versions import INGREDIENT_VERSION_SCOPE, bump_version
+
+Row = Tuple[str, str]
+
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+# Размер порции чтения JSON-файла (символов).
+JSON_BUFFER_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r'\s*')
+
+
+@dataclass
+class ImportReport:
+    inserted: int = 0
+    skipped: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.skipped + self.failed
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.total / self.seconds if self.seconds else 0.0
+
+
+def read_csv(path: str) -> Iterator[list]:
+    with open(path, 'r', encoding='utf-8', newline='') as csv_file:
+        yield from csv.reader(csv_file)
+
+
+class JSONStream:
+    """Буфер JSON-файла, дочитываемый порциями по мере разбора."""
+
+    def __init__(self, json_file, buffer_size: int):
+        self.file = json_file
+        self.buffer_size = buffer_size
+        self.buffer, self.position, self.eof = '', 0, False
+
+    def read(self) -> None:
+        chunk = self.file.read(self.buffer_size)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+    def peek(self) -> str:
+        """Следующий символ после пробелов."""
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise ValueError('JSON: файл закончился до конца массива')
+            self.read()
+
+    def expect(self, *chars: str) -> str:
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f'JSON: ожидается {" или ".join(chars)}')
+
+        self.position += 1
+        return char
+
+    def decode(self, decoder: json.JSONDecoder):
+        self.peek()
+        while True:
+            try:
+                item, end = decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise ValueError('JSON: неверный элемент массива')
+            else:
+                # Число в конце порции может продолжаться в следующей.
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return item
+            self.read()
+
+
+def json_items(json_file, buffer_size: int = JSON_BUFFER_SIZE) -> Iterator:
+    """
+    Элементы JSON-массива верхнего уровня по одному: файл читается
+    порциями, в памяти держится только текущий элемент. Нарушение
+    структуры массива - ValueError.
+    """
+    decoder = json.JSONDecoder()
+    stream = JSONStream(json_file, buffer_size)
+    stream.expect('[')
+    if stream.peek() == ']':
+        return
+
+    while True:
+        yield stream.decode(decoder)
+        if stream.expect(',', ']') == ']':
+            return
+
+
+def read_json(path: str) -> Iterator[list]:
+    with open(path, 'r', encoding='utf-8') as json_file:
+        for item in json_items(json_file):
+            if not isinstance(item, dict):
+                # Учитывается в clean_rows как строка неверного формата.
+                yield [item]
+                continue
+
+            yield [item.get('name'), item.get('measurement_unit')]
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def clean_rows(rows: Iterable[list], report: ImportReport) -> Iterator[Row]:
+    """Отбор корректных строк, некорректные учитываются как ошибки."""
+    for number, row in enumerate(rows, start=1):
+        try:
+            name, measurement_unit = (value.strip() for value in row)
+        except (TypeError, ValueError, AttributeError):
+            report.failed += 1
+            report.errors.append(f'Строка {number}: неверный формат {row}')
+            continue
+
+        if not name or len(name) > NAME_MAX_LENGTH:
+            report.failed += 1
+            report.errors.append(f'Строка {number}: неверное название')
+            continue
+
+        if len(measurement_unit) > UNIT_MAX_LENGTH:
+            report.failed += 1
+            report.errors.append(f'Строка {number}: неверная единица')
+            continue
+
+        yield name, measurement_unit
+
+
+def chunked(rows: Iterable[Row], size: int) -> Iterator[list]:
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def insert_bulk(chunk: list) -> None:
+    Ingredient.objects.bulk_create(
+        [
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in chunk
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def insert_copy(chunk: list) -> None:
+    """
+    Загрузка пакета через COPY во временную таблицу и перенос
+    в таблицу ингредиентов с пропуском дубликатов (только PostgreSQL).
+    """
+    table = Ingredient._meta.db_table
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(chunk)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE IF NOT EXISTS ingredient_staging '
+            '(name varchar(200), measurement_unit varchar(200)) '
+            'ON COMMIT DELETE ROWS'
+        )
+        cursor.copy_expert(
+            'COPY ingredient_staging (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT DISTINCT name, measurement_unit FROM ingredient_staging '
+            'ON CONFLICT ON CONSTRAINT unique_ingredient DO NOTHING'
+        )
+        cursor.execute('TRUNCATE ingredient_staging')
+
+
+def import_ingredients(
+        path: str,
+        chunk_size: int = 1000,
+        use_copy: bool = True,
+) -> ImportReport:
+    """
+    Идемпотентный импорт ингредиентов из CSV или JSON файла пакетами.
+    Уже существующие ингредиенты (ограничение unique_ingredient)
+    пропускаются без ошибок.
+    """
+    reader = READERS[os.path.splitext(path)[1].lower()]
+    insert = (
+        insert_copy
+        if use_copy and connection.vendor == 'postgresql'
+        else insert_bulk
+    )
+    report = ImportReport()
+    started = time.perf_counter()
+    before = Ingredient.objects.count()
+    valid = 0
+
+    with transaction.atomic():
+        for chunk in chunked(clean_rows(reader(path), report), chunk_size):
+            insert(chunk)
+            valid += len(chunk)
+
+    report.inserted = Ingredient.objects.count() - before
+    report.skipped = valid - report.inserted
+    report.seconds = time.perf_counter() - started
+    # Массовая вставка не отправляет сигналы post_save.
+    bump_version(INGREDIENT_VERSION_SCOPE)
+    return report
@@ -0,0 +1,79 @@
+from bisect import bisect_left
+from threading import Lock
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from recipes.models import Ingredient
+from recipes.services.versions import INGREDIENT_VERSION_SCOPE, get_version
+
+
+class IngredientPrefixIndex:
+    """
+    Отсортированный индекс названий ингредиентов в памяти процесса
+    для автодополнения по префиксу без обращения к базе данных.
+    Перестраивается при смене версии таблицы ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._data = ([], [])
+
+    def _build(self):
+        rows = sorted(
+            (name.casefold(), id_, name, measurement_unit)
+            for id_, name, measurement_unit in Ingredient.objects.values_list(
+                'id',
+                'name',
+                'measurement_unit',
+            )
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {'id': id_, 'name': name, 'measurement_unit': measurement_unit}
+            for _, id_, name, measurement_unit in rows
+        ]
+        self._data = keys, items
+
+    def _actualize(self):
+        version = get_version(INGREDIENT_VERSION_SCOPE)
+        if version == self._version:
+            return
+
+        with self._lock:
+            if version != self._version:
+                self._build()
+                self._version = version
+
+    def search(self, prefix: str, limit: Optional[int] = None) -> list:
+        """
+        Ингредиенты, название которых начинается с `prefix` (без учёта
+        регистра). Сначала точное совпадение, затем более короткие названия.
+        """
+        self._actualize()
+        return self._search(prefix, limit)
+
+    async def asearch(self, prefix: str, limit: Optional[int] = None) -> list:
+        """
+        Вариант search для асинхронных представлений: в потоке
+        проверяется только версия индекса, поиск выполняется в памяти.
+        """
+        await sync_to_async(self._actualize)()
+        return self._search(prefix, limit)
+
+    def _search(self, prefix: str, limit: Optional[int]) -> list:
+        keys, items = self._data
+        prefix = prefix.casefold()
+
+        start = end = bisect_left(keys, prefix)
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+
+        found = sorted(
+            range(start, end),
+            key=lambda index: (len(keys[index]), index),
+        )
+        return [items[index] for index in found[:limit]]
+
+
+ingredient_index = IngredientPrefixIndex()
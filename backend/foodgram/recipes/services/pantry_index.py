@@ -0,0 +1,326 @@
+import sys
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict, defaultdict
+from functools import reduce
+from operator import or_
+from threading import Lock
+from typing import Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import IngredientInRecipe, RecipePosting
+
+# Блок индекса покрывает BLOCK_SIZE идентификаторов рецептов: смещение
+# внутри блока помещается в uint16, а изменение рецепта переписывает
+# только блоки его диапазона.
+BLOCK_SIZE = 1 << 16
+# Наибольшее число битовых множеств блоков в памяти процесса.
+CACHE_SIZE = 4096
+
+
+def pack(offsets: Iterable[int]) -> bytes:
+    offsets = array('H', offsets)
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+    return offsets.tobytes()
+
+
+def unpack(data) -> array:
+    offsets = array('H')
+    offsets.frombytes(bytes(data))
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+    return offsets
+
+
+def to_bitset(offsets: Iterable[int]) -> int:
+    bits = bytearray(BLOCK_SIZE // 8)
+    for offset in offsets:
+        bits[offset >> 3] |= 1 << (offset & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def add_bitsets(bitsets: Iterable[int]) -> list:
+    """
+    Поразрядное сложение битовых множеств: i-е число результата
+    содержит i-й бит количества множеств, в которые входит каждый элемент.
+    """
+    counters = []
+    for carry in bitsets:
+        for index, counter in enumerate(counters):
+            counters[index] = counter ^ carry
+            carry &= counter
+            if not carry:
+                break
+        else:
+            counters.append(carry)
+    return counters
+
+
+def equal_to(counters: list, value: int, universe: int) -> int:
+    """Элементы `universe`, количество которых в `counters` равно `value`."""
+    if value >> len(counters):
+        return 0
+
+    for index, counter in enumerate(counters):
+        universe &= counter if value >> index & 1 else ~counter
+    return universe
+
+
+def iter_bits(bits: int):
+    """Номера установленных битов по убыванию."""
+    while bits:
+        position = bits.bit_length() - 1
+        yield position
+        bits ^= 1 << position
+
+
+class PantryMatches:
+    """
+    Рецепты, в которых есть хотя бы один из имеющихся ингредиентов,
+    в порядке убывания доли имеющихся ингредиентов, затем возрастания
+    числа недостающих и убывания идентификатора. Элементы:
+    (идентификатор рецепта, имеющихся ингредиентов, всего ингредиентов).
+    Идентификаторы извлекаются только для запрошенного среза.
+    """
+
+    def __init__(self, groups: list):
+        # [(имеющихся, всего, [(блок, битовое множество), ...]), ...]
+        self.groups = groups
+        self.total = sum(
+            bits.bit_count()
+            for _, _, blocks in groups
+            for _, bits in blocks
+        )
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+
+        start, stop, _ = index.indices(self.total)
+        found, skip = [], start
+        for matched, required, blocks in self.groups:
+            for block, bits in blocks:
+                count = bits.bit_count()
+                if skip >= count:
+                    skip -= count
+                    continue
+
+                for offset in iter_bits(bits):
+                    if skip:
+                        skip -= 1
+                        continue
+                    found.append(
+                        (block * BLOCK_SIZE + offset, matched, required)
+                    )
+                    if len(found) >= stop - start:
+                        return found
+        return found
+
+
+class PantryIndex:
+    """
+    Поиск рецептов по имеющимся ингредиентам. Блоки индекса
+    (RecipePosting) хранятся в базе, их битовые множества кэшируются
+    в памяти процесса и перечитываются при смене ревизии блока.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._bitsets = OrderedDict()
+
+    def _load(self, rows: list) -> dict:
+        """Битовые множества блоков: {pk: битовое множество}."""
+        bitsets, stale = {}, []
+        with self._lock:
+            for pk, revision in rows:
+                cached = self._bitsets.get(pk)
+                if cached is not None and cached[0] == revision:
+                    self._bitsets.move_to_end(pk)
+                    bitsets[pk] = cached[1]
+                else:
+                    stale.append(pk)
+
+        if stale:
+            loaded = {
+                pk: (revision, to_bitset(unpack(data)))
+                for pk, revision, data in RecipePosting.objects.filter(
+                    pk__in=stale,
+                ).values_list('pk', 'revision', 'recipe_ids')
+            }
+            with self._lock:
+                self._bitsets.update(loaded)
+                while len(self._bitsets) > CACHE_SIZE:
+                    self._bitsets.popitem(last=False)
+            bitsets.update(
+                (pk, bitset) for pk, (_, bitset) in loaded.items()
+            )
+
+        return bitsets
+
+    def search(self, ingredient_ids: Iterable[int]) -> PantryMatches:
+        ingredient_ids = set(ingredient_ids)
+        rows = list(RecipePosting.objects.filter(
+            Q(kind=RecipePosting.INGREDIENT, key__in=ingredient_ids)
+            | Q(kind=RecipePosting.SIZE)
+        ).values_list('pk', 'kind', 'key', 'block', 'revision'))
+        bitsets = self._load([(row[0], row[4]) for row in rows])
+
+        postings, sizes = defaultdict(list), defaultdict(dict)
+        for pk, kind, key, block, _ in rows:
+            # Блок мог быть удалён между запросами.
+            if pk not in bitsets:
+                continue
+            if kind == RecipePosting.INGREDIENT:
+                postings[block].append(bitsets[pk])
+            else:
+                sizes[block][key] = bitsets[pk]
+
+        groups = defaultdict(list)
+        for block in sorted(postings, reverse=True):
+            counters = add_bitsets(postings[block])
+            universe = reduce(or_, postings[block])
+            for required, recipes in sizes[block].items():
+                candidates = universe & recipes
+                most = min(required, len(ingredient_ids))
+                for matched in range(1, most + 1):
+                    bits = equal_to(counters, matched, candidates)
+                    if bits:
+                        groups[matched, required].append((block, bits))
+
+        return PantryMatches([
+            (matched, required, groups[matched, required])
+            for matched, required in sorted(
+                groups,
+                key=lambda pair: (-pair[0] / pair[1], pair[1] - pair[0]),
+            )
+        ])
+
+
+index = PantryIndex()
+
+
+@transaction.atomic
+def update_recipe(
+        recipe_id: int,
+        old_ingredients: Iterable[int],
+        new_ingredients: Iterable[int],
+) -> None:
+    """
+    Учёт изменения набора ингредиентов рецепта в индексе: переписываются
+    только блоки затронутых ингредиентов и числа ингредиентов.
+    """
+    old, new = set(old_ingredients), set(new_ingredients)
+    block, offset = divmod(recipe_id, BLOCK_SIZE)
+    additions = {
+        (RecipePosting.INGREDIENT, ingredient_id)
+        for ingredient_id in new - old
+    }
+    removals = {
+        (RecipePosting.INGREDIENT, ingredient_id)
+        for ingredient_id in old - new
+    }
+    if len(old) != len(new):
+        if old:
+            removals.add((RecipePosting.SIZE, len(old)))
+        if new:
+            additions.add((RecipePosting.SIZE, len(new)))
+    if not (additions or removals):
+        return
+
+    RecipePosting.objects.bulk_create(
+        [
+            RecipePosting(kind=kind, key=key, block=block)
+            for kind, key in additions
+        ],
+        ignore_conflicts=True,
+    )
+    keys = reduce(or_, (
+        Q(kind=kind, key=key)
+        for kind, key in additions | removals
+    ))
+    changed, emptied = [], []
+    for posting in RecipePosting.objects.select_for_update().filter(
+            keys,
+            block=block,
+    ):
+        offsets = unpack(posting.recipe_ids)
+        position = bisect_left(offsets, offset)
+        present = position < len(offsets) and offsets[position] == offset
+        if (posting.kind, posting.key) in additions:
+            if present:
+                continue
+            insort(offsets, offset)
+        else:
+            if not present:
+                continue
+            del offsets[position]
+
+        if not offsets:
+            emptied.append(posting.pk)
+            continue
+
+        posting.recipe_ids = pack(offsets)
+        posting.revision += 1
+        changed.append(posting)
+
+    RecipePosting.objects.bulk_update(changed, ('recipe_ids', 'revision'))
+    RecipePosting.objects.filter(pk__in=emptied).delete()
+
+
+def change_ingredient(
+        recipe_id: int,
+        removed: Optional[int] = None,
+        added: Optional[int] = None,
+) -> None:
+    """
+    Учёт уже сохранённой замены, удаления (`removed`) или добавления
+    (`added`) одного ингредиента рецепта.
+    """
+    new = set(IngredientInRecipe.objects.filter(
+        recipe_id=recipe_id,
+    ).values_list('ingredient_id', flat=True))
+    old = new - {added}
+    if removed is not None:
+        old.add(removed)
+    update_recipe(recipe_id, old, new)
+
+
+@transaction.atomic
+def rebuild() -> int:
+    """Пересборка индекса по ингредиентам рецептов. Возвращает число блоков."""
+    RecipePosting.objects.all().delete()
+    postings = defaultdict(lambda: array('H'))
+    sizes = Counter()
+    for ingredient_id, recipe_id in IngredientInRecipe.objects.values_list(
+            'ingredient_id',
+            'recipe_id',
+    ).order_by('recipe_id').iterator(chunk_size=10000):
+        block, offset = divmod(recipe_id, BLOCK_SIZE)
+        postings[RecipePosting.INGREDIENT, ingredient_id, block].append(
+            offset
+        )
+        sizes[recipe_id] += 1
+
+    for recipe_id, size in sizes.items():
+        block, offset = divmod(recipe_id, BLOCK_SIZE)
+        postings[RecipePosting.SIZE, size, block].append(offset)
+
+    created = RecipePosting.objects.bulk_create(
+        (
+            RecipePosting(
+                kind=kind,
+                key=key,
+                block=block,
+                recipe_ids=pack(offsets),
+            )
+            for (kind, key, block), offsets in postings.items()
+        ),
+        batch_size=1000,
+    )
+    return len(created)
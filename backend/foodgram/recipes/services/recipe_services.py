@@ -1,8 +1,9 @@
-from typing import Union
-from datetime import datetime
+from itertools import chain
+from typing import Iterable, Union
 
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import status, response
 
@@ -12,8 +13,25 @@ from recipes.models import (
     Recipe,
     ShoppingCart,
     Favourite,
-    IngredientInRecipe,
+    ShoppingListItem,
 )
+from recipes.services import counters, shopping_list_services
+from recipes.services.shopping_list_export import EXPORTERS
+from recipes.services.versions import bump_version, user_scope
+
+EXPORT_CHUNK_SIZE = 500
+
+
+def lock_user(user: User) -> None:
+    """
+    Блокировка строки пользователя до конца транзакции: изменения его
+    избранного и списка покупок выполняются по очереди, поэтому
+    проверка наличия рецепта не расходится с фактической вставкой
+    или удалением, и счётчики не меняются дважды.
+    """
+    list(User.objects.select_for_update().filter(
+        pk=user.pk,
+    ).values_list('pk', flat=True))
 
 
 def add_recipe_service(
@@ -25,23 +43,22 @@ def add_recipe_service(
     Удаление рецепта по идентификатору из сущности переданной модели.
     Модель должна иметь внешние ключи на сущности User и Recipe.
     """
-    found_recipe = model.objects.filter(
-        user=user,
-        recipe__id=id_,
-    )
-    if found_recipe.exists():
-        return response.Response(
-            {'errors': 'Рецепт уже присутствует'},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
-
     found_recipe = get_object_or_404(Recipe, id=id_)
     serializer = BaseRecipeSerializer(found_recipe)
 
-    model.objects.create(
-        user=user,
-        recipe=found_recipe,
-    )
+    with transaction.atomic():
+        lock_user(user)
+        if model.objects.filter(user=user, recipe=found_recipe).exists():
+            return response.Response(
+                {'errors': 'Рецепт уже присутствует'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        model.objects.create(
+            user=user,
+            recipe=found_recipe,
+        )
+
     return response.Response(
         serializer.data,
         status=status.HTTP_201_CREATED,
@@ -57,16 +74,17 @@ def delete_recipe_service(
     Удаление рецепта по идентификатору из сущности переданной модели.
     Модель должна иметь внешние ключи на сущности User и Recipe.
     """
-    found_recipe = model.objects.filter(
-        user=user,
-        recipe__id=id_,
-    )
-
-    if found_recipe.exists():
-        found_recipe.delete()
-        return response.Response(
-            status=status.HTTP_204_NO_CONTENT,
+    with transaction.atomic():
+        lock_user(user)
+        found_recipe = model.objects.filter(
+            user=user,
+            recipe__id=id_,
         )
+        if found_recipe.exists():
+            found_recipe.delete()
+            return response.Response(
+                status=status.HTTP_204_NO_CONTENT,
+            )
 
     return response.Response(
         {'errors': 'Рецепта уже не существует'},
@@ -74,38 +92,174 @@ def delete_recipe_service(
     )
 
 
-def collect_shopping_cart(user: User):
+def add_recipes_service(
+        model: Union[ShoppingCart, Favourite],
+        user: User,
+        ids: Iterable[int],
+) -> response.Response:
     """
-    Формирование списка покупок для пользователя на основе
-    добавленных рецептов.
+    Добавление нескольких рецептов в сущность переданной модели.
+    Рецепты и их наличие у пользователя проверяются одним запросом
+    под блокировкой пользователя, поэтому вставляются и учитываются
+    в счётчиках и списке покупок только отсутствовавшие рецепты.
+    Результат возвращается для каждого идентификатора:
+    added, exists или not_found.
     """
-    if not user.shopping_cart.exists():
-        return response.Response(
-            status=status.HTTP_400_BAD_REQUEST,
-        )
+    ids = list(dict.fromkeys(ids))
+    with transaction.atomic():
+        lock_user(user)
+        recipes = Recipe.objects.filter(id__in=ids).annotate(
+            present=Exists(model.objects.filter(
+                user=user,
+                recipe=OuterRef('pk'),
+            )),
+        ).only('id', 'name', 'image', 'cooking_time').in_bulk()
+        added = [
+            recipe
+            for recipe in recipes.values()
+            if not recipe.present
+        ]
+        if added:
+            model.objects.bulk_create(
+                model(user=user, recipe=recipe) for recipe in added
+            )
+            counters.change_recipes(
+                model,
+                (recipe.id for recipe in added),
+                1,
+            )
+            if model is ShoppingCart:
+                shopping_list_services.add_recipes(
+                    user,
+                    (recipe.id for recipe in added),
+                )
+
+    if added:
+        # Массовая вставка не отправляет сигналы post_save.
+        bump_version(user_scope(user.id))
+
+    results = []
+    for id_ in ids:
+        recipe = recipes.get(id_)
+        if recipe is None:
+            results.append({'id': id_, 'status': 'not_found'})
+        elif recipe.present:
+            results.append({'id': id_, 'status': 'exists'})
+        else:
+            results.append({
+                'id': id_,
+                'status': 'added',
+                'recipe': BaseRecipeSerializer(recipe).data,
+            })
+
+    return response.Response(
+        {'results': results},
+        status=status.HTTP_201_CREATED if added else status.HTTP_200_OK,
+    )
+
+
+def delete_recipes_service(
+        model: Union[ShoppingCart, Favourite],
+        user: User,
+        ids: Iterable[int],
+) -> response.Response:
+    """
+    Удаление нескольких рецептов из сущности переданной модели.
+    Результат возвращается для каждого идентификатора: removed или absent.
+    """
+    ids = list(dict.fromkeys(ids))
+    with transaction.atomic():
+        lock_user(user)
+        found = model.objects.filter(user=user, recipe_id__in=ids)
+        removed = set(found.values_list('recipe_id', flat=True))
+        if removed:
+            with shopping_list_services.batched():
+                if model is ShoppingCart:
+                    shopping_list_services.remove_recipes(user, removed)
+                found.filter(recipe_id__in=removed).delete()
+            counters.change_recipes(model, removed, -1)
+
+    return response.Response(
+        {
+            'results': [
+                {
+                    'id': id_,
+                    'status': 'removed' if id_ in removed else 'absent',
+                }
+                for id_ in ids
+            ],
+        },
+        status=status.HTTP_200_OK,
+    )
+
 
-    ingredients = IngredientInRecipe.objects.filter(
-        recipe__shopping_cart__user=user,
+def shopping_list(user: User):
+    return ShoppingListItem.objects.filter(
+        user=user,
     ).values(
         'ingredient__name',
         'ingredient__measurement_unit',
-    ).annotate(total_amount=Sum('amount'))
-
-    ingredient_list = '\n'.join(
-        f'• {ingredient["ingredient__name"]} '
-        f'- {ingredient["total_amount"]} '
-        f'({ingredient["ingredient__measurement_unit"]})'
-        for ingredient in ingredients
+        total_amount=F('amount'),
+    ).order_by(
+        'ingredient__name',
     )
-    resp = HttpResponse(
-        (
-            f'Список покупок пользователя {user.get_full_name()}\n\n'
-            f'Дата: {datetime.today():%Y-%m-%d}\n\n{ingredient_list}'
-        ),
-        content_type='text/plain',
+
+
+def shopping_list_response(content, user: User, export_format: str):
+    resp = StreamingHttpResponse(
+        content,
+        content_type=f'{EXPORTERS[export_format][1]}; charset=utf-8',
     )
     resp['Content-Disposition'] = (
         'attachment; '
-        f'filename={user.username}_shopping_list.txt'
+        f'filename={user.username}_shopping_list.{export_format}'
     )
     return resp
+
+
+def collect_shopping_cart(user: User, export_format: str = 'txt'):
+    """
+    Формирование списка покупок для пользователя на основе
+    добавленных рецептов. Список читается из материализованного списка
+    покупок и отдаётся потоком в выбранном формате (txt, csv, json).
+    """
+    ingredients = shopping_list(user).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    first = next(ingredients, None)
+    if first is None:
+        return response.Response(
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    exporter, _ = EXPORTERS[export_format]
+    return shopping_list_response(
+        exporter(user, chain((first,), ingredients)),
+        user,
+        export_format,
+    )
+
+
+async def acollect_shopping_cart(user: User, export_format: str = 'txt'):
+    """
+    Вариант collect_shopping_cart для асинхронных представлений:
+    список читается асинхронным итератором частями по EXPORT_CHUNK_SIZE
+    и отдаётся асинхронным потоком, медленный клиент не занимает поток
+    обработчика.
+    """
+    ingredients = shopping_list(user).aiterator(chunk_size=EXPORT_CHUNK_SIZE)
+    first = await anext(ingredients, None)
+    if first is None:
+        return response.Response(
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    async def rows():
+        yield first
+        async for ingredient in ingredients:
+            yield ingredient
+
+    exporter, _ = EXPORTERS[export_format]
+    return shopping_list_response(
+        exporter.aexport(user, rows()),
+        user,
+        export_format,
+    )
@@ -0,0 +1,124 @@
+import heapq
+import math
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from recipes.models import Favourite, RecipeSimilarity, ShoppingCart
+from users.models import User
+
+# Число хранимых соседей каждого рецепта.
+NEIGHBOURS = 20
+# Учитываются только последние рецепты пользователя: вклад очень
+# активных пользователей в совместную встречаемость растёт квадратично.
+MAX_USER_RECIPES = 500
+# Рецепты пользователя, по соседям которых строятся рекомендации.
+HISTORY_SIZE = 50
+BATCH_SIZE = 10000
+
+
+def interactions() -> Dict[int, List[int]]:
+    """Рецепты в избранном и списке покупок: {пользователь: [рецепты]}."""
+    recipes = defaultdict(dict)
+    for model in (Favourite, ShoppingCart):
+        for user_id, recipe_id in model.objects.values_list(
+                'user_id',
+                'recipe_id',
+        ).order_by('-id').iterator(chunk_size=BATCH_SIZE):
+            user_recipes = recipes[user_id]
+            if len(user_recipes) < MAX_USER_RECIPES:
+                user_recipes[recipe_id] = None
+
+    return {
+        user_id: list(user_recipes)
+        for user_id, user_recipes in recipes.items()
+    }
+
+
+def neighbours(
+        users: Dict[int, List[int]],
+        count: int = NEIGHBOURS,
+):
+    """
+    Лучшие соседи каждого рецепта: (рецепт, [(сосед, сходство), ...]).
+
+    Сходство - косинус между столбцами матрицы пользователь×рецепт,
+    где вес пользователя убывает с числом его рецептов. Строка матрицы
+    совместной встречаемости считается по одному рецепту, поэтому
+    в памяти находится только она.
+    """
+    weights = {
+        user_id: 1 / math.log2(1 + len(recipes))
+        for user_id, recipes in users.items()
+    }
+    recipe_users, norms = defaultdict(list), defaultdict(float)
+    for user_id, recipes in users.items():
+        for recipe_id in recipes:
+            recipe_users[recipe_id].append(user_id)
+            norms[recipe_id] += weights[user_id]
+
+    for recipe_id, user_ids in recipe_users.items():
+        row = defaultdict(float)
+        for user_id in user_ids:
+            weight = weights[user_id]
+            for other_id in users[user_id]:
+                row[other_id] += weight
+        del row[recipe_id]
+        if not row:
+            continue
+
+        norm = norms[recipe_id]
+        yield recipe_id, heapq.nlargest(
+            count,
+            (
+                (other_id, common / math.sqrt(norm * norms[other_id]))
+                for other_id, common in row.items()
+            ),
+            key=lambda pair: (pair[1], pair[0]),
+        )
+
+
+@transaction.atomic
+def rebuild(count: int = NEIGHBOURS) -> int:
+    """Пересчёт похожих рецептов. Возвращает число сохранённых пар."""
+    RecipeSimilarity.objects.all().delete()
+    batch, created = [], 0
+    for recipe_id, similar in neighbours(interactions(), count):
+        batch.extend(
+            RecipeSimilarity(
+                recipe_id=recipe_id,
+                similar_id=similar_id,
+                score=score,
+            )
+            for similar_id, score in similar
+        )
+        if len(batch) >= BATCH_SIZE:
+            RecipeSimilarity.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+
+    RecipeSimilarity.objects.bulk_create(batch)
+    return created + len(batch)
+
+
+def recommended(user: User, limit: int) -> List[Tuple[int, float]]:
+    """
+    Рекомендации пользователю: соседи его последних рецептов
+    в избранном и списке покупок, кроме уже добавленных, с суммарным
+    сходством. Считается одним запросом по индексу соседей.
+    """
+    history, seen = Q(), Q()
+    for model in (Favourite, ShoppingCart):
+        recipes = model.objects.filter(user=user).values('recipe_id')
+        history |= Q(recipe_id__in=recipes.order_by('-id')[:HISTORY_SIZE])
+        seen |= Q(similar_id__in=recipes)
+
+    return list(
+        RecipeSimilarity.objects.filter(history).exclude(seen).values_list(
+            'similar_id',
+        ).annotate(
+            total=Sum('score'),
+        ).order_by('-total', '-similar_id')[:limit]
+    )
@@ -0,0 +1,238 @@
+import html
+import re
+from typing import Iterable, Optional
+
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+)
+from django.db import connection
+from django.db.models import F, FloatField, Func, Lookup, Q, QuerySet, Value
+
+from recipes.models import (
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeSearchDocument,
+)
+
+# Конфигурация полнотекстового поиска PostgreSQL: содержимое на русском.
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = RecipeSearchDocument._meta.db_table
+# Веса полей в ранжировании: название, ингредиенты, описание.
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+HIGHLIGHT_WORDS = 20
+
+TOKEN = re.compile(r'\w+')
+
+RECIPE_TABLE = Recipe._meta.db_table
+INGREDIENT_TABLE = Ingredient._meta.db_table
+INGREDIENT_IN_RECIPE_TABLE = IngredientInRecipe._meta.db_table
+
+
+class Match(Lookup):
+    """Условие полнотекстового запроса FTS5: <таблица> MATCH <запрос>."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+RecipeSearchDocument._meta.get_field('document').register_lookup(Match)
+
+
+def fts_match(query: str) -> str:
+    """
+    Запрос FTS5 из пользовательской строки: все слова обязательны,
+    каждое ищется как префикс (в SQLite нет русского стеммера).
+    """
+    return ' '.join(
+        f'"{token}"*' for token in TOKEN.findall(query.lower())
+    )
+
+
+def index_recipes(recipe_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Обновление поискового индекса рецептов (всех, если `recipe_ids`
+    не задан) по названию, ингредиентам и описанию.
+    """
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            where = 'WHERE r.id = ANY(%s)' if recipe_ids is not None else ''
+            cursor.execute(
+                f'UPDATE {RECIPE_TABLE} AS recipe SET search_vector = '
+                f"setweight(to_tsvector(%s, recipe.name), 'A') || "
+                f"setweight(to_tsvector(%s, documents.names), 'B') || "
+                f"setweight(to_tsvector(%s, recipe.text), 'C') "
+                f"FROM (SELECT r.id, coalesce(string_agg(i.name, ' '), '') "
+                f'AS names FROM {RECIPE_TABLE} r '
+                f'LEFT JOIN {INGREDIENT_IN_RECIPE_TABLE} ir '
+                f'ON ir.recipe_id = r.id '
+                f'LEFT JOIN {INGREDIENT_TABLE} i ON i.id = ir.ingredient_id '
+                f'{where} GROUP BY r.id) AS documents '
+                f'WHERE recipe.id = documents.id',
+                [SEARCH_CONFIG] * 3 + (
+                    [recipe_ids] if recipe_ids is not None else []
+                ),
+            )
+        elif connection.vendor == 'sqlite':
+            placeholders = ', '.join(['%s'] * len(recipe_ids or ()))
+            where = (
+                f'WHERE r.id IN ({placeholders})'
+                if recipe_ids is not None else ''
+            )
+            params = recipe_ids or []
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} '
+                + (f'WHERE rowid IN ({placeholders})' if where else ''),
+                params,
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+                f"SELECT r.id, r.name, coalesce(group_concat(i.name, ' '), "
+                f"''), r.text FROM {RECIPE_TABLE} r "
+                f'LEFT JOIN {INGREDIENT_IN_RECIPE_TABLE} ir '
+                f'ON ir.recipe_id = r.id '
+                f'LEFT JOIN {INGREDIENT_TABLE} i ON i.id = ir.ingredient_id '
+                f'{where} GROUP BY r.id',
+                params,
+            )
+
+
+def remove_recipes(recipe_ids: Iterable[int]) -> None:
+    """Удаление рецептов из индекса FTS5 (в PostgreSQL вектор в строке)."""
+    recipe_ids = list(recipe_ids)
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+            f'({", ".join(["%s"] * len(recipe_ids))})',
+            recipe_ids,
+        )
+
+
+def search(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Рецепты, подходящие под поисковый запрос, с релевантностью
+    `search_rank`, отсортированные от наиболее релевантных.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query,
+            config=SEARCH_CONFIG,
+            search_type='websearch',
+        )
+        queryset = queryset.filter(
+            search_vector=search_query,
+        ).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query),
+        )
+    elif connection.vendor == 'sqlite':
+        match = fts_match(query)
+        if not match:
+            return queryset.none()
+
+        # Таблица FTS5 присоединяется к выборке: запрос MATCH выполняется
+        # один раз, bm25() доступна и в сортировке, и в условиях курсора.
+        queryset = queryset.filter(
+            search_document__document__match=match,
+        ).annotate(
+            search_rank=-Func(
+                F('search_document__document'),
+                *(Value(weight) for weight in FTS_WEIGHTS),
+                function='bm25',
+                output_field=FloatField(),
+            ),
+        )
+    else:
+        queryset = queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(search_rank=Value(0.0))
+
+    return queryset.order_by('-search_rank', '-pk')
+
+
+def mark(fragment: str) -> str:
+    """Экранирование фрагмента и разметка найденных слов тегом <mark>."""
+    return html.escape(fragment).replace(
+        HIGHLIGHT_START, '<mark>',
+    ).replace(
+        HIGHLIGHT_STOP, '</mark>',
+    )
+
+
+def highlights(recipe_ids: Iterable[int], query: str) -> dict:
+    """
+    Фрагменты названия и описания рецептов с подсвеченными словами
+    запроса: {идентификатор рецепта: {'name': ..., 'text': ...}}.
+    Считается только для рецептов страницы.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return {}
+
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query,
+            config=SEARCH_CONFIG,
+            search_type='websearch',
+        )
+        options = {
+            'config': SEARCH_CONFIG,
+            'start_sel': HIGHLIGHT_START,
+            'stop_sel': HIGHLIGHT_STOP,
+        }
+        rows = Recipe.objects.filter(pk__in=recipe_ids).annotate(
+            name_headline=SearchHeadline(
+                'name',
+                search_query,
+                highlight_all=True,
+                **options,
+            ),
+            text_headline=SearchHeadline(
+                'text',
+                search_query,
+                max_words=HIGHLIGHT_WORDS,
+                min_words=HIGHLIGHT_WORDS // 4,
+                **options,
+            ),
+        ).values_list('id', 'name_headline', 'text_headline')
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, '
+                f'highlight({FTS_TABLE}, 0, %s, %s), '
+                f"snippet({FTS_TABLE}, 2, %s, %s, '…', %s) "
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN '
+                f'({", ".join(["%s"] * len(recipe_ids))})',
+                [
+                    HIGHLIGHT_START,
+                    HIGHLIGHT_STOP,
+                    HIGHLIGHT_START,
+                    HIGHLIGHT_STOP,
+                    HIGHLIGHT_WORDS,
+                    fts_match(query),
+                    *recipe_ids,
+                ],
+            )
+            rows = cursor.fetchall()
+    else:
+        return {}
+
+    return {
+        recipe_id: {'name': mark(name), 'text': mark(text)}
+        for recipe_id, name, text in rows
+    }
@@ -0,0 +1,115 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
+
+from users.models import User
+
+
+class Exporter:
+    """
+    Формат выгрузки списка покупок: заголовок, строки ингредиентов
+    и окончание. Список отдаётся по частям из обычного или асинхронного
+    итератора строк, без сборки всего списка в памяти.
+    """
+
+    def header(self, user: User) -> str:
+        return ''
+
+    def row(self, ingredient: dict, first: bool) -> str:
+        raise NotImplementedError
+
+    def footer(self) -> str:
+        return ''
+
+    def __call__(
+            self,
+            user: User,
+            ingredients: Iterable[dict],
+    ) -> Iterator[str]:
+        yield self.header(user)
+        first = True
+        for ingredient in ingredients:
+            yield self.row(ingredient, first)
+            first = False
+
+        yield self.footer()
+
+    async def aexport(
+            self,
+            user: User,
+            ingredients: AsyncIterable[dict],
+    ) -> AsyncIterator[str]:
+        yield self.header(user)
+        first = True
+        async for ingredient in ingredients:
+            yield self.row(ingredient, first)
+            first = False
+
+        yield self.footer()
+
+
+class TxtExporter(Exporter):
+
+    def header(self, user: User) -> str:
+        return (
+            f'Список покупок пользователя {user.get_full_name()}\n\n'
+            f'Дата: {datetime.today():%Y-%m-%d}\n\n'
+        )
+
+    def row(self, ingredient: dict, first: bool) -> str:
+        separator = '' if first else '\n'
+        return (
+            f'{separator}• {ingredient["ingredient__name"]} '
+            f'- {ingredient["total_amount"]} '
+            f'({ingredient["ingredient__measurement_unit"]})'
+        )
+
+
+class CsvExporter(Exporter):
+
+    @staticmethod
+    def format_row(values: tuple) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue()
+
+    def header(self, user: User) -> str:
+        return self.format_row(
+            ('Ингредиент', 'Количество', 'Единица измерения'),
+        )
+
+    def row(self, ingredient: dict, first: bool) -> str:
+        return self.format_row((
+            ingredient['ingredient__name'],
+            ingredient['total_amount'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+class JsonExporter(Exporter):
+
+    def header(self, user: User) -> str:
+        header = json.dumps({
+            'user': user.username,
+            'date': f'{datetime.today():%Y-%m-%d}',
+        }, ensure_ascii=False)
+        return f'{header[:-1]}, "ingredients": ['
+
+    def row(self, ingredient: dict, first: bool) -> str:
+        return ('' if first else ', ') + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['total_amount'],
+        }, ensure_ascii=False)
+
+    def footer(self) -> str:
+        return ']}'
+
+
+EXPORTERS = {
+    'txt': (TxtExporter(), 'text/plain'),
+    'csv': (CsvExporter(), 'text/csv'),
+    'json': (JsonExporter(), 'application/json'),
+}
@@ -0,0 +1,246 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Union
+
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import (
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    ShoppingListItem,
+)
+from users.models import User
+
+Amounts = Dict[int, int]
+
+# Изменения, которые вызывающий код учитывает сам одним приращением
+# (массовые операции API): сигналы строк их пропускают.
+_batched = ContextVar('shopping_list_batched', default=False)
+
+
+@contextmanager
+def batched():
+    """
+    Изменения корзин, избранного и ингредиентов рецептов в блоке
+    учитываются вызывающим кодом, а не сигналами отдельных строк.
+    """
+    token = _batched.set(True)
+    try:
+        yield
+    finally:
+        _batched.reset(token)
+
+
+def tracks_rows() -> bool:
+    """Учитываются ли изменения отдельных строк сигналами."""
+    return not _batched.get()
+
+
+def recipe_amounts(recipe: Union[Recipe, int]) -> Amounts:
+    """Количество каждого ингредиента рецепта по его идентификатору."""
+    return dict(
+        IngredientInRecipe.objects.filter(
+            recipe=recipe,
+        ).values_list('ingredient_id', 'amount')
+    )
+
+
+@transaction.atomic
+def apply_deltas(user_ids: Iterable[int], deltas: Amounts) -> None:
+    """
+    Изменение материализованных списков покупок пользователей
+    на заданные приращения количества ингредиентов.
+    Позиции с нулевым количеством удаляются.
+    """
+    user_ids = list(user_ids)
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items()
+        if delta
+    }
+    if not (user_ids and deltas):
+        return
+
+    # Недостающие позиции сначала вставляются с нулевым количеством
+    # с пропуском конфликтов: одновременное добавление той же позиции
+    # другим запросом не приводит к IntegrityError, обе транзакции
+    # затем изменяют одну заблокированную строку.
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                amount=0,
+            )
+            for user_id in user_ids
+            for ingredient_id, delta in deltas.items()
+            if delta > 0
+        ),
+        ignore_conflicts=True,
+    )
+    to_update, to_delete = [], []
+    for item in ShoppingListItem.objects.select_for_update().filter(
+            user_id__in=user_ids,
+            ingredient_id__in=deltas,
+    ):
+        item.amount += deltas[item.ingredient_id]
+        if item.amount > 0:
+            to_update.append(item)
+        else:
+            to_delete.append(item.pk)
+
+    ShoppingListItem.objects.bulk_update(to_update, ('amount',))
+    ShoppingListItem.objects.filter(pk__in=to_delete).delete()
+
+
+def recipes_amounts(recipe_ids: Iterable[int]) -> Amounts:
+    """Суммарное количество каждого ингредиента нескольких рецептов."""
+    return dict(
+        IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids,
+        ).values_list('ingredient_id').annotate(
+            total_amount=Sum('amount'),
+        ).order_by()
+    )
+
+
+def add_recipe(user_id: int, recipe: Union[Recipe, int]) -> None:
+    """Учёт рецепта, добавленного в список покупок пользователя."""
+    apply_deltas((user_id,), recipe_amounts(recipe))
+
+
+def remove_recipe(user_id: int, recipe: Union[Recipe, int]) -> None:
+    """Учёт рецепта, удалённого из списка покупок пользователя."""
+    apply_deltas(
+        (user_id,),
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount in recipe_amounts(recipe).items()
+        },
+    )
+
+
+def add_recipes(user: User, recipe_ids: Iterable[int]) -> None:
+    """Учёт нескольких рецептов, добавленных в список покупок."""
+    apply_deltas((user.id,), recipes_amounts(recipe_ids))
+
+
+def remove_recipes(user: User, recipe_ids: Iterable[int]) -> None:
+    """Учёт нескольких рецептов, удалённых из списка покупок."""
+    apply_deltas(
+        (user.id,),
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount in recipes_amounts(recipe_ids).items()
+        },
+    )
+
+
+def cart_user_ids(recipe: Union[Recipe, int]) -> list:
+    return list(
+        ShoppingCart.objects.filter(
+            recipe=recipe,
+        ).values_list('user_id', flat=True)
+    )
+
+
+def change_recipe(recipe: Recipe, old: Amounts, new: Amounts) -> None:
+    """
+    Учёт изменения ингредиентов рецепта во всех списках покупок,
+    в которых он находится.
+    """
+    deltas = {
+        ingredient_id: new.get(ingredient_id, 0) - old.get(ingredient_id, 0)
+        for ingredient_id in old.keys() | new.keys()
+    }
+    if any(deltas.values()):
+        apply_deltas(cart_user_ids(recipe), deltas)
+
+
+def change_ingredient(
+        recipe: Union[Recipe, int],
+        ingredient_id: int,
+        delta: int,
+) -> None:
+    """
+    Учёт изменения количества одного ингредиента рецепта во всех
+    списках покупок, в которых он находится.
+    """
+    if delta:
+        apply_deltas(cart_user_ids(recipe), {ingredient_id: delta})
+
+
+def delete_recipe(recipe: Recipe) -> None:
+    """
+    Учёт удаления рецепта до каскадного удаления списков покупок
+    (сигнал pre_delete: удаление через API, админку, ORM или вместе
+    с автором).
+    """
+    change_recipe(recipe, old=recipe_amounts(recipe), new={})
+
+
+def live_totals(user_ids: Optional[Iterable[int]] = None) -> dict:
+    """
+    Списки покупок, собранные агрегацией по рецептам в списках покупок:
+    {идентификатор пользователя: {идентификатор ингредиента: количество}}.
+    """
+    rows = IngredientInRecipe.objects.filter(
+        recipe__shopping_cart__isnull=False,
+    )
+    if user_ids is not None:
+        rows = rows.filter(recipe__shopping_cart__user_id__in=user_ids)
+
+    totals = defaultdict(dict)
+    for user_id, ingredient_id, amount in rows.values_list(
+            'recipe__shopping_cart__user_id',
+            'ingredient_id',
+    ).annotate(total_amount=Sum('amount')).order_by().iterator():
+        totals[user_id][ingredient_id] = amount
+
+    return totals
+
+
+def materialized_totals(user_ids: Optional[Iterable[int]] = None) -> dict:
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+
+    totals = defaultdict(dict)
+    for user_id, ingredient_id, amount in items.values_list(
+            'user_id',
+            'ingredient_id',
+            'amount',
+    ).iterator():
+        totals[user_id][ingredient_id] = amount
+
+    return totals
+
+
+@transaction.atomic
+def rebuild(user_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Пересборка материализованных списков покупок по рецептам
+    в списках покупок. Возвращает количество созданных позиций.
+    """
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        items = items.filter(user_id__in=user_ids)
+    items.delete()
+
+    created = ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for user_id, amounts in live_totals(user_ids).items()
+            for ingredient_id, amount in amounts.items()
+        ),
+        batch_size=1000,
+    )
+    return len(created)
@@ -0,0 +1,63 @@
+import time
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+
+VERSION_KEY = 'version:{scope}'
+
+RECIPE_VERSION_SCOPE = 'recipe'
+RECIPE_COUNTERS_VERSION_SCOPE = 'recipe-counters'
+TAG_VERSION_SCOPE = 'tag'
+INGREDIENT_VERSION_SCOPE = 'ingredient'
+USER_VERSION_SCOPE = 'user'
+
+
+def user_scope(user_id: int) -> str:
+    """Область данных пользователя: избранное, покупки, подписки."""
+    return f'{USER_VERSION_SCOPE}:{user_id}'
+
+
+def recipe_scope(recipe_id: int) -> str:
+    """Область счётчиков рецепта: число добавлений в избранное и покупки."""
+    return f'{RECIPE_VERSION_SCOPE}:{recipe_id}'
+
+
+def get_version(scope: str) -> int:
+    """
+    Текущая версия области данных (таблицы, пользователя и т.п.).
+    Меняется при каждом изменении данных области.
+    """
+    return caches[settings.API_CACHE].get_or_set(
+        VERSION_KEY.format(scope=scope),
+        time.time_ns,
+        timeout=None,
+    )
+
+
+def bump_version(scope: str) -> int:
+    """
+    Смена версии области данных после её изменения. Версия - время
+    изменения в наносекундах и только растёт, поэтому по версиям
+    вычисляется время последнего изменения ответа (Last-Modified).
+    """
+    key = VERSION_KEY.format(scope=scope)
+    cache = caches[settings.API_CACHE]
+    version = max(time.time_ns(), (cache.get(key) or 0) + 1)
+    cache.set(key, version, timeout=None)
+    return version
+
+
+def bump_versions(scopes: Iterable[str]) -> None:
+    """Смена версий нескольких областей данных двумя запросами к кешу."""
+    keys = [VERSION_KEY.format(scope=scope) for scope in scopes]
+    if not keys:
+        return
+
+    cache = caches[settings.API_CACHE]
+    now = time.time_ns()
+    previous = cache.get_many(keys)
+    cache.set_many(
+        {key: max(now, previous.get(key, 0) + 1) for key in keys},
+        timeout=None,
+    )
@@ -0,0 +1,282 @@
+from django.db.models import QuerySet
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from recipes.models import (
+    Favourite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from recipes.services import (
+    counters,
+    image_pipeline,
+    pantry_index,
+    search,
+    shopping_list_services,
+)
+from recipes.services.versions import (
+    INGREDIENT_VERSION_SCOPE,
+    RECIPE_VERSION_SCOPE,
+    TAG_VERSION_SCOPE,
+    USER_VERSION_SCOPE,
+    bump_version,
+    user_scope,
+)
+from users.models import Subscription, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    bump_version(INGREDIENT_VERSION_SCOPE)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(**kwargs):
+    bump_version(TAG_VERSION_SCOPE)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_changed(**kwargs):
+    bump_version(RECIPE_VERSION_SCOPE)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    shopping_list_services.delete_recipe(instance)
+    pantry_index.update_recipe(
+        instance.pk,
+        instance.ingredient_list.values_list('ingredient_id', flat=True),
+        (),
+    )
+
+
+def cascaded(origin, models=(Recipe, User)) -> bool:
+    """
+    Строка удаляется вместе с рецептом или пользователем: рецепт уже
+    учтён в списках покупок (recipe_deleted), а список покупок
+    пользователя удаляется вместе с ним.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
+
+
+@receiver(pre_save, sender=Favourite)
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=IngredientInRecipe)
+def row_saving(sender, instance, **kwargs):
+    # Прежние значения изменяемой строки для учёта в списках покупок
+    # и счётчиках.
+    instance._previous = None
+    if not instance._state.adding and shopping_list_services.tracks_rows():
+        instance._previous = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_saved(instance, **kwargs):
+    if not shopping_list_services.tracks_rows():
+        return
+
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        if (previous.user_id, previous.recipe_id) == (
+                instance.user_id,
+                instance.recipe_id,
+        ):
+            return
+        shopping_list_services.remove_recipe(
+            previous.user_id,
+            previous.recipe_id,
+        )
+
+    shopping_list_services.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_deleted(instance, origin=None, **kwargs):
+    if cascaded(origin) or not shopping_list_services.tracks_rows():
+        return
+
+    shopping_list_services.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Favourite)
+@receiver(post_save, sender=ShoppingCart)
+def recipe_counter_saved(sender, instance, created, **kwargs):
+    if not shopping_list_services.tracks_rows():
+        return
+
+    previous = getattr(instance, '_previous', None)
+    if previous is not None and previous.recipe_id != instance.recipe_id:
+        counters.change_recipes(sender, (previous.recipe_id,), -1)
+    elif not created:
+        return
+
+    counters.change_recipes(sender, (instance.recipe_id,), 1)
+
+
+@receiver(post_delete, sender=Favourite)
+@receiver(post_delete, sender=ShoppingCart)
+def recipe_counter_deleted(sender, instance, origin=None, **kwargs):
+    # Счётчики удаляемого рецепта удаляются вместе с ним, а рецепты
+    # удаляемого пользователя теряют его отметки.
+    if (cascaded(origin, Recipe)
+            or not shopping_list_services.tracks_rows()):
+        return
+
+    counters.change_recipes(sender, (instance.recipe_id,), -1)
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def recipe_ingredient_saved(instance, **kwargs):
+    if not shopping_list_services.tracks_rows():
+        return
+
+    previous = getattr(instance, '_previous', None)
+    delta = instance.amount
+    if previous is not None:
+        if (previous.recipe_id, previous.ingredient_id) == (
+                instance.recipe_id,
+                instance.ingredient_id,
+        ):
+            delta -= previous.amount
+        else:
+            shopping_list_services.change_ingredient(
+                previous.recipe_id,
+                previous.ingredient_id,
+                -previous.amount,
+            )
+
+    shopping_list_services.change_ingredient(
+        instance.recipe_id,
+        instance.ingredient_id,
+        delta,
+    )
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredient_deleted(instance, origin=None, **kwargs):
+    if cascaded(origin) or not shopping_list_services.tracks_rows():
+        return
+
+    shopping_list_services.change_ingredient(
+        instance.recipe_id,
+        instance.ingredient_id,
+        -instance.amount,
+    )
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def recipe_ingredient_pantry_saved(instance, **kwargs):
+    if not shopping_list_services.tracks_rows():
+        return
+
+    previous = getattr(instance, '_previous', None)
+    if previous is None:
+        pantry_index.change_ingredient(
+            instance.recipe_id,
+            added=instance.ingredient_id,
+        )
+    elif previous.recipe_id != instance.recipe_id:
+        pantry_index.change_ingredient(
+            previous.recipe_id,
+            removed=previous.ingredient_id,
+        )
+        pantry_index.change_ingredient(
+            instance.recipe_id,
+            added=instance.ingredient_id,
+        )
+    elif previous.ingredient_id != instance.ingredient_id:
+        pantry_index.change_ingredient(
+            instance.recipe_id,
+            removed=previous.ingredient_id,
+            added=instance.ingredient_id,
+        )
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredient_pantry_deleted(instance, origin=None, **kwargs):
+    # Ингредиенты удаляемого рецепта снимает recipe_deleted.
+    if cascaded(origin) or not shopping_list_services.tracks_rows():
+        return
+
+    pantry_index.change_ingredient(
+        instance.recipe_id,
+        removed=instance.ingredient_id,
+    )
+
+
+# Поля, из которых собирается поисковый документ.
+RECIPE_SEARCH_FIELDS = frozenset(('name', 'text'))
+INGREDIENT_SEARCH_FIELDS = frozenset(('name',))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_saved(instance, update_fields=None, **kwargs):
+    if update_fields is None or RECIPE_SEARCH_FIELDS & set(update_fields):
+        search.index_recipes((instance.pk,))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_search_deleted(instance, **kwargs):
+    search.remove_recipes((instance.pk,))
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def recipe_ingredient_search_changed(instance, origin=None, **kwargs):
+    # При удалении рецепта документ удаляет recipe_search_deleted,
+    # пакетные изменения индексирует вызывающий код.
+    if cascaded(origin) or not shopping_list_services.tracks_rows():
+        return
+
+    recipe_ids = {instance.recipe_id}
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        recipe_ids.add(previous.recipe_id)
+    search.index_recipes(recipe_ids)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_search_saved(instance, created, update_fields=None, **kwargs):
+    if created or (
+            update_fields is not None
+            and not INGREDIENT_SEARCH_FIELDS & set(update_fields)
+    ):
+        return
+
+    search.index_recipes(
+        IngredientInRecipe.objects.filter(
+            ingredient=instance,
+        ).values_list('recipe_id', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_files_deleted(instance, **kwargs):
+    image_pipeline.discard(instance.image.name, instance.image_variants)
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login.
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+
+    bump_version(USER_VERSION_SCOPE)
+
+
+@receiver((post_save, post_delete), sender=Favourite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscription)
+def user_relation_changed(instance, **kwargs):
+    bump_version(user_scope(instance.user_id))
@@ -0,0 +1,161 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+ENTRY_KEY = 'auth-token:{key}'
+VERSION_KEY = 'auth-token-version:{key}'
+
+# Поля пользователя в кэше: хэш пароля в кэш не попадает.
+CACHED_FIELDS = tuple(
+    field.attname
+    for field in User._meta.concrete_fields
+    if field.attname != 'password'
+)
+
+
+def snapshot(user: User) -> tuple:
+    """Значения полей пользователя для восстановления без запроса к базе."""
+    return tuple(getattr(user, name) for name in CACHED_FIELDS)
+
+
+def restore(values: tuple) -> User:
+    return User.from_db('default', CACHED_FIELDS, values)
+
+
+class TokenCache:
+    """
+    Кэш «токен → снимок пользователя» со временем жизни в общем кэше
+    AUTH_TOKEN_CACHE (без него токены не кэшируются): сброс записи при
+    выходе или смене пароля сразу действует во всех процессах.
+
+    Сброс меняет версию токена, а запись хранит версию, прочитанную
+    до проверки токена в базе: запись, сохранённая запросом, который
+    проверил токен до сброса, уже не читается.
+    Каждый запрос получает собственный экземпляр пользователя.
+    """
+
+    @property
+    def cache(self):
+        alias = settings.AUTH_TOKEN_CACHE
+        return caches[alias] if alias else None
+
+    def get(self, key: str) -> tuple:
+        """Пользователь по токену (или None) и текущая версия токена."""
+        if self.cache is None:
+            return None, None
+
+        entry_key = ENTRY_KEY.format(key=key)
+        version_key = VERSION_KEY.format(key=key)
+        found = self.cache.get_many((entry_key, version_key))
+        version = found.get(version_key)
+        entry = found.get(entry_key)
+        if entry is not None and entry[0] == version:
+            return restore(entry[1]), version
+
+        return None, version
+
+    def set(self, key: str, user: User, version) -> None:
+        """Запись пользователя с версией токена, полученной из get()."""
+        if self.cache is not None:
+            self.cache.set(
+                ENTRY_KEY.format(key=key),
+                (version, snapshot(user)),
+                settings.AUTH_TOKEN_CACHE_TTL,
+            )
+
+    async def aget(self, key: str) -> tuple:
+        if self.cache is None:
+            return None, None
+
+        return await sync_to_async(self.get)(key)
+
+    async def aset(self, key: str, user: User, version) -> None:
+        if self.cache is not None:
+            await sync_to_async(self.set)(key, user, version)
+
+    def delete(self, *keys: str) -> None:
+        if self.cache is None or not keys:
+            return
+
+        # Версия живёт дольше записей, сохранённых с прежней версией.
+        version = time.time_ns()
+        self.cache.set_many(
+            {VERSION_KEY.format(key=key): version for key in keys},
+            timeout=None,
+        )
+        self.cache.delete_many([ENTRY_KEY.format(key=key) for key in keys])
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену без запроса к базе для недавно
+    проверенных токенов. Кэш сбрасывается при выходе, смене пароля
+    и деактивации пользователя (users.signals).
+    """
+
+    def authenticate_credentials(self, key):
+        user, version = token_cache.get(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, version)
+        return user, token
+
+    async def aauthenticate(self, request):
+        """
+        Вариант authenticate для асинхронных представлений:
+        токен читается асинхронным запросом.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. No credentials provided.')
+                if len(auth) == 1
+                else _('Invalid token header. '
+                       'Token string should not contain spaces.')
+            )
+
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_(
+                'Invalid token header. '
+                'Token string should not contain invalid characters.'
+            ))
+
+        user, version = await token_cache.aget(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+
+        try:
+            token = await self.get_model().objects.select_related(
+                'user',
+            ).aget(key=key)
+        except self.get_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'),
+            )
+
+        await token_cache.aset(key, token.user, version)
+        return token.user, token
@@ -1,9 +1,37 @@
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import (
+    Exists,
+    OuterRef,
+    UniqueConstraint,
+    Value,
+)
 from django.contrib.auth.models import AbstractUser
 
 
-class User(AbstractUser):
+class CountersMixin(models.Model):
+    """
+    Денормализованные счётчики `counter_fields` изменяются только
+    выражениями F() и не перезаписываются при сохранении экземпляра,
+    загруженного до их изменения.
+    """
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = {*self.counter_fields, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
     email = models.EmailField(
@@ -11,6 +39,18 @@ class User(AbstractUser):
         unique=True,
         null=False,
     )
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0,
+        editable=False,
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Число рецептов',
+        default=0,
+        editable=False,
+    )
+
+    counter_fields = ('followers_count', 'recipes_count')
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -44,3 +84,13 @@ class Subscription(models.Model):
                 name='unique_subscription'
             ),
         )
+
+    @classmethod
+    def exists_for(cls, user, author=OuterRef('pk')):
+        """
+        Выражение-признак подписки пользователя на автора для аннотации.
+        """
+        if user is None or user.is_anonymous:
+            return Value(False)
+
+        return Exists(cls.objects.filter(user=user, author=author))
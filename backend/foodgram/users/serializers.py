@@ -1,6 +1,7 @@
 from rest_framework.serializers import SerializerMethodField
 from djoser.serializers import UserCreateSerializer, UserSerializer
 
+from api.metrics import TimedSerializerMixin
 from .models import User, Subscription
 
 USER_REQUIRED_FIELDS = (
@@ -20,16 +21,27 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         )
 
 
-class BaseUserSerializer(UserSerializer):
+def is_subscribed(author, request):
+    """
+    Подписка пользователя запроса на автора: из аннотации
+    или отдельным запросом.
+    """
+    if hasattr(author, 'is_subscribed'):
+        return author.is_subscribed
+
+    user = request.user
+    return (not user.is_anonymous
+            and Subscription.objects.filter(
+                user=user,
+                author=author,
+            ).exists())
+
+
+class BaseUserSerializer(TimedSerializerMixin, UserSerializer):
     is_subscribed = SerializerMethodField(read_only=True)
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        return (not user.is_anonymous
-                and Subscription.objects.filter(
-                    user=user,
-                    author=obj,
-                ).exists())
+        return is_subscribed(obj, self.context.get('request'))
 
     class Meta:
         model = User
@@ -0,0 +1,34 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.authentication import token_cache
+from users.models import User
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    token_cache.delete(instance.key)
+
+
+@receiver(user_logged_out)
+def user_logged_out_handler(user=None, **kwargs):
+    if user is not None:
+        invalidate_user_tokens(user)
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, created, update_fields=None, **kwargs):
+    # Смена пароля, деактивация и любые другие изменения пользователя,
+    # кроме обновления last_login при входе.
+    if created or (update_fields and set(update_fields) == {'last_login'}):
+        return
+
+    invalidate_user_tokens(instance)
+
+
+def invalidate_user_tokens(user: User) -> None:
+    token_cache.delete(
+        *Token.objects.filter(user=user).values_list('key', flat=True)
+    )
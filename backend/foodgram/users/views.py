@@ -1,38 +1,81 @@
+from collections import defaultdict
+
 from djoser.views import UserViewSet
+from django.db import transaction
+from django.db.models import F, Value, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from rest_framework import (
     status,
     response,
-    pagination,
     decorators,
     permissions,
 )
 
-from api.serializers import BaseUserSerializer, SubscribeSerializer
+from api.pagination import KeysetPagination
+from api.serializers import (
+    BaseUserSerializer,
+    SubscribeSerializer,
+    get_recipes_limit,
+)
+from recipes.models import Recipe
+from recipes.services import counters, feed
 from .models import User, Subscription
 
 
 class CustomUserViewSet(UserViewSet):
-    class UserPagination(pagination.PageNumberPagination):
-        page_size_query_param = 'limit'
-
     queryset = User.objects.all()
     serializer_class = BaseUserSerializer
-    pagination_class = UserPagination
+    pagination_class = KeysetPagination
+
+    @staticmethod
+    def recipes_by_author(authors, limit):
+        """
+        Последние рецепты авторов одним запросом: при ограничении
+        нумерация ROW_NUMBER() OVER (PARTITION BY author) в подзапросе.
+        """
+        recipes = Recipe.objects.filter(author__in=authors)
+        if limit is not None:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    expression=RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=[F('pub_date').desc(), F('id').desc()],
+                ),
+            ).filter(row_number__lte=limit)
+
+        grouped = defaultdict(list)
+        for recipe in recipes:
+            grouped[recipe.author_id].append(recipe)
+
+        return grouped
 
     @decorators.action(
         detail=False,
         permission_classes=[permissions.IsAuthenticated]
     )
     def subscriptions(self, request):
-        pages = self.paginate_queryset(
-            User.objects.filter(subscribing__user=request.user)
-        )
+        limit = get_recipes_limit(request)
+        authors = User.objects.filter(
+            subscribing__user=request.user,
+        ).annotate(
+            is_subscribed=Value(True),
+        ).order_by('id')
+        page = self.paginate_queryset(authors)
+        if page is not None:
+            authors = page
+
         serializer = SubscribeSerializer(
-            pages,
+            authors,
             many=True,
-            context={'request': request},
+            context={
+                'request': request,
+                'recipes_by_author': self.recipes_by_author(authors, limit),
+            },
         )
+        if page is None:
+            return response.Response(serializer.data)
+
         return self.get_paginated_response(serializer.data)
 
     @decorators.action(
@@ -58,9 +101,12 @@ class CustomUserViewSet(UserViewSet):
                 status=status.HTTP_201_CREATED,
             )
 
-        get_object_or_404(
-            Subscription,
-            user=user,
-            author=author,
-        ).delete()
+        with transaction.atomic():
+            get_object_or_404(
+                Subscription,
+                user=user,
+                author=author,
+            ).delete()
+            counters.change_followers(author.id, -1)
+            feed.unsubscribe(user.id, author.id)
         return response.Response(status=status.HTTP_204_NO_CONTENT)